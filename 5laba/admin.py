@@ -0,0 +1,64 @@
+from collections import OrderedDict
+
+import os
+import time
+
+from database import db_execute, db_fetchone
+
+BOOTSTRAP_ADMIN_ID = 1094679246  # Администратор, который добавляется при запуске бота
+
+
+class AdminCache:
+    # Кэш прав администратора по chat_id с вытеснением давно не использованных записей (LRU).
+    # Запоминаются и отрицательные ответы, потому что большинство пользователей не администраторы
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl  # Через ttl секунд ответ перепроверяется, чтобы заметить изменения из других процессов
+        self._entries = OrderedDict()  # chat_id -> (является ли администратором, время проверки)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chat_id: int):
+        entry = self._entries.get(chat_id)
+        if entry is None or time.monotonic() - entry[1] >= self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(chat_id)  # Запись использована недавно, переносим ее в конец очереди
+        return entry[0]
+
+    def put(self, chat_id: int, is_admin: bool):
+        self._entries[chat_id] = (is_admin, time.monotonic())
+        self._entries.move_to_end(chat_id)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)  # Вытеснение самой давно использованной записи
+
+    def invalidate(self, chat_id: int):
+        self._entries.pop(chat_id, None)
+
+
+admin_cache = AdminCache(int(os.getenv('ADMIN_CACHE_SIZE', '10000')), float(os.getenv('ADMIN_CACHE_TTL', '60')))
+
+
+async def is_user_admin(user_id: int) -> bool:  # Функция проверяет, является ли пользователь с указанным идентификатором администратором
+    # user_id: int означает, что функция принимает один аргумент user_id целочисленного типа
+    # -> bool указывает, что функция возвращает логическое значение (True или False)
+    is_admin = admin_cache.get(user_id)
+    if is_admin is None:  # Ответа нет в кэше, обращаемся к базе данных
+        row = await db_fetchone("SELECT 1 FROM admins WHERE chat_id = %s", (user_id,))  # Выполняет SQL-запрос к таблице admins в базе данных, где chat_id равен user_id
+        is_admin = bool(row)  # Логическое значение (True или False), указывающее, был ли найден результат
+        admin_cache.put(user_id, is_admin)
+    return is_admin
+
+
+# Добавление администратора в таблицу admins
+async def add_admin(chat_id: int):  # Определяет асинхронную функцию add_admin,
+    # которая добавляет администратора с указанным идентификатором чата в таблицу admins
+    await db_execute(("INSERT INTO admins (chat_id) VALUES (%s) ON CONFLICT (chat_id) DO NOTHING", (chat_id,)))
+    admin_cache.invalidate(chat_id)  # Сброс закэшированного отрицательного ответа
+
+
+async def ensure_bootstrap_admin():
+    # Добавление администратора в таблицу admins один раз при запуске бота
+    if not await is_user_admin(BOOTSTRAP_ADMIN_ID):
+        await add_admin(BOOTSTRAP_ADMIN_ID)
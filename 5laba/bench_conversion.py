@@ -0,0 +1,39 @@
+# Микробенчмарк конвертации: старый расчет из process_currency_rate_convert
+# (float + Decimal.quantize + float) против модуля conversion.
+# Запуск: python bench_conversion.py
+
+from decimal import Decimal
+import random
+import timeit
+
+from common.conversion import convert, convert_minor_many, parse_decimal
+
+N = 10000
+RATE = Decimal('90.1234')
+
+random.seed(1)
+texts = [f"{random.randint(1, 10 ** 6)}.{random.randint(0, 99):02d}" for _ in range(N)]
+amounts_minor = [int(parse_decimal(text) * 100) for text in texts]
+
+
+def old_path():
+    for text in texts:
+        conversion_rate = float(text)
+        rate_value = Decimal(RATE).quantize(Decimal('0.01'))
+        conversion_rate * float(rate_value)
+
+
+def new_path():
+    for text in texts:
+        convert(parse_decimal(text), RATE)
+
+
+def batch_path():
+    convert_minor_many(amounts_minor, RATE)
+
+
+if __name__ == '__main__':
+    for name, func in (('старый расчет', old_path), ('conversion.convert', new_path),
+                       ('conversion.convert_minor_many', batch_path)):
+        seconds = min(timeit.repeat(func, number=1, repeat=5))
+        print(f"{name:32} {N / seconds:12.0f} сумм/с")
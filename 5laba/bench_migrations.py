@@ -0,0 +1,96 @@
+# Бенчмарк миграций схемы: заполняет исходную схему (миграция 1: название валюты без индекса,
+# chat_id администратора - VARCHAR без индекса) 100 тыс. валют и 1 млн администраторов,
+# замеряет поиск валюты по названию и проверку администратора, затем применяет
+# остальные миграции и повторяет замер. Таблицы создаются в отдельной схеме
+# bench_migrations локальной базы PostgreSQL (настройки из database.py), которая удаляется в конце.
+# Запуск: python bench_migrations.py --currencies 100000 --admins 1000000
+
+import time
+import random
+import argparse
+
+from bench_replay import latency_summary
+from database import MIGRATIONS, close_pool, pooled_connection
+
+SCHEMA = 'bench_migrations'
+
+
+def apply(cur, versions):
+    for version, queries in MIGRATIONS:
+        if version in versions:
+            for query in queries:
+                cur.execute(query)
+
+
+def seed(cur, currencies: int, admins: int):
+    cur.execute("INSERT INTO currencies (currency_name, rate) "
+                "SELECT 'C' || n, (n % 1000) + 0.5 FROM generate_series(1, %s) AS n", (currencies,))
+    cur.execute("INSERT INTO admins (chat_id) SELECT n::VARCHAR FROM generate_series(1, %s) AS n", (admins,))
+    cur.execute("ANALYZE currencies")
+    cur.execute("ANALYZE admins")
+
+
+def lookup_latencies(cur, query: str, keys: list) -> list:
+    latencies = []
+    for key in keys:
+        started = time.perf_counter()
+        cur.execute(query, (key,))
+        cur.fetchall()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def summary(latencies: list) -> str:
+    result = latency_summary(latencies)
+    return f"p50 {result['p50_ms']:8.3f} мс, p99 {result['p99_ms']:8.3f} мс"
+
+
+def measure(cur, args, admin_key):
+    rnd = random.Random(args.seed)
+    currency_keys = [f"C{rnd.randint(1, args.currencies)}" for _ in range(args.lookups)]
+    admin_keys = [admin_key(rnd.randint(1, args.admins)) for _ in range(args.lookups)]
+    return {
+        'поиск валюты': lookup_latencies(cur, "SELECT rate FROM currencies WHERE currency_name = %s", currency_keys),
+        'проверка администратора': lookup_latencies(cur, "SELECT 1 FROM admins WHERE chat_id = %s", admin_keys),
+    }
+
+
+def main(args):
+    with pooled_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+        cur.execute(f"SET search_path TO {SCHEMA}")
+        try:
+            apply(cur, {1})
+            started = time.perf_counter()
+            seed(cur, args.currencies, args.admins)
+            conn.commit()
+            print(f"Заполнение: {args.currencies} валют, {args.admins} администраторов "
+                  f"за {time.perf_counter() - started:.1f} с")
+            before = measure(cur, args, str)  # До миграции 3 chat_id хранится строкой
+
+            started = time.perf_counter()
+            apply(cur, {version for version, _ in MIGRATIONS if version != 1})
+            conn.commit()
+            print(f"Миграции 2-{MIGRATIONS[-1][0]}: {time.perf_counter() - started:.1f} с")
+            cur.execute("ANALYZE currencies")
+            cur.execute("ANALYZE admins")
+            after = measure(cur, args, int)
+
+            for name in before:
+                print(f"{name:24} до:    {summary(before[name])}")
+                print(f"{'':24} после: {summary(after[name])}")
+        finally:
+            conn.rollback()
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            cur.execute("RESET search_path")  # Соединение возвращается в пул с обычной схемой
+    close_pool()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Время поиска до и после миграций схемы")
+    parser.add_argument('--currencies', type=int, default=100000)
+    parser.add_argument('--admins', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,35 @@
+# Бенчмарк индекса названий валют: построение и поиск среди N случайных названий.
+# Запуск: python bench_name_index.py [количество названий]
+
+import sys
+import random
+import string
+import timeit
+
+from common.name_index import NameIndex
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+LETTERS = 'абвгдежзийклмнопрстуфхцчшщыэюя'
+
+random.seed(1)
+names = {'USD', 'EUR', 'CNY', 'Доллар Австралии'}
+while len(names) < N:
+    length = random.choice([3, 6, 8, 10, 14])
+    alphabet = string.ascii_uppercase if length == 3 else LETTERS  # ISO-коды и названия на русском
+    names.add(''.join(random.choice(alphabet) for _ in range(length)).capitalize())
+
+
+def per_call_us(function, *args, number=2000) -> float:
+    return timeit.timeit(lambda: function(*args), number=number) / number * 10 ** 6
+
+
+if __name__ == '__main__':
+    build = timeit.timeit(lambda: NameIndex(names), number=1)
+    index = NameIndex(names)
+    print(f"{N} названий, построение индекса: {build * 1000:.0f} мс")
+    print(f"  resolve(' usd ')                 {per_call_us(index.resolve, ' usd '):8.2f} мкс")
+    print(f"  resolve('доллар')                {per_call_us(index.resolve, 'доллар'):8.2f} мкс")
+    print(f"  complete('до')                   {per_call_us(index.complete, 'до'):8.2f} мкс")
+    print(f"  suggest('usdd')                  {per_call_us(index.suggest, 'usdd'):8.2f} мкс")
+    print(f"  suggest('доллор австралии')      {per_call_us(index.suggest, 'доллор австралии'):8.2f} мкс")
+    print(f"  add + remove одного названия     {per_call_us(lambda: (index.add('Новая'), index.remove('Новая'))):8.2f} мкс")
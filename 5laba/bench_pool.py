@@ -0,0 +1,114 @@
+# Бенчмарк пула соединений: N одновременных диалогов /convert (команда, валюта, сумма)
+# через настоящие хэндлеры и локальную базу PostgreSQL (настройки из database.py).
+# Состояния хранятся в PostgreSQL без кэша в памяти (FSM_CACHE=off), поэтому каждый шаг диалога
+# читает состояние своего чата из базы: запросы разных чатов не ждут общих блокировок бота
+# и упираются только в пул. Курсы берутся из кэша, как в работающем боте: с ttl 0 все диалоги
+# ждали бы одну блокировку сверки версии курсов и пул не влиял бы на результат.
+# Локальная база отвечает быстрее удаленной, поэтому --db-rtt-ms добавляет к каждой транзакции
+# задержку сети до базы: соединение занято все это время, как с сервером на другой машине.
+# Для каждого размера пула выводится время всех диалогов, задержка одного диалога
+# и сколько соединений в среднем было занято: время удержания соединений, деленное на общее время.
+# С пулом из одного соединения запросы ждут друг друга, с большим пулом идут параллельно.
+# Запросы к Bot API перехватывает поддельная сессия, Telegram не нужен.
+# Запуск: python bench_pool.py --conversations 200 --pool-sizes 1,4,10 --db-rtt-ms 2
+
+import os
+import time
+import asyncio
+import argparse
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from aiogram import Bot, types
+
+import database
+from bench_replay import FakeSession, latency_summary, seed_currencies
+
+
+class HeldConnections:
+    # Замена database.pooled_connection: добавляет задержку сети и считает время удержания соединений
+    def __init__(self, pooled_connection, delay: float):
+        self.pooled_connection = pooled_connection
+        self.delay = delay
+        self.seconds = 0.0
+        self._lock = threading.Lock()  # Соединения берутся из разных потоков
+
+    @contextmanager
+    def __call__(self):
+        with self.pooled_connection() as conn:
+            started = time.perf_counter()
+            try:
+                time.sleep(self.delay)
+                yield conn
+            finally:
+                with self._lock:
+                    self.seconds += time.perf_counter() - started
+
+
+async def run(conversations: int, pool_size: int, db_rtt: float) -> dict:
+    os.environ['FSM_STORAGE'] = 'postgres'
+    os.environ['FSM_CACHE'] = 'off'
+    os.environ['DB_POOL_MAX'] = str(pool_size)  # Пул создается при первом запросе и читает размер из окружения
+    from common.metrics import metrics
+    from common.sender import outbox
+    from main import create_dispatcher
+
+    # Запросы к базе выполняются в потоках: потоков по умолчанию min(32, ядер + 4), их должно хватать на весь пул
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=pool_size + 4))
+    outbox.global_rate = outbox.chat_rate = outbox.group_rate = 1e9  # Замеряется база, а не ограничения Telegram
+    bot = Bot('42:TEST', session=FakeSession())
+    dp = create_dispatcher()  # Новый диспетчер на каждый запуск: роутеры подключаются только к одному диспетчеру
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    await seed_currencies()
+
+    update_ids = iter(range(1, 10 ** 9))
+
+    def message_update(user_id: int, text: str) -> types.Update:
+        update_id = next(update_ids)
+        return types.Update.model_validate({'update_id': update_id, 'message': {
+            'message_id': update_id, 'date': int(time.time()), 'text': text,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'bench'}}}, context={"bot": bot})
+
+    async def conversation(user_id: int) -> float:
+        started = time.perf_counter()
+        for text in ("/convert", "USD", str(user_id)):
+            await dp.feed_update(bot, message_update(user_id, text))
+        return time.perf_counter() - started
+
+    held = HeldConnections(database.pooled_connection, db_rtt)
+    database.pooled_connection = held  # Функции database.py берут соединение по имени из модуля
+    try:
+        queries_before = metrics.db_queries
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(conversation(user_id) for user_id in range(1, conversations + 1)))
+        elapsed = time.perf_counter() - started
+        queries = metrics.db_queries - queries_before
+    finally:
+        database.pooled_connection = held.pooled_connection
+    await dp.emit_shutdown(bot=bot, dispatcher=dp)  # Закрывает пул, следующий запуск создаст его заново
+    return {
+        'pool_size': pool_size,
+        'seconds': elapsed,
+        'conversations_per_second': conversations / elapsed,
+        'busy_connections': held.seconds / elapsed,
+        'db_queries': queries,
+        'latency': latency_summary(latencies),
+    }
+
+
+async def main(args):
+    for pool_size in args.pool_sizes:
+        result = await run(args.conversations, pool_size, args.db_rtt_ms / 1000)
+        print(f"пул {pool_size:3}: {result['seconds']:7.3f} с, {result['conversations_per_second']:8.1f} диалогов/с, "
+              f"занято соединений {result['busy_connections']:4.1f}, p50 {result['latency']['p50_ms']:7.1f} мс, "
+              f"p99 {result['latency']['p99_ms']:7.1f} мс, запросов к базе {result['db_queries']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Одновременные диалоги /convert при разном размере пула соединений")
+    parser.add_argument('--conversations', type=int, default=200)
+    parser.add_argument('--pool-sizes', type=lambda text: [int(size) for size in text.split(',')], default='1,4,10')
+    parser.add_argument('--db-rtt-ms', type=float, default=2, help="задержка сети до базы на одну транзакцию")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,207 @@
+# Нагрузочный тест бота: воспроизводит смесь сценариев пользователей через настоящие хэндлеры,
+# диспетчер с хуками запуска и локальную базу PostgreSQL (настройки из database.py).
+# Запросы к Bot API перехватывает поддельная сессия, Telegram не нужен.
+# Сценарии запускаются с заданной частотой (открытая нагрузка), обновления одного
+# пользователя идут по порядку, разные пользователи обрабатываются параллельно.
+# Результат - JSON с пропускной способностью, процентилями задержки, запросами к базе
+# на обновление и ростом памяти; --baseline сравнивает его с прошлым запуском.
+# Запуск: python bench_replay.py --mix convert=80,get_currencies=15,admin=5 --rate 200 --scenarios 5000 --out bench.json
+
+from decimal import Decimal
+
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import subprocess
+
+from aiogram import Bot, types
+from aiogram.client.session.base import BaseSession
+
+CURRENCIES = {'USD': Decimal('90.5'), 'EUR': Decimal('98.25'), 'CNY': Decimal('12.4'), 'GBP': Decimal('114.1')}
+CURRENCIES.update({f'X{index:02d}': Decimal(index) for index in range(1, 60)})  # Список валют на несколько страниц
+
+# Сценарий - последовательность сообщений одного пользователя; admin выполняется от имени администратора
+SCENARIOS = {
+    'convert': lambda rnd: [f"/convert {rnd.randint(1, 10000)} {rnd.choice(['USD', 'EUR', 'CNY'])} "
+                            f"{rnd.choice(['RUB', 'EUR', 'GBP'])}"],
+    'convert_dialog': lambda rnd: ["/convert", rnd.choice(['USD', 'EUR', 'CNY']), str(rnd.randint(1, 10000))],
+    'get_currencies': lambda rnd: ["/get_currencies"],
+    'history': lambda rnd: ["/history USD"],
+    'admin': lambda rnd: ["Изменить курс валюты", rnd.choice(['USD', 'EUR', 'CNY']),
+                          f"{rnd.randint(10, 150)}.{rnd.randint(0, 99):02d}"],
+}
+
+
+class FakeSession(BaseSession):
+    # Отвечает на все запросы без обращения к Telegram и считает их
+    def __init__(self):
+        super().__init__()
+        self.requests = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests += 1
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(','):
+        name, weight = part.split('=')
+        if name not in SCENARIOS:
+            raise SystemExit(f"Неизвестный сценарий {name}, доступны: {', '.join(SCENARIOS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def latency_summary(latencies: list) -> dict:
+    values = sorted(latencies)
+    return {'count': len(values), **{f'p{round(q * 100)}_ms': percentile(values, q) * 1000
+                                     for q in (0.5, 0.9, 0.99)},
+            'max_ms': (values[-1] if values else 0) * 1000}
+
+
+def rss_kb() -> int:
+    # Текущий размер резидентной памяти процесса (Linux), иначе максимальный за время работы
+    try:
+        with open('/proc/self/status') as status:
+            return next(int(line.split()[1]) for line in status if line.startswith('VmRSS:'))
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def git_commit() -> str:
+    result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+async def seed_currencies():
+    from currencies import rate_cache
+    from database import db_execute_values
+
+    await db_execute_values("INSERT INTO currencies (currency_name, rate) VALUES %s "
+                            "ON CONFLICT (currency_name) DO UPDATE SET rate = EXCLUDED.rate",
+                            list(CURRENCIES.items()))
+    rate_cache.invalidate()
+
+
+async def run(args) -> dict:
+    os.environ.setdefault('FSM_STORAGE', 'memory')
+    from admin import BOOTSTRAP_ADMIN_ID
+    from common.metrics import metrics
+    from common.sender import outbox
+    from main import create_dispatcher
+
+    outbox.global_rate = outbox.chat_rate = outbox.group_rate = 1e9  # Замеряется бот, а не ограничения Telegram
+    session = FakeSession()
+    bot = Bot('42:TEST', session=session)
+    dp = create_dispatcher()
+    await dp.emit_startup(bot=bot, dispatcher=dp)  # Миграции и администратор по умолчанию
+    await seed_currencies()
+
+    rnd = random.Random(args.seed)
+    names, weights = zip(*args.mix.items())
+    latencies = {name: [] for name in names}
+    locks = {}  # id пользователя -> Lock: сообщения одного пользователя обрабатываются по порядку
+    update_ids = iter(range(1, 10 ** 9))
+
+    def message_update(user_id: int, text: str) -> types.Update:
+        update_id = next(update_ids)
+        return types.Update.model_validate({'update_id': update_id, 'message': {
+            'message_id': update_id, 'date': int(time.time()), 'text': text,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'bench'}}}, context={"bot": bot})
+
+    async def play(name: str, user_id: int, texts: list):
+        lock = locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            for text in texts:
+                started = time.perf_counter()
+                await dp.feed_update(bot, message_update(user_id, text))
+                latencies[name].append(time.perf_counter() - started)
+
+    queries_before = metrics.db_queries
+    requests_before = session.requests
+    rss_before = rss_kb()
+    tasks = []
+    started = time.perf_counter()
+    for index in range(args.scenarios):
+        if args.rate > 0:  # Сценарии приходят с постоянной частотой, независимо от скорости обработки
+            delay = started + index / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        name = rnd.choices(names, weights)[0]
+        user_id = BOOTSTRAP_ADMIN_ID if name == 'admin' else rnd.randint(1, args.users)
+        tasks.append(asyncio.create_task(play(name, user_id, SCENARIOS[name](rnd))))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    rss_after = rss_kb()
+
+    all_latencies = [latency for values in latencies.values() for latency in values]
+    await dp.emit_shutdown(bot=bot, dispatcher=dp)
+    return {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {'mix': args.mix, 'rate': args.rate, 'scenarios': args.scenarios, 'users': args.users,
+                   'seed': args.seed},
+        'updates': len(all_latencies),
+        'seconds': elapsed,
+        'updates_per_second': len(all_latencies) / elapsed,
+        'latency': latency_summary(all_latencies),
+        'latency_by_scenario': {name: latency_summary(values) for name, values in latencies.items()},
+        'db_queries_per_update': (metrics.db_queries - queries_before) / max(len(all_latencies), 1),
+        'api_requests_per_update': (session.requests - requests_before) / max(len(all_latencies), 1),
+        'memory_kb': {'start': rss_before, 'end': rss_after, 'growth': rss_after - rss_before},
+    }
+
+
+def compare(result: dict, baseline: dict):
+    # Изменение ключевых показателей относительно прошлого запуска; рост задержки - регрессия
+    for title, path in (("обновлений/с", ('updates_per_second',)), ("p50, мс", ('latency', 'p50_ms')),
+                        ("p99, мс", ('latency', 'p99_ms')), ("запросов к базе", ('db_queries_per_update',)),
+                        ("рост памяти, КБ", ('memory_kb', 'growth'))):
+        old, new = baseline, result
+        for key in path:
+            old, new = old[key], new[key]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "-"
+        print(f"  {title:18} {old:12.2f} -> {new:12.2f}  {change}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Нагрузочный тест хэндлеров бота")
+    parser.add_argument('--mix', type=parse_mix, default='convert=80,get_currencies=15,admin=5',
+                        help="сценарии и их доли: " + ', '.join(SCENARIOS))
+    parser.add_argument('--rate', type=float, default=0, help="сценариев в секунду, 0 - без ограничения")
+    parser.add_argument('--scenarios', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help="файл для результата в JSON")
+    parser.add_argument('--baseline', help="JSON прошлого запуска для сравнения")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as file:
+            file.write(text)
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            print(f"Сравнение с {args.baseline}:")
+            compare(result, json.load(file))
@@ -0,0 +1,62 @@
+# Бенчмарк выбора хэндлера сообщения: N хэндлеров с фильтрами-лямбдами по тексту кнопки (как было в боте)
+# против таблицы маршрутов routing.py. Сообщение совпадает с последним зарегистрированным хэндлером,
+# обновления проходят через настоящий диспетчер aiogram 3 без обращения к Telegram.
+# Запуск: python bench_routing.py [количество обновлений]
+
+import sys
+import time
+import asyncio
+
+from aiogram import Bot, Dispatcher, Router, types
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bench_replay import FakeSession
+from common.routing import RouteTable, aiogram3_router
+
+UPDATES = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+SIZES = (10, 100, 1000)
+
+
+async def handler(message: types.Message):
+    pass
+
+
+def filter_chain_router(size: int) -> Router:
+    router = Router()
+    for index in range(size):
+        router.message.register(handler, lambda message, text=f"Кнопка {index}": message.text == text)
+    return router
+
+
+def route_table_router(size: int) -> Router:
+    table = RouteTable()
+    for index in range(size):
+        table.text(f"Кнопка {index}")(handler)
+    return aiogram3_router(table)
+
+
+async def per_update_us(router: Router, text: str) -> float:
+    bot = Bot('42:TEST', session=FakeSession())
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.include_router(router)
+    updates = [types.Update.model_validate({'update_id': index, 'message': {
+        'message_id': index, 'date': 0, 'text': text, 'chat': {'id': 1, 'type': 'private'},
+        'from': {'id': 1, 'is_bot': False, 'first_name': 'bench'}}}, context={"bot": bot})
+        for index in range(UPDATES)]
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / UPDATES * 10 ** 6
+
+
+async def main():
+    print(f"{'хэндлеров':>10} {'фильтры, мкс':>14} {'таблица, мкс':>14}")
+    for size in SIZES:
+        text = f"Кнопка {size - 1}"
+        chain = await per_update_us(filter_chain_router(size), text)
+        table = await per_update_us(route_table_router(size), text)
+        print(f"{size:>10} {chain:14.1f} {table:14.1f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+# Бенчмарк запуска бота: время импорта модулей (python -X importtime)
+# и время от старта процесса до обработки первого обновления.
+# База данных и Telegram не нужны: обновление - инлайн-запрос без текста,
+# а запросы к Bot API перехватывает поддельная сессия.
+# Запуск: python bench_startup.py
+
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+FIRST_UPDATE = '''
+from aiogram import Bot, types
+from aiogram.client.session.base import BaseSession
+
+from main import create_dispatcher
+
+
+class FakeSession(BaseSession):
+    async def make_request(self, bot, method, timeout=None):
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+async def handle_first_update():
+    bot = Bot('42:TEST', session=FakeSession())
+    update = types.Update.model_validate({'update_id': 1, 'inline_query': {
+        'id': '1', 'from': {'id': 1, 'is_bot': False, 'first_name': 'test'}, 'query': '', 'offset': ''}})
+    await create_dispatcher().feed_update(bot, update)
+
+import asyncio
+asyncio.run(handle_first_update())
+'''
+
+
+def import_times():
+    # Суммарное время импорта и самые медленные модули по отчету -X importtime
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                            cwd=HERE, capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines()[1:]:
+        self_us, cumulative_us, name = line.split('|')
+        modules.append((int(cumulative_us.split(':')[-1]), int(self_us.split(':')[-1]), name.strip()))
+    total = next(cumulative for cumulative, _, name in modules if name == 'main')
+    return total, sorted(modules, key=lambda module: module[1], reverse=True)[:10]
+
+
+def time_to_first_update() -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', FIRST_UPDATE], cwd=HERE, check=True,
+                   env=dict(os.environ, FSM_STORAGE='memory'))
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    total, slowest = import_times()
+    print(f"Импорт main: {total / 1000:.1f} мс")
+    for _, self_us, name in slowest:
+        print(f"  {self_us / 1000:8.1f} мс  {name}")
+    runs = [time_to_first_update() for _ in range(5)]
+    print(f"Запуск процесса до первого обработанного обновления: {min(runs) * 1000:.0f} мс (лучший из 5)")
@@ -0,0 +1,94 @@
+# Бенчмарк масштабирования режима супервизора: пропускная способность от 1 до N воркеров.
+# Воркеры обрабатывают инлайн-запросы "100 USD" через настоящие хэндлеры; курсы берутся
+# из общей памяти, а запросы к Bot API перехватывает поддельная сессия, поэтому
+# база данных и Telegram не нужны.
+# Запуск: python bench_supervisor.py [количество обновлений]
+
+from decimal import Decimal
+
+import os
+import sys
+import time
+import asyncio
+import multiprocessing
+
+UPDATES = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+
+def bench_worker(queue, shared_name, shared_lock, ready):
+    os.environ['RATE_CACHE_TTL'] = '3600'  # Курсы не перепроверяются в базе во время замера
+    from aiogram import Bot, Dispatcher
+    from aiogram.client.session.base import BaseSession
+    from aiogram.fsm.storage.memory import MemoryStorage
+
+    from common.sender import outbox
+    from currencies import SharedRates, rate_cache
+    from handlers import create_router
+    from main import retry_after
+    from supervisor import process_queue
+
+    class FakeSession(BaseSession):
+        async def make_request(self, bot, method, timeout=None):
+            return True
+
+        async def stream_content(self, *args, **kwargs):
+            yield b''
+
+        async def close(self):
+            pass
+
+    rate_cache.ttl = 3600
+    rate_cache.attach_shared(SharedRates(shared_name, shared_lock))
+    dp = Dispatcher(storage=MemoryStorage())  # Без хуков запуска: миграции и база данных не нужны
+    dp.include_router(create_router())
+    ready.set()
+    bot = Bot('42:TEST', session=FakeSession())
+
+    async def run():
+        outbox.global_rate = outbox.chat_rate = 1e9  # Замеряется обработка, а не ограничения Telegram
+        outbox.start(bot.send_message, retry_after)
+        await process_queue(bot, dp, queue, 16)
+
+    asyncio.run(run())
+
+
+def inline_update(update_id: int) -> dict:
+    user = {'id': update_id % 1000 + 1, 'is_bot': False, 'first_name': 'test'}
+    return {'update_id': update_id, 'inline_query': {'id': str(update_id), 'from': user,
+                                                     'query': '100 USD', 'offset': ''}}
+
+
+def run(workers: int) -> float:
+    from currencies import SharedRates
+
+    context = multiprocessing.get_context('spawn')
+    shared = SharedRates(lock=context.Lock(), size=1024 * 1024)
+    shared.publish(1, {'USD': Decimal('90.5'), 'EUR': Decimal('98.25')})
+    queues = [context.Queue() for _ in range(workers)]
+    events = [context.Event() for _ in range(workers)]
+    processes = [context.Process(target=bench_worker, args=(queue, shared.name, shared.lock, event))
+                 for queue, event in zip(queues, events)]
+    for process in processes:
+        process.start()
+    for event in events:
+        event.wait()
+
+    started = time.perf_counter()
+    for update_id in range(UPDATES):
+        queues[(update_id % 1000 + 1) % workers].put(inline_update(update_id))  # Шардирование по id пользователя
+    for queue in queues:
+        queue.put(None)
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+    shared.close(unlink=True)
+    return UPDATES / elapsed
+
+
+if __name__ == '__main__':
+    counts = sorted({1, 2, 4, os.cpu_count()} - {n for n in (2, 4) if n > os.cpu_count()})
+    base = None
+    for workers in counts:
+        throughput = run(workers)
+        base = base or throughput
+        print(f"воркеров: {workers:3}  {throughput:10.0f} обновлений/с  ускорение x{throughput / base:.2f}")
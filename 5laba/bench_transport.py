@@ -0,0 +1,169 @@
+# Бенчмарк способа получения обновлений: длинный опрос (dp.start_polling) против вебхука (webhook.WebhookServer).
+# Поддельный Telegram генерирует N сообщений из разных чатов: при опросе их по 100 штук отдает
+# поддельная сессия в ответ на getUpdates, для вебхука их отправляет POST-запросами клиент aiohttp
+# в --connections соединений (как Telegram, max_connections вебхука по умолчанию 40).
+# Хэндлер имитирует работу с базой и Bot API ожиданием --handler-ms, --rtt-ms - задержка сети до Telegram.
+# Задержка обновления - от получения ботом (ответ getUpdates или начало POST) до завершения хэндлера.
+# Результат - обновлений в секунду и p50/p99 задержки для каждого режима.
+# Запуск: python bench_transport.py --updates 5000 --handler-ms 5 --rtt-ms 20
+
+import time
+import socket
+import asyncio
+import argparse
+
+from aiogram import Bot, Dispatcher, Router, types
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import GetMe, GetUpdates
+
+from bench_replay import latency_summary
+from common.webhook import WebhookServer
+from main import update_chat_id
+
+BATCH_SIZE = 100  # Максимум обновлений в одном ответе getUpdates
+
+
+def make_update(update_id: int, chats: int) -> dict:
+    chat_id = update_id % chats + 1
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': int(time.time()), 'text': f"/convert {update_id} USD",
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': {'id': chat_id, 'is_bot': False, 'first_name': 'bench'}}}
+
+
+class FakeTelegram(BaseSession):
+    # Отвечает на getUpdates подготовленными обновлениями, на остальные запросы - успехом
+    def __init__(self, updates: list, rtt: float):
+        super().__init__()
+        self.updates = updates
+        self.rtt = rtt
+        self.received = {}  # update_id -> момент получения ботом
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, GetMe):
+            return types.User(id=42, is_bot=True, first_name='bench', username='bench_bot')
+        if not isinstance(method, GetUpdates):
+            return True
+        await asyncio.sleep(self.rtt)
+        start = max(method.offset or 1, 1) - 1  # Номера обновлений идут подряд с 1
+        batch = self.updates[start:start + (method.limit or BATCH_SIZE)]
+        if not batch:  # Новых обновлений нет: длинный опрос ждет до таймаута
+            await asyncio.sleep(method.timeout or 0)
+            return []
+        now = time.perf_counter()
+        for update in batch:
+            self.received.setdefault(update['update_id'], now)
+        return [types.Update.model_validate(update, context={"bot": bot}) for update in batch]
+
+    async def stream_content(self, *args, **kwargs):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+def create_dispatcher(handler_delay: float, finished: dict, done: asyncio.Event, total: int) -> Dispatcher:
+    router = Router()
+
+    @router.message()
+    async def handle(message: types.Message):
+        await asyncio.sleep(handler_delay)
+
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.include_router(router)
+
+    @dp.update.outer_middleware()
+    async def record_finish(handler, update, data):
+        try:
+            return await handler(update, data)
+        finally:
+            finished[update.update_id] = time.perf_counter()
+            if len(finished) == total:
+                done.set()
+
+    return dp
+
+
+def result(received: dict, finished: dict, started: float) -> dict:
+    latencies = [finished[update_id] - received[update_id] for update_id in finished]
+    elapsed = max(finished.values()) - started
+    return {'updates_per_second': len(finished) / elapsed, 'latency': latency_summary(latencies)}
+
+
+async def run_polling(args) -> dict:
+    updates = [make_update(update_id, args.chats) for update_id in range(1, args.updates + 1)]
+    session = FakeTelegram(updates, args.rtt_ms / 1000)
+    finished = {}
+    done = asyncio.Event()
+    dp = create_dispatcher(args.handler_ms / 1000, finished, done, args.updates)
+    bot = Bot('42:TEST', session=session)
+    started = time.perf_counter()
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+    await done.wait()
+    await dp.stop_polling()
+    await polling
+    return result(session.received, finished, started)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def run_webhook(args) -> dict:
+    from aiohttp import ClientSession, TCPConnector
+
+    finished = {}
+    received = {}
+    done = asyncio.Event()
+    dp = create_dispatcher(args.handler_ms / 1000, finished, done, args.updates)
+    bot = Bot('42:TEST', session=FakeTelegram([], 0))
+    server = WebhookServer(
+        parse_update=lambda data: types.Update.model_validate(data, context={"bot": bot}),
+        process_update=lambda update: dp.feed_update(bot, update),
+        shard_key=update_chat_id, workers=args.workers, queue_size=args.queue_size)
+    port = free_port()
+    await server.start('127.0.0.1', port, '/webhook')
+    url = f"http://127.0.0.1:{port}/webhook"
+    pending = iter(range(1, args.updates + 1))
+
+    async def connection(client: ClientSession):
+        # Одно соединение Telegram: следующее обновление отправляется после ответа на предыдущее
+        for update_id in pending:
+            update = make_update(update_id, args.chats)
+            await asyncio.sleep(args.rtt_ms / 1000)
+            while True:
+                received[update_id] = time.perf_counter()
+                async with client.post(url, json=update) as response:
+                    if response.status == 200:
+                        break
+                await asyncio.sleep(0.01)  # 503: очередь заполнена, Telegram повторит доставку
+
+    started = time.perf_counter()
+    async with ClientSession(connector=TCPConnector(limit=args.connections)) as client:
+        await asyncio.gather(*(connection(client) for _ in range(args.connections)))
+    await done.wait()
+    await server.stop()
+    return result(received, finished, started)
+
+
+async def main(args):
+    for name, run in (('опрос', run_polling), ('вебхук', run_webhook)):
+        summary = await run(args)
+        latency = summary['latency']
+        print(f"{name:8} {summary['updates_per_second']:10.0f} обновлений/с   "
+              f"p50 {latency['p50_ms']:8.1f} мс   p99 {latency['p99_ms']:8.1f} мс")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Пропускная способность и задержка: опрос против вебхука")
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--handler-ms', type=float, default=5, help="время работы хэндлера")
+    parser.add_argument('--rtt-ms', type=float, default=20, help="задержка сети до Telegram")
+    parser.add_argument('--connections', type=int, default=40, help="одновременных POST-запросов вебхука")
+    parser.add_argument('--workers', type=int, default=16, help="воркеров очереди вебхука")
+    parser.add_argument('--queue-size', type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
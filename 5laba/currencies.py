@@ -0,0 +1,400 @@
+from decimal import Decimal, InvalidOperation
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+
+import os
+import io
+import csv
+import json
+import time
+import bisect
+import pickle
+import struct
+import asyncio
+import logging
+
+from common.conversion import BASE_CURRENCY, convert, parse_decimal
+from common.name_index import NameIndex
+from database import db_execute, db_execute_values, db_fetchall, db_fetchone, db_write, pooled_connection
+
+class SharedRates:
+    # Курсы валют в сегменте общей памяти, общем для процессов-воркеров одного супервизора.
+    # Формат сегмента: номер публикации и длина данных (два uint64), затем pickle пары (версия таблицы, курсы).
+    # Читатель сравнивает номер публикации со своим и разбирает данные, только если они изменились
+    HEADER = struct.Struct('QQ')
+
+    def __init__(self, name: str = None, lock=None, size: int = 0):
+        from multiprocessing import shared_memory
+        # Без имени создается новый сегмент (в супервизоре), с именем - подключение к существующему (в воркере)
+        self._memory = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.name = self._memory.name
+        self.lock = lock  # multiprocessing.Lock, общий для всех процессов
+
+    @property
+    def sequence(self) -> int:
+        return self.HEADER.unpack_from(self._memory.buf)[0]
+
+    def publish(self, version, rates: dict) -> int:
+        payload = pickle.dumps((version, rates))
+        if self.HEADER.size + len(payload) > self._memory.size:
+            logging.warning("Курсы не помещаются в общую память (%s байт)", len(payload))
+            return self.sequence
+        with self.lock:
+            sequence = self.sequence + 1
+            self._memory.buf[self.HEADER.size:self.HEADER.size + len(payload)] = payload
+            self.HEADER.pack_into(self._memory.buf, 0, sequence, len(payload))
+        return sequence
+
+    def read(self) -> tuple:
+        # (номер публикации, версия таблицы, курсы); версия None, если курсы еще не публиковались
+        with self.lock:
+            sequence, length = self.HEADER.unpack_from(self._memory.buf)
+            if length == 0:
+                return sequence, None, {}
+            version, rates = pickle.loads(self._memory.buf[self.HEADER.size:self.HEADER.size + length])
+        return sequence, version, rates
+
+    def close(self, unlink: bool = False):
+        self._memory.close()
+        if unlink:  # Сегмент удаляет только создавший его процесс
+            self._memory.unlink()
+
+
+_BUMP_VERSION = ("UPDATE currencies_version SET version = version + 1 WHERE id = 1 RETURNING version", ())
+
+
+class RateCache:
+    # Кэш курсов валют в памяти процесса: чтение курсов не обращается к базе данных,
+    # пока не истек ttl; по истечении ttl сверяется только номер версии таблицы
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.rates = {}  # Название валюты -> курс к рублю
+        self.names = NameIndex([BASE_CURRENCY])  # Поиск валюты по введенному пользователем названию
+        self.generation = 0  # Увеличивается при каждом изменении self.rates
+        self.version = None
+        self.checked_at = 0.0
+        self.hits = 0  # Количество чтений, обслуженных из памяти
+        self.misses = 0  # Количество чтений, потребовавших сверки с базой
+        self._lock = asyncio.Lock()
+        self.shared = None  # SharedRates, если бот запущен воркером супервизора
+        self._shared_sequence = 0
+
+    def attach_shared(self, shared: SharedRates):
+        self.shared = shared
+
+    def _load_shared(self):
+        # Забирает курсы, опубликованные другим воркером, без обращения к базе данных
+        sequence, version, rates = self.shared.read()
+        self._shared_sequence = sequence
+        if version is not None and version != self.version:
+            self.rates = rates
+            self.names.sync([BASE_CURRENCY, *rates])
+            self.version = version
+            self.generation += 1
+            self.checked_at = time.monotonic()
+
+    def _publish_shared(self):
+        if self.shared is not None:
+            self._shared_sequence = self.shared.publish(self.version, self.rates)
+
+    def _is_fresh(self) -> bool:
+        return time.monotonic() - self.checked_at < self.ttl
+
+    async def _refresh(self):
+        async with self._lock:  # Одновременные промахи ждут одну сверку, а не запускают по запросу каждый
+            if self._is_fresh():
+                return
+            row = await db_fetchone("SELECT version FROM currencies_version WHERE id = 1")
+            version = row[0] if row else 0
+            if version != self.version:  # Таблицу изменил другой процесс, перечитываем ее целиком
+                rows = await db_fetchall("SELECT currency_name, rate FROM currencies")
+                self.rates = dict(rows)
+                self.names.sync([BASE_CURRENCY, *self.rates])  # Меняются только добавленные и удаленные названия
+                self.generation += 1
+                self.version = version
+                self._publish_shared()
+            self.checked_at = time.monotonic()
+
+    async def get_rates(self) -> dict:
+        if self.shared is not None and self.shared.sequence != self._shared_sequence:
+            self._load_shared()
+        if self._is_fresh():
+            self.hits += 1
+        else:
+            self.misses += 1
+            await self._refresh()
+        return self.rates
+
+    async def get_rate(self, currency_name: str):
+        return (await self.get_rates()).get(currency_name)  # None, если валюта не найдена
+
+    async def resolve_name(self, text: str):
+        # Название валюты по вводу пользователя ("usd ", "Доллар"); None, если не найдено
+        await self.get_rates()
+        return self.names.resolve(text)
+
+    async def apply(self, statement, currency_name: str, rate=None) -> bool:
+        # Записывает изменение в базу одним запросом с увеличением версии и обновляет кэш;
+        # rate=None означает, что валюта удалена. statement должен заканчиваться RETURNING currency_name:
+        # версия увеличивается, только если запрос изменил строку. False, если строк не нашлось
+        # (валюту уже удалил другой администратор) - тогда кэш не меняется, а перечитывается
+        query, params = statement
+        row = await db_write((f"WITH changed AS ({query}) UPDATE currencies_version SET version = version + 1 "
+                              "WHERE id = 1 AND EXISTS (SELECT 1 FROM changed) RETURNING version", params), fetch='one')
+        if row is None:
+            self.invalidate()
+            return False
+        if rate is None:
+            self.rates.pop(currency_name, None)
+            self.names.remove(currency_name)
+        else:
+            self.rates[currency_name] = rate
+            self.names.add(currency_name)
+        self._written(row[0])
+        return True
+
+    async def apply_many(self, rates: dict):
+        # Обновляет курсы нескольких существующих валют одним запросом UPDATE ... FROM (VALUES ...)
+        row = await db_execute_values(
+            "UPDATE currencies SET rate = data.rate FROM (VALUES %s) AS data (currency_name, rate) "
+            "WHERE currencies.currency_name = data.currency_name", list(rates.items()), _BUMP_VERSION, fetch='one')
+        self.rates.update((name, rate) for name, rate in rates.items() if name in self.rates)
+        self._written(row[0])
+
+    def _written(self, version: int):
+        # Учет записи в базу: version - номер версии таблицы после нее
+        self.generation += 1
+        if self.version is not None and version == self.version + 1:
+            self.version = version
+            self._publish_shared()
+        else:
+            self.invalidate()  # Таблицу менял еще кто-то, перечитаем ее при следующем чтении
+
+    def invalidate(self):
+        self.checked_at = 0.0  # Следующее чтение сверит версию и при необходимости перечитает таблицу
+
+
+rate_cache = RateCache(float(os.getenv('RATE_CACHE_TTL', '30')))  # Время жизни кэша в секундах
+
+
+def parse_rates_file(file_name: str, content: bytes) -> dict:
+    # Разбирает загруженный файл с курсами: JSON-объект {"USD": 90.5},
+    # JSON-список [{"currency_name": "USD", "rate": 90.5}] или CSV со строками "название,курс"
+    text = content.decode('utf-8-sig')
+    if file_name.lower().endswith('.json'):
+        data = json.loads(text)
+        if isinstance(data, dict):
+            rows = list(data.items())
+        else:
+            rows = [(item['currency_name'], item['rate']) for item in data]
+    else:
+        rows = [row for row in csv.reader(io.StringIO(text)) if row]
+        if rows and rows[0][0].strip().lower() == 'currency_name':  # Пропуск строки заголовка
+            rows = rows[1:]
+
+    rates = {}  # При повторе названия в файле остается последний курс
+    for line_number, row in enumerate(rows, start=1):
+        if len(row) != 2:
+            raise ValueError(f"строка {line_number}: ожидается название и курс")
+        currency_name = str(row[0]).strip()
+        try:
+            rate = Decimal(str(row[1]).strip())
+        except InvalidOperation:
+            raise ValueError(f"строка {line_number}: некорректный курс {row[1]!r}")
+        if not currency_name or len(currency_name) > 50 or not rate.is_finite() or rate <= 0:
+            raise ValueError(f"строка {line_number}: некорректные данные {currency_name!r}, {row[1]!r}")
+        rates[currency_name] = rate
+    return rates
+
+
+def _import_rates_sync(rates: dict):
+    # Загружает все курсы одной транзакцией: COPY во временную таблицу и один INSERT ... ON CONFLICT
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rates.items())
+    buffer.seek(0)
+    with pooled_connection() as conn, conn.cursor() as cur:
+        cur.execute("CREATE TEMP TABLE currencies_import (currency_name VARCHAR(50), rate NUMERIC) ON COMMIT DROP")
+        cur.copy_expert("COPY currencies_import (currency_name, rate) FROM STDIN WITH (FORMAT csv)", buffer)
+        cur.execute("INSERT INTO currencies (currency_name, rate) SELECT currency_name, rate FROM currencies_import "
+                    "ON CONFLICT (currency_name) DO UPDATE SET rate = EXCLUDED.rate")
+        cur.execute(*_BUMP_VERSION)
+
+
+def _export_rates_sync() -> bytes:
+    # Выгружает таблицу currencies в CSV средствами COPY без построчной выборки
+    buffer = io.StringIO()
+    with pooled_connection() as conn, conn.cursor() as cur:
+        cur.copy_expert("COPY (SELECT currency_name, rate FROM currencies ORDER BY currency_name) "
+                        "TO STDOUT WITH (FORMAT csv, HEADER)", buffer)
+    return buffer.getvalue().encode('utf-8')
+
+
+async def import_rates(rates: dict):
+    await asyncio.to_thread(_import_rates_sync, rates)
+    rate_cache.invalidate()  # Курсы изменились целиком, кэш перечитает таблицу при следующем чтении
+
+
+async def export_rates() -> bytes:
+    return await asyncio.to_thread(_export_rates_sync)
+
+
+MAX_MESSAGE_LENGTH = 4096  # Ограничение Telegram на длину текста одного сообщения
+CURRENCIES_PAGE_SIZE = int(os.getenv('CURRENCIES_PAGE_SIZE', '50'))  # Максимум валют на одной странице списка
+
+_currency_pages = (None, [])  # (поколение кэша курсов, отрисованные страницы)
+
+
+def render_currency_pages(rates: dict) -> list:
+    # Разбивает отсортированный список валют на страницы не длиннее одного сообщения Telegram
+    pages = []
+    lines = []
+    length = 0
+    for currency_name in sorted(rates):
+        line = f"{currency_name}: {rates[currency_name]} руб."
+        if lines and (len(lines) >= CURRENCIES_PAGE_SIZE or length + len(line) + 1 > MAX_MESSAGE_LENGTH):
+            pages.append("\n".join(lines))
+            lines = []
+            length = 0
+        lines.append(line)
+        length += len(line) + 1
+    if lines:
+        pages.append("\n".join(lines))
+    return pages
+
+
+async def get_currency_pages() -> list:
+    # Страницы перерисовываются только после изменения курсов
+    global _currency_pages
+    rates = await rate_cache.get_rates()
+    if _currency_pages[0] != rate_cache.generation:
+        _currency_pages = (rate_cache.generation, render_currency_pages(rates))
+    return _currency_pages[1]
+
+
+def resolve_conversion(words: list, index: NameIndex):
+    # Определяет исходную и целевую валюты из слов после суммы: "USD" или "usd евро".
+    # Название валюты может состоять из нескольких слов, поэтому сначала проверяется вся строка
+    currency_from = index.resolve(' '.join(words))
+    if currency_from is not None:
+        return currency_from, BASE_CURRENCY
+    if len(words) > 1:
+        currency_from, currency_to = index.resolve(' '.join(words[:-1])), index.resolve(words[-1])
+        if currency_from is not None and currency_to is not None:
+            return currency_from, currency_to
+    return None
+
+
+HISTORY_MAX_POINTS = 30  # Максимум точек в ответе /history
+
+
+class RateHistory:
+    # История курсов в памяти: для каждой валюты отсортированные массивы моментов начала действия
+    # курса и самих курсов, поиск курса на дату - двоичным поиском. Серия перечитывается из базы,
+    # когда изменилась версия таблицы currencies; хранятся серии max_currencies последних валют
+    def __init__(self, max_currencies: int = 1000):
+        self.max_currencies = max_currencies
+        self._series = OrderedDict()  # Название валюты -> (версия таблицы, моменты в секундах, курсы)
+
+    async def _series_for(self, currency_name: str) -> tuple:
+        entry = self._series.get(currency_name)
+        if entry is None or entry[0] != rate_cache.version:
+            rows = await db_fetchall("SELECT valid_from, rate FROM currency_rate_history "
+                                     "WHERE currency_name = %s ORDER BY valid_from, id", (currency_name,))
+            entry = (rate_cache.version, [row[0].timestamp() for row in rows], [row[1] for row in rows])
+            self._series[currency_name] = entry
+        self._series.move_to_end(currency_name)
+        if len(self._series) > self.max_currencies:
+            self._series.popitem(last=False)
+        return entry
+
+    async def rate_at(self, currency_name: str, moment: datetime):
+        # Курс, действовавший в момент moment; None, если истории на этот момент нет
+        if currency_name == BASE_CURRENCY:
+            return Decimal(1)
+        _, moments, rates = await self._series_for(currency_name)
+        index = bisect.bisect_right(moments, moment.timestamp()) - 1
+        return rates[index] if index >= 0 else None
+
+    async def daily_series(self, currency_name: str, days: int) -> list:
+        # Курс на конец каждого дня за последние days дней, прореженный до HISTORY_MAX_POINTS точек
+        _, moments, rates = await self._series_for(currency_name)
+        start = bisect.bisect_left(moments, time.time() - days * 86400)
+        daily = {}
+        for moment, rate in zip(moments[start:], rates[start:]):
+            daily[datetime.fromtimestamp(moment, timezone.utc).date()] = rate  # Остается последний курс дня
+        points = list(daily.items())
+        if len(points) > HISTORY_MAX_POINTS:
+            step = (len(points) - 1) / (HISTORY_MAX_POINTS - 1)
+            points = [points[round(index * step)] for index in range(HISTORY_MAX_POINTS)]
+        return points
+
+
+rate_history = RateHistory()
+
+
+async def compact_history(keep_days: int):
+    # За дни старше keep_days в истории остается курс закрытия дня - последняя запись дня по UTC
+    # (при равном времени - с большим id). Дни считаются в UTC, как в RateHistory.daily_series,
+    # а не в часовом поясе сессии, поэтому график и курс на дату после сжатия не меняются.
+    # Граница - начало дня по UTC, чтобы день не сжимался частично
+    await db_execute((
+        "DELETE FROM currency_rate_history h USING ("
+        "SELECT id, row_number() OVER (PARTITION BY currency_name, (valid_from AT TIME ZONE 'UTC')::date "
+        "ORDER BY valid_from DESC, id DESC) AS position "
+        "FROM currency_rate_history "
+        "WHERE valid_from < (date_trunc('day', now() AT TIME ZONE 'UTC') - make_interval(days => %s)) "
+        "AT TIME ZONE 'UTC') d "
+        "WHERE h.id = d.id AND d.position > 1", (keep_days,)))
+
+
+CONVERSION_CACHE_SIZE = 10000  # Сколько ответов на инлайн-запросы хранить до очистки
+_conversion_results = (None, {})  # (поколение кэша курсов, (сумма, валюты, дата) -> ответ)
+
+
+async def convert_text(query: str):
+    # Ответ на запрос вида "100 USD", "100 USD EUR" или "100 USD on 2024-05-01"; None, если запрос не разобран.
+    # Ответы запоминаются до изменения курсов: популярные запросы не пересчитываются
+    global _conversion_results
+    parts = query.split()
+    on_date = None
+    if len(parts) >= 4 and parts[-2].lower() in ('on', 'на'):  # Конвертация по курсу на конец указанного дня
+        try:
+            on_date = date.fromisoformat(parts[-1])
+        except ValueError:
+            return None
+        parts = parts[:-2]
+    if len(parts) < 2:
+        return None
+    try:
+        amount = parse_decimal(parts[0])
+    except ValueError:
+        return None
+    rates = await rate_cache.get_rates()  # Один запрос к кэшу на всю конвертацию
+    currencies = resolve_conversion(parts[1:], rate_cache.names)
+    if currencies is None:
+        return None
+    if _conversion_results[0] != rate_cache.generation:  # Курсы изменились, старые ответы больше не верны
+        _conversion_results = (rate_cache.generation, {})
+    results = _conversion_results[1]
+    key = (str(amount), *currencies, on_date)  # Строка суммы: "100" и "100.0" отвечаются по-разному
+    text = results.get(key)
+    if text is None:
+        text = await _conversion_text(amount, *currencies, on_date, rates)
+        if len(results) >= CONVERSION_CACHE_SIZE:
+            results.clear()
+        results[key] = text
+    return text
+
+
+async def _conversion_text(amount: Decimal, currency_from: str, currency_to: str, on_date, rates: dict) -> str:
+    if on_date is None:
+        rate_from = Decimal(1) if currency_from == BASE_CURRENCY else rates[currency_from]
+        rate_to = Decimal(1) if currency_to == BASE_CURRENCY else rates[currency_to]
+        return f"{amount} {currency_from} = {convert(amount, rate_from, rate_to)} {currency_to}"
+    # Последняя микросекунда дня, а не полночь следующего: для 9999-12-31 следующего дня у datetime нет
+    end_of_day = datetime.combine(on_date, datetime.max.time(), timezone.utc)
+    rate_from = await rate_history.rate_at(currency_from, end_of_day)
+    rate_to = await rate_history.rate_at(currency_to, end_of_day)
+    if rate_from is None or rate_to is None:
+        return f"Нет сохраненного курса на {on_date}."
+    return f"{amount} {currency_from} = {convert(amount, rate_from, rate_to)} {currency_to} (курс на {on_date})"
@@ -0,0 +1,386 @@
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+
+from common.metrics import metrics
+
+# Пул подключений к базе данных PostgreSQL создается при первом запросе, а не при импорте модуля,
+# поэтому импорт хэндлеров (например, в тестах) не подключается к базе данных.
+# Размер пула задается переменными окружения DB_POOL_MIN и DB_POOL_MAX
+_db_pool = None
+_db_pool_lock = threading.Lock()  # Запросы выполняются в разных потоках, пул должен создаться один раз
+# ThreadedConnectionPool не ждет свободного соединения, а сразу бросает PoolError,
+# поэтому потоков с соединением не больше размера пула: остальные ждут на семафоре
+_db_pool_slots = None
+
+
+def get_pool():
+    global _db_pool, _db_pool_slots
+    with _db_pool_lock:
+        if _db_pool is None:
+            from psycopg2.pool import ThreadedConnectionPool  # Драйвер загружается только когда нужен
+            max_connections = int(os.getenv('DB_POOL_MAX', '10'))
+            _db_pool_slots = threading.BoundedSemaphore(max_connections)
+            _db_pool = ThreadedConnectionPool(
+                int(os.getenv('DB_POOL_MIN', '1')),
+                max_connections,
+                host="127.0.0.1",
+                database="postgres1",
+                user="postgres",
+                password="postgres"
+            )
+        return _db_pool
+
+
+def close_pool():
+    # Закрытие всех соединений пула. Это необходимо для освобождения ресурсов и предотвращения утечек памяти
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is not None:
+            _db_pool.closeall()
+            _db_pool = None
+
+
+@contextmanager
+def pooled_connection():
+    # Берет соединение из пула на время одной транзакции и возвращает его обратно в пул
+    pool = get_pool()
+    slots = _db_pool_slots
+    with slots:  # Ожидание свободного соединения, если все заняты
+        conn = pool.getconn()
+        try:
+            yield conn
+            conn.commit()  # Фиксирует изменения в базе данных
+        except Exception:
+            conn.rollback()  # Откат, чтобы не вернуть в пул соединение с прерванной транзакцией
+            raise
+        finally:
+            pool.putconn(conn)
+
+
+def _run_statements(statements, fetch=None):
+    # Выполняется в отдельном потоке: выполняет все запросы в одной транзакции
+    with pooled_connection() as conn, conn.cursor() as cur:  # Курсор для выполнения SQL-запросов к базе данных
+        for query, params in statements:
+            cur.execute(query, params)
+        if fetch == 'one':
+            return cur.fetchone()
+        if fetch == 'all':
+            return cur.fetchall()
+        return None
+
+
+async def _in_thread(queries: int, function, *args):
+    # asyncio.to_thread не блокирует цикл событий, пока запрос выполняется в базе данных.
+    # Время считается вместе с ожиданием свободного соединения пула
+    started = time.perf_counter()
+    try:
+        return await asyncio.to_thread(function, *args)
+    finally:
+        metrics.record_db(queries, time.perf_counter() - started)
+
+
+async def db_fetchone(query, params=()):
+    return await _in_thread(1, _run_statements, [(query, params)], 'one')
+
+
+async def db_fetchall(query, params=()):
+    return await _in_thread(1, _run_statements, [(query, params)], 'all')
+
+
+async def db_execute(*statements, fetch=None):
+    # Принимает пары (запрос, параметры) и выполняет их в одной транзакции;
+    # fetch='one' или 'all' возвращает результат последнего запроса
+    return await _in_thread(len(statements), _run_statements, statements, fetch)
+
+
+def _run_values(query, rows, statements, fetch):
+    from psycopg2.extras import execute_values
+    with pooled_connection() as conn, conn.cursor() as cur:
+        execute_values(cur, query, rows)  # Один многострочный запрос вместо запроса на каждую строку
+        for statement_query, params in statements:
+            cur.execute(statement_query, params)
+        if fetch == 'one':
+            return cur.fetchone()
+        return None
+
+
+async def db_execute_values(query, rows, *statements, fetch=None):
+    # Запрос с VALUES %s для всех строк rows, затем statements - в той же транзакции
+    return await _in_thread(1 + len(statements), _run_values, query, rows, statements, fetch)
+
+
+def _run_units(units):
+    # Выполняет несколько единиц работы одной транзакцией с одним коммитом. Каждая единица
+    # выполняется внутри своей точки сохранения: ошибка откатывает только ее, остальные фиксируются.
+    # Возвращает для каждой единицы результат или исключение
+    results = []
+    with pooled_connection() as conn, conn.cursor() as cur:
+        for statements, fetch in units:
+            cur.execute("SAVEPOINT unit")
+            try:
+                for query, params in statements:
+                    cur.execute(query, params)
+                result = cur.fetchone() if fetch == 'one' else cur.fetchall() if fetch == 'all' else None
+            except Exception as error:
+                cur.execute("ROLLBACK TO SAVEPOINT unit")
+                results.append(error)
+            else:
+                cur.execute("RELEASE SAVEPOINT unit")
+                results.append(result)
+    return results
+
+
+class GroupCommit:
+    # Групповая фиксация записей: единицы работы, пришедшие в течение window секунд,
+    # выполняются одной транзакцией, поэтому серия правок администратора стоит одного коммита
+    # (и одной записи журнала на диск) вместо коммита на каждое сообщение
+    def __init__(self, window: float = 0.005, max_units: int = 100):
+        self.window = window
+        self.max_units = max_units
+        self._units = []  # (запросы, fetch, future)
+        self._flush_task = None
+
+    async def execute(self, *statements, fetch=None):
+        # Как db_execute, но запись фиксируется вместе с соседними; ошибка затрагивает только эту единицу
+        future = asyncio.get_running_loop().create_future()
+        self._units.append((statements, fetch, future))
+        if len(self._units) >= self.max_units:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        units, self._units = self._units, []
+        if not units:
+            return
+        try:
+            results = await _in_thread(sum(len(statements) for statements, _, _ in units),
+                                       _run_units, [(statements, fetch) for statements, fetch, _ in units])
+        except Exception as error:  # Не удался сам коммит или соединение - ошибка у всех единиц
+            results = [error] * len(units)
+        for (_, _, future), result in zip(units, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+group_commit = GroupCommit(float(os.getenv('DB_GROUP_COMMIT_WINDOW', '0.005')))
+
+
+async def db_write(*statements, fetch=None):
+    # Запись через групповую фиксацию: запросы выполняются в одной транзакции с точкой сохранения
+    return await group_commit.execute(*statements, fetch=fetch)
+
+
+# Миграции схемы базы данных: номер версии и список SQL-запросов.
+# Новые миграции добавляются только в конец списка, уже примененные не изменяются
+MIGRATIONS = [
+    (1, [
+        "CREATE TABLE IF NOT EXISTS currencies ("
+        "id SERIAL PRIMARY KEY,"
+        "currency_name VARCHAR(50) NOT NULL,"
+        "rate FLOAT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS admins ("
+        "id SERIAL PRIMARY KEY,"
+        "chat_id VARCHAR NOT NULL)",
+        # Номер версии таблицы currencies: увеличивается при каждом изменении курсов,
+        # чтобы другие процессы бота узнали, что их кэш устарел
+        "CREATE TABLE IF NOT EXISTS currencies_version ("
+        "id INT PRIMARY KEY,"
+        "version BIGINT NOT NULL)",
+        "INSERT INTO currencies_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING",
+    ]),
+    # Уникальный индекс по названию валюты вместо последовательного просмотра таблицы
+    (2, [
+        "DELETE FROM currencies a USING currencies b WHERE a.currency_name = b.currency_name AND a.id < b.id",
+        "CREATE UNIQUE INDEX IF NOT EXISTS currencies_currency_name_key ON currencies (currency_name)",
+    ]),
+    # chat_id администратора хранится как BIGINT и сам является первичным ключом
+    (3, [
+        "DELETE FROM admins a USING admins b WHERE a.chat_id = b.chat_id AND a.id > b.id",
+        "ALTER TABLE admins DROP COLUMN id",
+        "ALTER TABLE admins ALTER COLUMN chat_id TYPE BIGINT USING chat_id::BIGINT",
+        "ALTER TABLE admins ADD PRIMARY KEY (chat_id)",
+    ]),
+    # Точный десятичный тип для курса вместо FLOAT
+    (4, [
+        "ALTER TABLE currencies ALTER COLUMN rate TYPE NUMERIC USING rate::NUMERIC",
+    ]),
+    # Состояния машины состояний, общие для всех процессов бота
+    (5, [
+        "CREATE TABLE IF NOT EXISTS fsm_storage ("
+        "key TEXT PRIMARY KEY,"
+        "state TEXT,"
+        "data JSONB NOT NULL DEFAULT '{}')",
+    ]),
+    # История курсов: только добавление строк, каждую запись делает триггер при изменении currencies
+    (6, [
+        "CREATE TABLE IF NOT EXISTS currency_rate_history ("
+        "currency_name VARCHAR(50) NOT NULL,"
+        "valid_from TIMESTAMPTZ NOT NULL DEFAULT now(),"
+        "rate NUMERIC NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS currency_rate_history_name_valid_from_idx "
+        "ON currency_rate_history (currency_name, valid_from)",
+        "INSERT INTO currency_rate_history (currency_name, rate) SELECT currency_name, rate FROM currencies",
+        "CREATE OR REPLACE FUNCTION currency_rate_history_append() RETURNS trigger AS $$ "
+        "BEGIN "
+        "INSERT INTO currency_rate_history (currency_name, rate) VALUES (NEW.currency_name, NEW.rate); "
+        "RETURN NEW; "
+        "END $$ LANGUAGE plpgsql",
+        "CREATE TRIGGER currency_rate_history_append AFTER INSERT OR UPDATE OF rate ON currencies "
+        "FOR EACH ROW WHEN (NEW.rate IS NOT NULL) EXECUTE FUNCTION currency_rate_history_append()",
+    ]),
+    # now() - время начала транзакции, поэтому все курсы одной групповой фиксации получали одинаковое
+    # valid_from. clock_timestamp() дает время самой записи, а номер строки id упорядочивает записи
+    # с совпавшим временем. Триггер не задает valid_from и берет значение по умолчанию
+    (7, [
+        "ALTER TABLE currency_rate_history ALTER COLUMN valid_from SET DEFAULT clock_timestamp()",
+        "ALTER TABLE currency_rate_history ADD COLUMN IF NOT EXISTS id BIGSERIAL",
+        "DROP INDEX IF EXISTS currency_rate_history_name_valid_from_idx",
+        "CREATE INDEX IF NOT EXISTS currency_rate_history_name_valid_from_id_idx "
+        "ON currency_rate_history (currency_name, valid_from, id)",
+    ]),
+]
+
+
+def run_migrations():
+    # Применяет недостающие миграции; повторный запуск ничего не меняет.
+    # Каждая миграция выполняется в своей транзакции вместе с записью ее номера
+    with pooled_connection() as conn, conn.cursor() as cur:
+        cur.execute("CREATE TABLE IF NOT EXISTS schema_migrations (version INT PRIMARY KEY)")
+        conn.commit()
+        for version, queries in MIGRATIONS:
+            # Блокировка не дает двум процессам бота применять миграции одновременно
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))")
+            cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (version,))
+            if cur.fetchone() is None:
+                for query in queries:
+                    cur.execute(query)
+                cur.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (version,))
+                logging.info("Применена миграция %s", version)
+            conn.commit()
+
+
+class PgStorage(BaseStorage):
+    # Хранилище машины состояний в таблице fsm_storage.
+    # Прочитанные состояния держатся в памяти, а изменения копятся и записываются
+    # одним запросом раз в flush_interval секунд. В памяти остаются не больше max_keys
+    # последних использованных ключей, остальные перечитываются из базы.
+    # Копия в памяти верна, только пока состояние чата меняет один процесс: супервизор
+    # направляет все обновления чата одному воркеру. Если обновления одного чата могут
+    # попасть в разные процессы (например, несколько вебхук-серверов за балансировщиком),
+    # нужен cache=False: тогда состояние перечитывается из базы при каждом обращении
+    def __init__(self, flush_interval: float = 0.05, max_keys: int = 10000, cache: bool = True):
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self.cache = cache
+        self._states = OrderedDict()  # Ключ -> название состояния, в начале давно не использованные
+        self._data = {}  # Ключ -> данные состояния
+        self._dirty = set()  # Ключи, изменения которых еще не записаны в базу
+        self._writing = set()  # Ключи, которые записываются прямо сейчас
+        self._flush_task = None
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{getattr(key, 'thread_id', None)}:{key.destiny}"
+
+    async def _load(self, key: str):
+        # Чтение из базы при первом обращении к ключу, а без кэша - всегда, кроме еще не записанных изменений
+        if key in self._states and (self.cache or key in self._dirty or key in self._writing):
+            self._states.move_to_end(key)
+            return
+        row = await db_fetchone("SELECT state, data FROM fsm_storage WHERE key = %s", (key,))
+        if key not in self._dirty and key not in self._writing:  # Пока шел запрос, ключ мог быть изменен
+            self._states[key] = row[0] if row else None
+            self._data[key] = row[1] if row else {}
+        self._states.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        while len(self._states) > self.max_keys:
+            key = next(iter(self._states))
+            if key in self._dirty or key in self._writing:  # Незаписанный ключ вытесним после ближайшего сброса
+                break
+            del self._states[key]
+            del self._data[key]
+
+    def _mark_dirty(self, key: str):
+        self._dirty.add(key)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Задача остается в _flush_task до конца записи, чтобы close мог ее дождаться
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush()
+        except Exception:
+            logging.exception("Не удалось записать состояния машины состояний")
+            self._flush_task = None
+            return
+        self._flush_task = None
+        if self._dirty:  # Изменения, сделанные во время записи
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        self._writing |= keys
+        rows = [(key, self._states[key], json.dumps(self._data[key], default=str)) for key in keys]
+        try:
+            await db_execute_values(
+                "INSERT INTO fsm_storage (key, state, data) VALUES %s "
+                "ON CONFLICT (key) DO UPDATE SET state = EXCLUDED.state, data = EXCLUDED.data", rows)
+        except Exception:
+            self._dirty.update(keys)  # Не записанные изменения попробуем записать при следующем сбросе
+            raise
+        finally:
+            self._writing -= keys
+        self._evict()
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        key = self._key(key)
+        await self._load(key)
+        self._states[key] = state.state if isinstance(state, State) else state
+        self._mark_dirty(key)
+
+    async def get_state(self, key: StorageKey):
+        key = self._key(key)
+        await self._load(key)
+        return self._states[key]
+
+    async def set_data(self, key: StorageKey, data: dict) -> None:
+        key = self._key(key)
+        await self._load(key)
+        self._data[key] = data.copy()
+        self._mark_dirty(key)
+
+    async def get_data(self, key: StorageKey) -> dict:
+        key = self._key(key)
+        await self._load(key)
+        return self._data[key].copy()
+
+    async def close(self) -> None:
+        # Запись, начатая по таймеру, может ждать свободного соединения: пул закрывается сразу после close
+        while self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
@@ -0,0 +1,418 @@
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram import types, Router, F
+from aiogram.filters import CommandObject
+
+import logging
+
+from admin import is_user_admin
+from common.conversion import BASE_CURRENCY, convert, parse_decimal
+from common.metrics import metrics
+from common.routing import RouteTable
+from common.sender import BULK, MAX_MESSAGE_LENGTH, outbox
+from currencies import (convert_text, export_rates, get_currency_pages, import_rates, parse_rates_file,
+                        rate_cache, rate_history)
+
+# Хэндлеры сообщений выбираются по таблице маршрутов (routing.py) поиском в словарях,
+# а не проверкой фильтров каждого хэндлера по очереди
+routes = RouteTable()
+# Сообщения в чаты отправляются через очередь sender.outbox, которая соблюдает ограничения Telegram.
+# Ответы на инлайн-запросы и нажатия кнопок не относятся к чату и отправляются напрямую
+
+
+# Состояния для машины состояний
+class ManageCurrency(StatesGroup):
+    waiting_for_currency_name = State()  # Определение состояния для хранения названия валюты и курса к рублю
+    waiting_for_currency_rate = State()
+    waiting_for_currency_name_delete = State()
+    waiting_for_currency_name_change = State()
+    waiting_for_currency_rate_change = State()
+    waiting_for_currency_name_convert = State()
+    waiting_for_currency_rate_convert = State()
+    waiting_for_import_file = State()
+
+
+def has_text(message: types.Message) -> bool:
+    # Условие для состояний, которые ждут текст: фото, стикеры и файлы в них не попадают в хэндлер
+    return message.text is not None
+
+
+# Хэндлер для команды /manage_currency
+@routes.command('manage_currency')
+async def manage_currency_command(message: types.Message):
+    if await is_user_admin(message.from_user.id):  # Проверка, является ли пользователь администратором
+        # Создание объекта markup класса ReplyKeyboardMarkup, который используется для создания настраиваемой клавиатуры
+        markup = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=3, keyboard=[])
+        button1 = types.KeyboardButton(text="Добавить валюту")
+        button2 = types.KeyboardButton(text="Удалить валюту")
+        button3 = types.KeyboardButton(text="Изменить курс валюты")
+        markup.keyboard.append([button1, button2, button3])  # Добавление кнопок на клавиатуру
+        await outbox.answer(message, "Выберите действие", reply_markup=markup)
+    else:
+        await outbox.answer(message, "Нет доступа к команде")
+
+
+# Хэндлер для нажатия на кнопку "Добавить валюту"
+@routes.text("Добавить валюту")  # Сообщение с текстом кнопки "Добавить валюту"
+async def add_currency_command(message: types.Message, state: FSMContext):
+    await outbox.answer(message, "Введите название валюты:")
+    await state.set_state(ManageCurrency.waiting_for_currency_name)  # Установка текущего состояния машины состояний в ManageCurrency.waiting_for_currency_name
+
+
+async def apply_currency_change(message: types.Message, statement, currency_name: str, rate=None) -> bool:
+    # Запись изменения валюты администратором. Транзакция при ошибке уже откатана,
+    # поэтому соединение остается пригодным; администратор получает сообщение об ошибке
+    try:
+        changed = await rate_cache.apply(statement, currency_name, rate)
+    except Exception:
+        logging.exception("Не удалось сохранить изменение валюты %s", currency_name)
+        await outbox.answer(message, "Не удалось сохранить изменение, попробуйте еще раз.")
+        return False
+    if not changed:  # Валюту удалили, пока администратор вводил курс
+        await answer_currency_not_found(message, keyboard=False, text=currency_name)
+    return changed
+
+
+async def parse_admin_rate(message: types.Message, state: FSMContext):
+    # Курс из сообщения администратора; None и сброс состояния, если это не положительное число
+    try:
+        return parse_decimal(message.text)
+    except ValueError:
+        await outbox.answer(message, "Некорректный курс. Введите положительное число, например 90.5, и начните заново.")
+        await state.set_state(None)
+        return None
+
+
+# Хэндлер для обработки ввода пользователем названия валюты
+@routes.state(ManageCurrency.waiting_for_currency_name, when=has_text)  # Текущее состояние машины состояний равно ManageCurrency.waiting_for_currency_name
+async def process_currency_name(message: types.Message, state: FSMContext):
+    currency_name = ' '.join(message.text.split())  # Без пробелов по краям и повторных пробелов
+
+    if not currency_name or len(currency_name) > 50:  # Столбец currency_name - VARCHAR(50)
+        await outbox.answer(message, "Название валюты должно содержать от 1 до 50 символов.")
+        await state.set_state(None)
+    elif await rate_cache.resolve_name(currency_name) is not None:  # Проверка существования валюты с таким же названием
+        await outbox.answer(message, f"Валюта {currency_name} уже существует.")
+        await state.set_state(None)  # Сброс текущего состояния машины состояний
+    else:
+        await state.update_data(currency_name=currency_name)  # Обновляет данные в текущем состоянии машины состояний, добавляя в них введенное пользователем название валюты
+        await state.set_state(ManageCurrency.waiting_for_currency_rate)  # Устанавливает новое состояние машины состояний, которое ожидает ввода пользователем курса валюты
+        await outbox.answer(message, f'Введите курс валюты {currency_name} к рублю:')  # Отправляет сообщение пользователю с запросом ввода курса валюты к рублю
+
+
+# Хэндлер для обработки ввода пользователем курса к рублю
+@routes.state(ManageCurrency.waiting_for_currency_rate, when=has_text)
+async def process_currency_rate(message: types.Message, state: FSMContext):
+    data = await state.get_data()  # Получение данных из текущего состояния машины состояни
+    currency_name = data.get('currency_name')  # Извлечение названия валюты из данных текущего состояния
+    currency_rate = await parse_admin_rate(message, state)  # Точное десятичное число вместо исключения на неверном вводе
+    if currency_rate is None:
+        return
+
+    # Добавление валюты; повторная доставка того же сообщения или одновременное добавление
+    # другим администратором не вызывают ошибку, а оставляют последний курс
+    if await apply_currency_change(message, (
+            "INSERT INTO currencies (currency_name, rate) VALUES (%s, %s) "
+            "ON CONFLICT (currency_name) DO UPDATE SET rate = EXCLUDED.rate RETURNING currency_name",
+            (currency_name, currency_rate)),
+            currency_name, currency_rate):
+        await outbox.answer(message, f"Валюта {currency_name} с курсом {currency_rate} успешно добавлена!")
+    await state.set_state(None)  # Сброс текущего состояния машины состояний
+
+
+# Хэндлер для нажатия на кнопку "Удалить валюту"
+@routes.text("Удалить валюту")
+async def delete_currency_command(message: types.Message, state: FSMContext):
+    await outbox.answer(message, "Введите название валюты, которую хотите удалить:")
+    await state.set_state(ManageCurrency.waiting_for_currency_name_delete)  # Установка текущего состояния машины состояний
+
+
+# Обработчик для удаления существующей валюты
+@routes.state(ManageCurrency.waiting_for_currency_name_delete, when=has_text)
+async def process_delete_currency_name(message: types.Message, state: FSMContext):
+    # Название, приведенное к сохраненному ("usd ", "доллар" -> "USD")
+    currency_name = await rate_cache.resolve_name(message.text)
+
+    # Базовую валюту удалить нельзя: через нее считаются все курсы и на нее ссылаются псевдонимы ("рубль")
+    if currency_name is None or currency_name == BASE_CURRENCY:
+        await answer_currency_not_found(message, keyboard=False)
+    # Выполнение SQL-запроса на удаление валюты с указанным названием из таблицы currencies базы данных
+    elif await apply_currency_change(message, ("DELETE FROM currencies WHERE currency_name = %s "
+                                               "RETURNING currency_name", (currency_name,)),
+                                     currency_name):
+        await outbox.answer(message, f"Валюта {currency_name} успешно удалена.")
+    await state.set_state(None)  # Сброс текущего состояния машины состояний
+
+
+# Хэндлер для кнопки "Изменить курс валюты"
+@routes.text("Изменить курс валюты")
+async def change_currency_rate_command(message: types.Message, state: FSMContext):
+    # Определение асинхронной функции change_currency_rate_command, которая принимает два аргумента: message типа types.Message и state типа FSMContext
+    await outbox.answer(message, "Введите название валюты:")
+    await state.set_state(ManageCurrency.waiting_for_currency_name_change)  # Установка текущего состояния машины состояний
+
+
+# Хэндлер для обработки выбранной валюты для обновления курса
+@routes.state(ManageCurrency.waiting_for_currency_name_change, when=has_text)
+async def process_currency_name_change(message: types.Message, state: FSMContext):
+    currency_name = await rate_cache.resolve_name(message.text)  # Поиск валюты без учета регистра и по псевдонимам
+
+    if currency_name is None or currency_name == BASE_CURRENCY:  # Проверка наличия данных о валюте
+        await answer_currency_not_found(message, keyboard=False)
+        await state.set_state(None)  # Сброс текущего состояния машины состояний
+    else:
+        await state.update_data(currency_name=currency_name)  # Обновление данных в текущем состоянии машины состояний с указанием нового названия валюты
+        await state.set_state(ManageCurrency.waiting_for_currency_rate_change)  # Установка текущего состояния машины состояний в ManageCurrency.waiting_for_currency_rate_change
+        await outbox.answer(message, f'Введите новый курс для валюты {currency_name} к рублю:')
+
+
+# Хэндлер для обработки ввода нового курса валюты к рублю
+@routes.state(ManageCurrency.waiting_for_currency_rate_change, when=has_text)
+async def process_currency_rate_change(message: types.Message, state: FSMContext):
+    data = await state.get_data()  # Получение данных из текущего состояния машины состояний
+    currency_name = data.get('currency_name')  # Извлечение названия валюты из данных текущего состояния
+    new_rate = await parse_admin_rate(message, state)
+    if new_rate is None:
+        return
+
+    # Обновление курса валюты в базе данных
+    if await apply_currency_change(message, ("UPDATE currencies SET rate = %s WHERE currency_name = %s "
+                                             "RETURNING currency_name", (new_rate, currency_name)), currency_name, new_rate):
+        await outbox.answer(message, f"Курс валюты {currency_name} успешно изменен на {new_rate}.")
+    await state.set_state(None)  # Сброс текущего состояния машины состояний
+
+
+# Хэндлер для команды /import_currencies
+@routes.command('import_currencies')
+async def import_currencies_command(message: types.Message, state: FSMContext):
+    if await is_user_admin(message.from_user.id):
+        await outbox.answer(message, "Отправьте файл CSV (название,курс) или JSON с курсами валют к рублю:")
+        await state.set_state(ManageCurrency.waiting_for_import_file)
+    else:
+        await outbox.answer(message, "Нет доступа к команде")
+
+
+# Хэндлер для загруженного файла с курсами и любого другого сообщения в этом состоянии; команды и кнопки прерывают диалог
+@routes.state(ManageCurrency.waiting_for_import_file, commands_first=True)
+async def process_import_file(message: types.Message, state: FSMContext):
+    await state.set_state(None)  # Сброс состояния до загрузки: при любой ошибке администратор не остается в диалоге
+    if message.document is None:  # Текст или фото вместо файла
+        await outbox.answer(message, "Ожидался файл CSV (название,курс) или JSON с курсами валют к рублю. "
+                                     "Импорт отменен, отправьте /import_currencies еще раз.")
+        return
+    try:
+        file = await message.bot.download(message.document)  # Скачивание файла в память (BytesIO)
+        rates = parse_rates_file(message.document.file_name or '', file.read())
+    except (ValueError, KeyError, TypeError) as error:  # json.JSONDecodeError является подклассом ValueError
+        await outbox.answer(message, f"Ошибка в файле: {error}")
+        return
+    except Exception:
+        logging.exception("Не удалось скачать файл с курсами")
+        await outbox.answer(message, "Не удалось скачать файл, попробуйте еще раз.")
+        return
+    try:
+        await import_rates(rates)
+    except Exception:
+        # Импорт идет одной транзакцией, при ошибке она откатывается и курсы остаются прежними
+        logging.exception("Не удалось загрузить курсы из файла")
+        await outbox.answer(message, "Не удалось сохранить курсы, изменения не применены. Попробуйте еще раз.")
+    else:
+        await outbox.answer(message, f"Загружено курсов: {len(rates)}")
+
+
+# Хэндлер для команды /export_currencies
+@routes.command('export_currencies')
+async def export_currencies_command(message: types.Message):
+    if await is_user_admin(message.from_user.id):
+        data = await export_rates()
+        document = types.BufferedInputFile(data, filename='currencies.csv')
+        await outbox.submit(message.chat.id, lambda: message.answer_document(document), BULK)
+    else:
+        await outbox.answer(message, "Нет доступа к команде")
+
+
+def currency_options_markup(options: list):
+    # Клавиатура с подходящими названиями валют; скрывается после нажатия
+    return types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True,
+                                     keyboard=[[types.KeyboardButton(text=name)] for name in options])
+
+
+async def answer_currency_not_found(message: types.Message, keyboard: bool = True, text: str = None):
+    # Предлагает валюты, начинающиеся с введенного текста или похожие на него:
+    # кнопками, если следующим сообщением ожидается название валюты, иначе текстом.
+    # text - название из аргументов команды; по умолчанию весь текст сообщения
+    text = message.text if text is None else text
+    options = rate_cache.names.complete(text) or rate_cache.names.suggest(text)
+    options = [name for name in options if name != BASE_CURRENCY]
+    if options and not keyboard:
+        await outbox.answer(message, f"Валюты {text} не существует. Возможно, вы имели в виду: "
+                                     f"{', '.join(options)}")
+    elif options:
+        await outbox.answer(message, f"Валюта {text} не найдена. Возможно, вы имели в виду:",
+                            reply_markup=currency_options_markup(options))
+    else:
+        await outbox.answer(message, f"Валюта {text} не найдена. Попробуйте снова.")
+
+
+def currencies_page_markup(page: int, total: int):
+    # Инлайн-клавиатура для перелистывания страниц списка валют
+    buttons = []
+    if page > 0:
+        buttons.append(types.InlineKeyboardButton(text="◀", callback_data=f"currencies:{page - 1}"))
+    buttons.append(types.InlineKeyboardButton(text=f"{page + 1}/{total}", callback_data="currencies:current"))
+    if page < total - 1:
+        buttons.append(types.InlineKeyboardButton(text="▶", callback_data=f"currencies:{page + 1}"))
+    return types.InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+
+# Хэндлер для команды /get_currencies
+@routes.command('get_currencies')
+# Определение асинхронной функции get_currencies_command, которая принимает один аргумент message типа types.Message
+async def get_currencies_command(message: types.Message):
+    pages = await get_currency_pages()  # Получение готовых страниц списка валют
+
+    if not pages:  # Проверка наличия данных о валютах
+        await outbox.answer(message, "Нет сохраненных валют")
+    elif len(pages) == 1:  # Весь список помещается в одно сообщение
+        await outbox.answer(message, pages[0], BULK)
+    else:
+        await outbox.answer(message, pages[0], BULK, reply_markup=currencies_page_markup(0, len(pages)))
+
+
+# Хэндлер для кнопок перелистывания списка валют, регистрируется в create_router
+async def currencies_page_callback(callback: types.CallbackQuery):
+    page = callback.data.split(':', 1)[1]
+    pages = await get_currency_pages()
+    if page != 'current' and pages:
+        page = min(int(page), len(pages) - 1)  # Список мог стать короче, пока сообщение висело в чате
+        markup = currencies_page_markup(page, len(pages))
+        await outbox.submit(callback.message.chat.id,
+                            lambda: callback.message.edit_text(pages[page], reply_markup=markup))
+    await callback.answer()
+
+
+# Хэндлер для команды /history: курс валюты по дням, например "/history USD 90"
+@routes.command('history')
+async def history_command(message: types.Message, command: CommandObject):
+    args = (command.args or '').split()
+    if not args or len(args) > 2 or (len(args) == 2 and not args[1].isdigit()):
+        await outbox.answer(message, "Ошибка: используйте формат /history USD или /history USD 90")
+        return
+    currency_name = await rate_cache.resolve_name(args[0])  # "usd" и "доллар" - тоже USD
+    if currency_name is None or currency_name == BASE_CURRENCY:
+        await answer_currency_not_found(message, keyboard=False, text=args[0])
+        return
+    days = int(args[1]) if len(args) == 2 else 30  # По умолчанию история за последние 30 дней
+    points = await rate_history.daily_series(currency_name, days)
+    if not points:
+        await outbox.answer(message, f"Нет истории курса {currency_name} за последние {days} дн.")
+        return
+    lines = [f"{day}: {rate}" for day, rate in points]
+    await outbox.answer(message, f"Курс {currency_name} к рублю:\n" + "\n".join(lines), BULK)
+
+
+# Хэндлер для команды /stats: сводка метрик процесса для администратора
+@routes.command('stats')
+async def stats_command(message: types.Message):
+    if await is_user_admin(message.from_user.id):
+        await outbox.answer(message, metrics.render_stats()[:MAX_MESSAGE_LENGTH], BULK)
+    else:
+        await outbox.answer(message, "Нет доступа к команде")
+
+
+# Хэндлер для команды /start
+@routes.command('start')
+async def start_command(message: types.Message):
+    if await is_user_admin(message.from_user.id):  # Проверка, является ли текущий пользователь администратором
+        button1 = types.KeyboardButton(text="/start")
+        button2 = types.KeyboardButton(text="/manage_currency")
+        button3 = types.KeyboardButton(text="/get_currencies")
+        button4 = types.KeyboardButton(text="/convert")
+        markup = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=4, keyboard=[[button1, button2, button3, button4]])
+        # Создание настраиваемой клавиатуры с кнопками, расположенными в 4 столбца
+        await outbox.answer(message, "Выберите команду из доступных:\n"
+                    "/manage_currency - открыть панель администратора\n"
+                    "/import_currencies - загрузить курсы из файла\n"
+                    "/export_currencies - выгрузить курсы в файл\n"
+                    "/stats - метрики бота\n"
+                    "/get_currencies - посмотреть список валют\n"
+                    "/convert - конвертировать валюту (или сразу /convert 100 USD EUR on 2024-05-01)\n"
+                    "/history USD - история курса по дням", reply_markup=markup)  # Отправка сообщения пользователю с информацией о доступных командах и настраиваемой клавиатурой
+    else:
+        button1 = types.KeyboardButton(text="/start")
+        button2 = types.KeyboardButton(text="/get_currencies")
+        button3 = types.KeyboardButton(text="/convert")
+        markup = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=3, keyboard=[[button1, button2, button3]])
+        await outbox.answer(message, "Выберите команду из доступных:\n"
+                             " /get_currencies - посмотреть список валют\n"
+                             " /convert - конвертировать валюту (или сразу /convert 100 USD EUR on 2024-05-01)\n"
+                             " /history USD - история курса по дням", reply_markup=markup)  # Отправка сообщения пользователю с информацией о доступных командах и настраиваемой клавиатурой
+
+
+# Хэндлер для команды /convert
+@routes.command('convert')  # Декоратор, который регистрирует функцию convert_command в качестве хэндлера для команды "/convert"
+async def convert_command(message: types.Message, state: FSMContext, command: CommandObject):
+    # Определение асинхронной функции convert_command, которая принимает аргументы: message типа types.Message, state типа FSMContext
+    # и command - разобранную команду с аргументами
+    if command.args:  # Команда вида "/convert 100 USD" или "/convert 100 USD EUR" обрабатывается одним сообщением
+        text = await convert_text(command.args)
+        await outbox.answer(message, text or "Ошибка: используйте формат /convert 100 USD или /convert 100 USD EUR "
+                                     "с сохраненными валютами.")
+        return
+    await outbox.answer(message, "Введите название валюты:")
+    await state.set_state(ManageCurrency.waiting_for_currency_name_convert)  # Установка текущего состояния машины состояний
+
+
+# Хэндлер для инлайн-запросов вида "@bot 100 USD", регистрируется в create_router
+async def convert_inline_query(inline_query: types.InlineQuery):
+    text = await convert_text(inline_query.query)
+    results = []
+    if text is not None:
+        results.append(types.InlineQueryResultArticle(
+            id='0', title=text, input_message_content=types.InputTextMessageContent(message_text=text)))
+    # Telegram кэширует ответ на одинаковые запросы столько же, сколько живет кэш курсов
+    await inline_query.answer(results, cache_time=int(rate_cache.ttl))
+
+
+# Обработчик для ввода названия валюты для конвертации
+@routes.state(ManageCurrency.waiting_for_currency_name_convert, when=has_text, commands_first=True)  # Команды и кнопки прерывают диалог
+async def process_currency_name_convert(message: types.Message, state: FSMContext):
+    currency_name = await rate_cache.resolve_name(message.text)  # "usd ", "Доллар" и "USD" - одна и та же валюта
+
+    if currency_name is None or currency_name == BASE_CURRENCY:
+        await answer_currency_not_found(message)  # Состояние не сбрасывается, можно выбрать валюту из подсказок
+        return
+    await state.update_data(currency_name=currency_name)  # Обновление данных в текущем состоянии машины состояний с указанием названия валюты
+    await state.set_state(ManageCurrency.waiting_for_currency_rate_convert)  # Установка текущего состояния машины состояний
+    await outbox.answer(message, "Введите сумму для конвертации:")
+
+
+# Обработчик для ввода суммы для конвертации
+@routes.state(ManageCurrency.waiting_for_currency_rate_convert, when=has_text, commands_first=True)
+async def process_currency_rate_convert(message: types.Message, state: FSMContext):
+    data = await state.get_data()  # Получение данных из текущего состояния машины состояний
+    currency_name = data.get('currency_name')  # Извлечение названия валюты из данных текущего состояния
+    try:
+        amount = parse_decimal(message.text)  # Преобразование текста сообщения пользователя в точное десятичное число
+    except ValueError:
+        await outbox.answer(message, "Некорректный формат суммы. Пожалуйста, введите положительное число.")
+        return  # Состояние не сбрасывается, пользователь может ввести сумму еще раз
+
+    rate = await rate_cache.get_rate(currency_name)  # Получение курса валюты с указанным названием из кэша
+
+    if rate is not None:  # Проверка наличия курса валюты
+        converted_amount = convert(amount, rate)  # Точный расчет суммы в рублях с округлением до копеек
+        await outbox.answer(message, f"{amount} {currency_name} = {converted_amount} рублей.")  # Отправка сообщения пользователю с результатом конвертации
+    else:
+        await outbox.answer(message, f"Ошибка: Валюта {currency_name} не найдена.")
+
+    await state.set_state(None)  # Сброс текущего состояния машины состояний
+
+
+def create_router() -> Router:
+    # Роутер с хэндлерами кнопок под сообщениями и инлайн-запросов, подключается в main.create_dispatcher.
+    # Роутер можно подключить только к одному диспетчеру, поэтому для каждого диспетчера создается новый
+    router = Router()
+    router.callback_query.register(currencies_page_callback, F.data.startswith('currencies:'))
+    router.inline_query.register(convert_inline_query)
+    return router
@@ -0,0 +1,135 @@
+from aiogram import types, Dispatcher, Bot
+from aiogram.fsm.storage.memory import MemoryStorage
+
+import os
+import asyncio
+import logging
+# Встроенный модуль Python, который предоставляет доступ к некоторым
+# переменным и функциям, взаимодействующим с интерпретатором Python
+import sys
+
+from admin import admin_cache, ensure_bootstrap_admin
+from common.metrics import metrics, ratio, start_metrics_server
+from common.routing import aiogram3_router
+from common.sender import outbox
+from currencies import rate_cache
+from database import PgStorage, close_pool, run_migrations
+from handlers import create_router, routes
+from middlewares import setup_metrics
+from rate_refresh import start_history_compaction, start_rate_refresh
+
+
+def create_bot() -> Bot:
+    # Создание бота с токеном из переменных окружения
+    return Bot(token=os.getenv('API_TOKEN_BOT'))
+
+
+def create_dispatcher() -> Dispatcher:
+    # Фабрика приложения: хранилище состояний, хэндлеры и хуки запуска и остановки.
+    # Подключение к базе данных и миграции выполняются в on_startup, а не при импорте модулей
+    # FSM_STORAGE=memory оставляет состояния в памяти процесса
+    if os.getenv('FSM_STORAGE', 'postgres') == 'memory':
+        storage = MemoryStorage()  # Создает экземпляр класса MemoryStorage для хранения состояний машины состояний в памяти
+    else:
+        # FSM_CACHE=off, если обновления одного чата обрабатывают разные процессы без супервизора
+        storage = PgStorage(float(os.getenv('FSM_FLUSH_INTERVAL', '0.05')), int(os.getenv('FSM_MAX_KEYS', '10000')),
+                            os.getenv('FSM_CACHE', 'on') != 'off')
+    dp = Dispatcher(storage=storage)  # Создает экземпляр класса Dispatcher с хранилищем состояний
+    dp.include_router(create_router())
+    dp.include_router(aiogram3_router(routes))  # Таблица маршрутов сообщений собирается один раз при создании диспетчера
+    setup_metrics(dp)
+    metrics.register_gauge('bot_rate_cache_hit_ratio', 'Доля чтений курсов из кэша',
+                           lambda: ratio(rate_cache.hits, rate_cache.misses))
+    metrics.register_gauge('bot_admin_cache_hit_ratio', 'Доля проверок прав администратора из кэша',
+                           lambda: ratio(admin_cache.hits, admin_cache.misses))
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
+
+
+def retry_after(error: Exception):
+    # Пауза из ответа 429 Too Many Requests; для остальных ошибок None
+    from aiogram.exceptions import TelegramRetryAfter
+    return error.retry_after if isinstance(error, TelegramRetryAfter) else None
+
+
+async def on_startup(dispatcher: Dispatcher, bot: Bot):
+    outbox.start(bot.send_message, retry_after)  # Очередь исходящих сообщений с учетом ограничений Telegram
+    await asyncio.to_thread(run_migrations)  # Приведение схемы базы данных к актуальной версии
+    await ensure_bootstrap_admin()  # Добавление администратора по умолчанию перед началом обработки сообщений
+    if os.getenv('METRICS_PORT'):  # Метрики в формате Prometheus по адресу /metrics
+        dispatcher['metrics_runner'] = await start_metrics_server(os.getenv('METRICS_HOST', '0.0.0.0'),
+                                                                  int(os.getenv('METRICS_PORT')))
+    if rate_cache.shared is None:  # Воркерам супервизора курсы обновляет сам супервизор
+        dispatcher['rate_refresh_task'] = start_rate_refresh()
+        dispatcher['history_compaction_task'] = start_history_compaction()
+
+
+async def on_shutdown(dispatcher: Dispatcher):
+    for name in ('rate_refresh_task', 'history_compaction_task'):
+        task = dispatcher.workflow_data.get(name)
+        if task is not None:
+            task.cancel()
+    runner = dispatcher.workflow_data.get('metrics_runner')
+    if runner is not None:
+        await runner.cleanup()
+    await outbox.stop()
+    await dispatcher.storage.close()  # Запись накопленных изменений состояний перед закрытием пула
+    close_pool()
+
+
+def update_chat_id(update: types.Update) -> int:
+    # Чат (или пользователь, если чата нет, например у инлайн-запроса), к которому относится обновление
+    event = update.event
+    chat = getattr(event, 'chat', None)
+    user = getattr(event, 'from_user', None)
+    return chat.id if chat else user.id if user else 0
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    # Прием обновлений через вебхук вместо опроса серверов Telegram
+    from common.webhook import WebhookServer  # aiohttp-сервер нужен только в этом режиме
+
+    server = WebhookServer(
+        parse_update=lambda data: types.Update.model_validate(data, context={"bot": bot}),
+        process_update=lambda update: dp.feed_update(bot, update),
+        shard_key=update_chat_id,
+        workers=int(os.getenv('WEBHOOK_WORKERS', '16')),
+        queue_size=int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000')),
+        secret_token=os.getenv('WEBHOOK_SECRET'),
+    )
+    webhook_path = os.getenv('WEBHOOK_PATH', '/webhook')
+    await dp.emit_startup(bot=bot, dispatcher=dp)  # В режиме вебхука хуки запуска и остановки вызываются вручную
+    try:
+        await server.start(os.getenv('WEBAPP_HOST', '0.0.0.0'), int(os.getenv('WEBAPP_PORT', '8080')), webhook_path)
+        # WEBHOOK_URL - публичный адрес сервера, например https://example.com
+        await bot.set_webhook(os.getenv('WEBHOOK_URL') + webhook_path, secret_token=os.getenv('WEBHOOK_SECRET'))
+        try:
+            await asyncio.Event().wait()  # Работаем до остановки программы
+        finally:
+            await bot.delete_webhook()
+            await server.stop()
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await bot.session.close()
+
+
+# Запуск бота
+async def main() -> None:  # Определение асинхронной функции main, которая будет выполняться при запуске приложения
+    bot = create_bot()
+    mode = os.getenv('BOT_MODE', 'polling')
+    if mode == 'webhook':
+        await run_webhook(bot, create_dispatcher())
+    elif mode == 'supervisor':  # Несколько процессов-воркеров, число задается BOT_WORKERS
+        from supervisor import run_supervisor
+        await run_supervisor(bot, int(os.getenv('BOT_WORKERS', str(os.cpu_count()))))
+    else:
+        dp = create_dispatcher()
+        await dp.start_polling(bot)  # Запуск бота с использованием метода start_polling диспетчера dp
+        # Этот метод запускает цикл опроса серверов Telegram на предмет новых сообщений и обновлений
+        # При использовании polling  бот регулярно отправляет запросы к серверам Telegram, чтобы проверить наличие новых событий
+
+
+if __name__ == "__main__":  # Проверка, что этот файл запускается напрямую
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)  # Вывод сообщений с уровнем INFO или выше в консоль
+    asyncio.run(main())  # Запуск асинхронной программы
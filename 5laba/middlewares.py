@@ -0,0 +1,40 @@
+# Middleware aiogram 3, собирающие метрики из metrics.py
+from aiogram import BaseMiddleware, Dispatcher
+
+import time
+
+from common.metrics import metrics
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    # Внешний middleware обновлений: общее время, запросы к базе и профилирование по выборке
+    async def __call__(self, handler, event, data):
+        started = metrics.start_update()
+        try:
+            return await handler(event, data)
+        finally:
+            metrics.finish_update(started)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    # Внутренний middleware: вызывается только когда хэндлер найден, поэтому знает его имя
+    async def __call__(self, handler, event, data):
+        state = data.get('state')
+        old_state = await state.get_state() if state is not None else None
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            # Для сообщений из таблицы маршрутов (routing.py) учитывается выбранный по ней хэндлер
+            callback = data['route'].callback if 'route' in data else data['handler'].callback
+            metrics.observe_handler(callback.__name__, time.perf_counter() - started)
+            if state is not None:
+                metrics.record_transition(old_state, await state.get_state())
+
+
+def setup_metrics(dp: Dispatcher):
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    handler_middleware = HandlerMetricsMiddleware()
+    # Внутренние middleware диспетчера действуют и на хэндлеры вложенных роутеров
+    for observer in (dp.message, dp.callback_query, dp.inline_query):
+        observer.middleware(handler_middleware)
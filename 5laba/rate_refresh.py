@@ -0,0 +1,119 @@
+# Фоновое обновление курсов из внешнего источника.
+# Источник (провайдер) - любой объект с корутиной fetch_rates(), возвращающей
+# словарь {название валюты: курс к рублю}. Обновляются только курсы валют,
+# которые уже есть в таблице, и только изменившиеся - одним запросом UPDATE.
+# Конвертации в это время продолжают читать кэш и обновления не ждут
+from decimal import Decimal
+from pathlib import Path
+
+import os
+import json
+import random
+import asyncio
+import logging
+
+from currencies import compact_history, parse_rates_file, rate_cache
+
+
+class CbrRateProvider:
+    # Курсы ЦБ РФ в формате https://www.cbr-xml-daily.ru/daily_json.js
+    def __init__(self, url: str = 'https://www.cbr-xml-daily.ru/daily_json.js', timeout: float = 10):
+        self.url = url
+        self.timeout = timeout
+
+    async def fetch_rates(self) -> dict:
+        from aiohttp import ClientSession, ClientTimeout
+        async with ClientSession(timeout=ClientTimeout(total=self.timeout)) as session:
+            async with session.get(self.url) as response:
+                response.raise_for_status()
+                data = json.loads(await response.text(), parse_float=Decimal)  # Курсы без потерь точности float
+        # Курс указан за Nominal единиц валюты (например, за 100 иен)
+        return {code: Decimal(valute['Value']) / valute['Nominal'] for code, valute in data['Valute'].items()}
+
+
+class FileRateProvider:
+    # Курсы из локального файла CSV или JSON в том же формате, что и для /import_currencies
+    def __init__(self, path: str):
+        self.path = path
+
+    async def fetch_rates(self) -> dict:
+        content = await asyncio.to_thread(Path(self.path).read_bytes)
+        return parse_rates_file(self.path, content)
+
+
+class StaticRateProvider:
+    # Заглушка для тестов: всегда возвращает одни и те же курсы
+    def __init__(self, rates: dict):
+        self.rates = rates
+
+    async def fetch_rates(self) -> dict:
+        return dict(self.rates)
+
+
+def provider_from_env():
+    # RATE_PROVIDER=cbr (адрес можно поменять в RATE_PROVIDER_URL) или RATE_PROVIDER=file с путем в RATE_PROVIDER_FILE
+    kind = os.getenv('RATE_PROVIDER')
+    if kind == 'cbr':
+        return CbrRateProvider(os.getenv('RATE_PROVIDER_URL', 'https://www.cbr-xml-daily.ru/daily_json.js'))
+    if kind == 'file':
+        return FileRateProvider(os.environ['RATE_PROVIDER_FILE'])
+    return None
+
+
+async def refresh_rates(provider) -> dict:
+    # Одно обновление: возвращает курсы, которые изменились и были записаны
+    fetched = await provider.fetch_rates()
+    current = await rate_cache.get_rates()
+    changed = {name: rate for name, rate in fetched.items() if name in current and current[name] != rate}
+    if changed:
+        await rate_cache.apply_many(changed)
+    return changed
+
+
+async def run_rate_refresh(provider, interval: float, jitter: float = 0.2, retry_delay: float = 30):
+    # Обновление раз в interval секунд со случайным сдвигом ±jitter, чтобы процессы разных ботов
+    # не обращались к источнику и к базе одновременно. После ошибки повтор через retry_delay,
+    # и пауза удваивается с каждой следующей ошибкой, но не превышает interval
+    delay = interval * random.uniform(0, jitter)  # Первое обновление вскоре после запуска
+    failures = 0
+    while True:
+        await asyncio.sleep(delay)
+        try:
+            changed = await refresh_rates(provider)
+        except Exception:
+            failures += 1
+            delay = min(retry_delay * 2 ** (failures - 1), interval)
+            logging.exception("Не удалось обновить курсы, повтор через %.0f с", delay)
+        else:
+            failures = 0
+            delay = interval * random.uniform(1 - jitter, 1 + jitter)
+            if changed:
+                logging.info("Обновлены курсы: %s", ', '.join(sorted(changed)))
+
+
+def start_rate_refresh():
+    # Запускает фоновую задачу, если источник курсов настроен; иначе возвращает None
+    provider = provider_from_env()
+    if provider is None:
+        return None
+    interval = float(os.getenv('RATE_REFRESH_INTERVAL', '3600'))
+    return asyncio.create_task(run_rate_refresh(provider, interval))
+
+
+async def run_history_compaction(keep_days: int, interval: float):
+    # Раз в interval секунд прореживает историю курсов старше keep_days дней до одного курса в день
+    while True:
+        try:
+            await compact_history(keep_days)
+        except Exception:
+            logging.exception("Не удалось сжать историю курсов")
+        await asyncio.sleep(interval)
+
+
+def start_history_compaction():
+    # HISTORY_KEEP_DAYS - сколько дней хранить все изменения курсов; 0 отключает сжатие
+    keep_days = int(os.getenv('HISTORY_KEEP_DAYS', '30'))
+    if keep_days <= 0:
+        return None
+    interval = float(os.getenv('HISTORY_COMPACT_INTERVAL', '86400'))
+    return asyncio.create_task(run_history_compaction(keep_days, interval))
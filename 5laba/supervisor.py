@@ -0,0 +1,134 @@
+# Режим супервизора: один процесс получает обновления от Telegram и раздает их
+# N процессам-воркерам, каждый со своим диспетчером. Обновления одного чата всегда
+# попадают к одному воркеру, поэтому порядок диалога и состояние машины состояний
+# сохраняются. Воркеры обмениваются курсами валют через общую память,
+# а упавший воркер супервизор запускает заново
+from aiogram import Bot, Dispatcher, types
+
+import os
+import asyncio
+import logging
+import multiprocessing
+
+from common.sender import outbox
+from common.webhook import ShardedUpdateQueue
+from currencies import SharedRates, rate_cache
+from database import close_pool
+from main import create_bot, create_dispatcher, update_chat_id
+from rate_refresh import start_history_compaction, start_rate_refresh
+
+
+async def process_queue(bot: Bot, dp: Dispatcher, queue, concurrency: int):
+    # Цикл воркера: забирает обновления из очереди супервизора и передает их диспетчеру.
+    # Внутри воркера обновления еще раз делятся по чатам между concurrency задачами
+    updates = ShardedUpdateQueue(lambda update: dp.feed_update(bot, update), update_chat_id, concurrency)
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    updates.start()
+    try:
+        while True:
+            data = await asyncio.to_thread(queue.get)
+            if data is None:  # Сигнал остановки от супервизора
+                break
+            await updates.put(types.Update.model_validate(data, context={"bot": bot}))
+    finally:
+        await updates.stop()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+
+
+def worker_main(index: int, queue, shared_name: str, shared_lock, concurrency: int, workers: int = 1):
+    logging.basicConfig(level=logging.INFO)
+    # Ограничение Telegram в 30 сообщений в секунду действует на весь бот, поэтому воркеры делят его поровну.
+    # Ограничения чатов остаются у воркеров: каждый чат обслуживает только один воркер
+    outbox.global_rate /= workers
+    if os.getenv('METRICS_PORT'):  # У каждого воркера свои метрики и свой порт: METRICS_PORT + номер воркера
+        os.environ['METRICS_PORT'] = str(int(os.environ['METRICS_PORT']) + index)
+    shared = SharedRates(shared_name, shared_lock)
+    rate_cache.attach_shared(shared)
+
+    async def run():
+        bot = create_bot()
+        try:
+            await process_queue(bot, create_dispatcher(), queue, concurrency)
+        finally:
+            await bot.session.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        shared.close()
+
+
+class Supervisor:
+    def __init__(self, workers: int, queue_size: int = 1000, concurrency: int = 16,
+                 shared_size: int = 1024 * 1024):
+        # spawn: воркеры запускаются чистыми процессами, без копии цикла событий супервизора
+        self._context = multiprocessing.get_context('spawn')
+        self.shared = SharedRates(lock=self._context.Lock(), size=shared_size)
+        self.concurrency = concurrency
+        self.queues = [self._context.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.processes = [None] * workers
+
+    def _start_worker(self, index: int):
+        process = self._context.Process(
+            target=worker_main, name=f"bot-worker-{index}",
+            args=(index, self.queues[index], self.shared.name, self.shared.lock, self.concurrency,
+                  len(self.queues)))
+        process.start()
+        self.processes[index] = process
+
+    def start(self):
+        for index in range(len(self.queues)):
+            self._start_worker(index)
+
+    def restart_dead_workers(self):
+        for index, process in enumerate(self.processes):
+            if not process.is_alive():
+                logging.warning("Воркер %s завершился с кодом %s, перезапуск", index, process.exitcode)
+                self._start_worker(index)  # Очередь воркера сохраняется, необработанные обновления не теряются
+
+    async def dispatch(self, update: types.Update):
+        queue = self.queues[update_chat_id(update) % len(self.queues)]
+        data = update.model_dump(mode='json', by_alias=True, exclude_none=True)
+        await asyncio.to_thread(queue.put, data)  # Если очередь воркера заполнена, опрос Telegram ждет
+
+    def stop(self, timeout: float = 30):
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.shared.close(unlink=True)
+
+
+async def watch_workers(supervisor: Supervisor, interval: float = 1.0):
+    while True:
+        await asyncio.sleep(interval)
+        supervisor.restart_dead_workers()
+
+
+async def run_supervisor(bot: Bot, workers: int):
+    supervisor = Supervisor(workers, int(os.getenv('WORKER_QUEUE_SIZE', '1000')),
+                            int(os.getenv('WORKER_CONCURRENCY', '16')))
+    supervisor.start()
+    watcher = asyncio.create_task(watch_workers(supervisor))
+    # Курсы из внешнего источника обновляет только супервизор и публикует их воркерам через общую память
+    rate_cache.attach_shared(supervisor.shared)
+    refresh = start_rate_refresh()
+    compaction = start_history_compaction()
+    offset = None
+    try:
+        await bot.delete_webhook()  # Опрос getUpdates не работает, пока у бота установлен вебхук
+        while True:
+            updates = await bot.get_updates(offset=offset, timeout=30)
+            for update in updates:
+                await supervisor.dispatch(update)
+                offset = update.update_id + 1
+    finally:
+        watcher.cancel()
+        for task in (refresh, compaction):
+            if task is not None:
+                task.cancel()
+        close_pool()
+        await asyncio.to_thread(supervisor.stop)
+        await bot.session.close()
@@ -0,0 +1,39 @@
+import sys
+import time
+import random
+from array import array
+
+from triangle_batch import classify_batch
+from triangle_func import get_triangle_type, IncorrectTriangleSides
+
+# Usage: python bench_batch.py [rows]
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+
+def python_loop(flat):
+    types = []
+    for index in range(0, len(flat), 3):
+        try:
+            types.append(get_triangle_type(flat[index], flat[index + 1], flat[index + 2]))
+        except IncorrectTriangleSides:
+            types.append(None)
+    return types
+
+
+def best_of(function, *args, repeat=3):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+if __name__ == "__main__":
+    rnd = random.Random(1)
+    flat = array("d", (rnd.randint(1, 10) for _ in range(ROWS * 3)))
+    loop = best_of(python_loop, flat)
+    batch = best_of(classify_batch, flat)
+    print(f"{ROWS} rows")
+    print(f"python loop:    {ROWS / loop:14,.0f} rows/s")
+    print(f"classify_batch: {ROWS / batch:14,.0f} rows/s ({loop / batch:.1f}x)")
@@ -0,0 +1,40 @@
+import sys
+import random
+import tracemalloc
+from array import array
+
+from triangle_class import Triangle
+from triangle_collection import TriangleCollection
+
+# Usage: python bench_memory.py [triangles]
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+
+class DictTriangle:
+    # Triangle as it was before: sides in the instance __dict__
+    def __init__(self, side1, side2, side3):
+        self.side1 = side1
+        self.side2 = side2
+        self.side3 = side3
+
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+if __name__ == "__main__":
+    rnd = random.Random(1)
+    rows = [(a, a, rnd.uniform(0.1, 1.9) * a) for a in (rnd.uniform(1, 100) for _ in range(COUNT))]
+    results = [
+        ("list of dict-based Triangle", measure(lambda: [DictTriangle(*row) for row in rows])),
+        ("list of slots Triangle", measure(lambda: [Triangle(*row) for row in rows])),
+        ("TriangleCollection", measure(lambda: TriangleCollection(array("d", (side for row in rows for side in row))))),
+    ]
+    print(f"{COUNT} triangles (side floats are shared with the input list and not counted)")
+    for title, size in results:
+        print(f"{title:30} {size / 2 ** 20:10.1f} MB {size / COUNT:8.1f} bytes/triangle")
@@ -0,0 +1,39 @@
+import os
+import sys
+import time
+import random
+import tempfile
+
+from triangle_stream import process_file
+
+# Usage: python bench_stream.py [megabytes] [workers]
+MEGABYTES = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+
+def generate(path):
+    rnd = random.Random(1)
+    block = "".join(f"{rnd.randint(1, 100)}, {rnd.randint(1, 100)}, {rnd.uniform(1, 100):.3f}\n" for _ in range(100000))
+    with open(path, "w") as file:
+        while file.tell() < MEGABYTES * 2 ** 20:
+            file.write(block)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "triangles.txt")
+        generate(path)
+        size = os.path.getsize(path) / 2 ** 20
+
+        started = time.perf_counter()
+        with open(path, "rb") as file:
+            while file.read(16 * 2 ** 20):
+                pass
+        read = time.perf_counter() - started
+
+        started = time.perf_counter()
+        totals = process_file(path, WORKERS)
+        elapsed = time.perf_counter() - started
+        print(f"{size:.0f} MB, {totals['rows']} rows, {WORKERS or os.cpu_count()} workers")
+        print(f"read only:       {size / read:8.1f} MB/s")
+        print(f"process_file:    {size / elapsed:8.1f} MB/s ({totals['rows'] / elapsed:,.0f} rows/s)")
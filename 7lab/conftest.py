@@ -0,0 +1,123 @@
+import json
+import os
+import time
+
+import pytest
+
+# Performance tests: run with --perf to compare against perf_baseline.json,
+# with --perf-save to store the current timings as the new baseline.
+# Timings are stored relative to a fixed pure-Python workload, so a baseline
+# taken on one machine stays roughly comparable on another.
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perf_baseline.json")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("perf")
+    group.addoption("--perf", action="store_true", help="run performance tests against the stored baseline")
+    group.addoption("--perf-save", action="store_true", help="run performance tests and store them as the baseline")
+    group.addoption("--perf-threshold", type=float, default=0.5,
+                    help="allowed slowdown against the baseline, 0.5 means 50%%")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "perf: performance test, runs only with --perf or --perf-save")
+    config.perf_results = {}
+    config.perf_report = []
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--perf") or config.getoption("--perf-save"):
+        return
+    skip = pytest.mark.skip(reason="performance test, run with --perf")
+    for item in items:
+        if "perf" in item.keywords:
+            item.add_marker(skip)
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    if config.getoption("--perf-save") and config.perf_results:
+        baseline = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as file:
+                baseline = json.load(file)
+        baseline.update(config.perf_results)
+        with open(BASELINE_PATH, "w") as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+            file.write("\n")
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if not config.perf_report:
+        return
+    terminalreporter.section("performance")
+    terminalreporter.write_line(f"{'test':45} {'time per call':>14} {'relative':>10} {'baseline':>10}")
+    for name, seconds, relative, baseline in config.perf_report:
+        baseline = "-" if baseline is None else f"{baseline:10.3f}"
+        terminalreporter.write_line(f"{name:45} {seconds * 1e6:11.1f} us {relative:10.3f} {baseline:>10}")
+
+
+def _calibration_workload():
+    return sum(index * index for index in range(10000))
+
+
+def _repeat_count(function, args, kwargs):
+    # Number of calls that take at least 20 ms
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            function(*args, **kwargs)
+        if time.perf_counter() - started >= 0.02:
+            return number
+        number *= 2
+
+
+def _time_per_call(function, args, kwargs, number):
+    started = time.perf_counter()
+    for _ in range(number):
+        function(*args, **kwargs)
+    return (time.perf_counter() - started) / number
+
+
+def _best_times(function, args, kwargs, rounds):
+    # Best time of one call of function and of the calibration workload. Rounds of the two
+    # alternate, so a slow period of a shared machine affects both and cancels out in the ratio
+    number = _repeat_count(function, args, kwargs)
+    calibration_number = _repeat_count(_calibration_workload, (), {})
+    best = calibration = float("inf")
+    for _ in range(rounds):
+        calibration = min(calibration, _time_per_call(_calibration_workload, (), {}, calibration_number))
+        best = min(best, _time_per_call(function, args, kwargs, number))
+    return best, calibration
+
+
+class Benchmark:
+    # Same call style as the pytest-benchmark fixture: benchmark(function, *args, **kwargs)
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.seconds = None
+
+    def __call__(self, function, *args, rounds=7, **kwargs):
+        result = function(*args, **kwargs)
+        self.seconds, calibration = _best_times(function, args, kwargs, rounds)
+        relative = self.seconds / calibration
+        self.config.perf_results[self.name] = relative
+        baseline = None
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as file:
+                baseline = json.load(file).get(self.name)
+        self.config.perf_report.append((self.name, self.seconds, relative, baseline))
+
+        if not self.config.getoption("--perf-save"):
+            threshold = self.config.getoption("--perf-threshold")
+            if baseline is not None and relative > baseline * (1 + threshold):
+                pytest.fail(f"{self.name}: {relative / baseline - 1:.0%} slower than the baseline "
+                            f"(allowed {threshold:.0%})")
+        return result
+
+
+@pytest.fixture
+def benchmark(request):
+    return Benchmark(request.node.name, request.config)
@@ -0,0 +1,75 @@
+import random
+from array import array
+
+import pytest
+
+import triangle_batch
+from triangle_batch import classify_batch, INVALID, TYPE_NAMES
+from triangle_func import get_triangle_type, IncorrectTriangleSides
+
+BACKENDS = ["python"] + (["numpy"] if triangle_batch.np is not None else [])
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(triangle_batch, "np", None)
+    return request.param
+
+
+def scalar_code(sides):
+    try:
+        return TYPE_NAMES.index(get_triangle_type(*sides))
+    except IncorrectTriangleSides:
+        return INVALID
+
+
+def test_batch_types(backend):
+    codes, valid = classify_batch([(5, 5, 5), (4, 4, 3), (3, 4, 5), (0, 0, 0), (1, 2, 3), (-2, 3, 4)])
+    assert list(codes) == [0, 1, 2, INVALID, INVALID, INVALID]
+    assert [bool(flag) for flag in valid] == [True, True, True, False, False, False]
+
+
+def test_batch_flat_buffer(backend):
+    codes, valid = classify_batch(array("d", [5, 5, 5, 1, 2, 3]))
+    assert list(codes) == [0, INVALID]
+
+
+def test_batch_matches_scalar(backend):
+    rnd = random.Random(7)
+    rows = [tuple(rnd.choice([rnd.randint(-1, 6), rnd.uniform(0, 6)]) for _ in range(3)) for _ in range(2000)]
+    rows += [(float("nan"), -1.0, 2.0), (float("nan"), 2.0, 2.0), (float("nan"),) * 3]
+    codes, valid = classify_batch(rows)
+    assert list(codes) == [scalar_code(row) for row in rows]
+    assert [bool(flag) for flag in valid] == [code != INVALID for code in codes]
+
+
+def narrow_rows(typecode):
+    # Rows whose pairwise sums do not fit in the buffer's own type
+    if typecode in "fd":
+        top = 3e38 if typecode == "f" else 1e308
+    else:
+        top = 2 ** (8 * array(typecode).itemsize - (typecode.islower())) - 1
+    rows = [(top, top, top), (top // 2 + 1, top // 2 + 1, top), (top * 4 // 5, top * 2 // 5, top), (1, top, top)]
+    if typecode in "fd":
+        rows = [tuple(float(side) for side in row) for row in rows]
+    return rows
+
+
+@pytest.mark.parametrize("typecode", ["b", "B", "h", "H", "i", "I", "l", "q", "f", "d"])
+def test_batch_narrow_buffer_types(backend, typecode):
+    rows = narrow_rows(typecode)
+    codes, valid = classify_batch(array(typecode, [side for row in rows for side in row]))
+    assert list(codes) == [scalar_code(array(typecode, row).tolist()) for row in rows]
+
+
+@pytest.mark.skipif(triangle_batch.np is None, reason="numpy is not installed")
+@pytest.mark.parametrize("dtype", ["int8", "uint8", "int16", "uint16", "int32", "uint32", "int64", "float16", "float32"])
+def test_batch_narrow_numpy_dtypes(dtype):
+    np = triangle_batch.np
+    # Python number, so building the rows does not overflow
+    top = np.iinfo(dtype).max if np.dtype(dtype).kind in "iu" else float(np.finfo(dtype).max)
+    rows = np.array([[top, top, top], [top // 2 + 1, top // 2 + 1, top], [top * 4 // 5, top * 2 // 5, top],
+                     [1, top, top], [200 % top, 100 % top, 250 % top]], dtype=dtype)
+    codes, valid = classify_batch(rows)
+    assert list(codes) == [scalar_code(row) for row in rows.tolist()]
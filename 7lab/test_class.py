@@ -19,5 +19,26 @@ def test_invalid_triangle_creation():
     with pytest.raises(IncorrectTriangleSides):
         triangle = Triangle(0, 0, 0)
 
+def test_triangle_is_immutable():
+    triangle = Triangle(3, 4, 5)
+    with pytest.raises(AttributeError):
+        triangle.side1 = 10
+    assert not hasattr(triangle, "__dict__")
+
+def test_area_and_angles():
+    triangle = Triangle(3, 4, 5)
+    assert triangle.area() == pytest.approx(6)
+    assert triangle.angles() == pytest.approx((36.8698976, 53.1301024, 90))
+    assert Triangle(1e8, 1e8, 1e-2).area() == pytest.approx(5e5)
+
+def test_similar_and_congruent():
+    triangle = Triangle(3, 4, 5)
+    assert triangle.is_congruent(Triangle(5, 3, 4))
+    assert triangle.is_similar(Triangle(10, 6, 8))
+    assert not triangle.is_congruent(Triangle(6, 8, 10))
+    assert not triangle.is_similar(Triangle(4, 4, 5))
+    assert triangle == Triangle(3, 4, 5)
+    assert len({triangle, Triangle(3, 4, 5)}) == 1
+
 if __name__ == "__main__":
     pytest.main()
\ No newline at end of file
@@ -0,0 +1,39 @@
+from array import array
+
+import pytest
+
+from triangle_class import Triangle, IncorrectTriangleSides
+from triangle_collection import TriangleCollection, chunked, write
+
+
+def test_collection_indexing():
+    collection = TriangleCollection([(5, 5, 5), (4, 4, 3), (3, 4, 5)])
+    assert len(collection) == 3
+    assert collection[1] == Triangle(4, 4, 3)
+    assert collection[-1].triangle_type() == "nonequilateral"
+    assert list(collection.types()) == [0, 1, 2]
+    assert list(collection.perimeters()) == [15, 11, 12]
+
+
+def test_collection_views_share_buffer():
+    sides = array("d", [5, 5, 5, 4, 4, 3, 3, 4, 5])
+    view = TriangleCollection(sides)[1:]
+    sides[3] = 4.5
+    assert len(view) == 2
+    assert view[0] == Triangle(4.5, 4, 3)
+
+
+def test_collection_invalid_row():
+    with pytest.raises(IncorrectTriangleSides, match="row 1"):
+        TriangleCollection([(3, 4, 5), (1, 2, 3)])
+
+
+def test_collection_memory_mapped_file(tmp_path):
+    path = tmp_path / "triangles.bin"
+    assert write(path, chunked(((n, n, n) for n in range(1, 1001)), rows=300)) == 1000
+    with TriangleCollection.open(path) as collection:
+        assert len(collection) == 1000
+        assert collection[999] == Triangle(1000, 1000, 1000)
+    TriangleCollection([(3, 4, 5)]).save(path)
+    with TriangleCollection.open(path) as collection:
+        assert list(collection) == [Triangle(3, 4, 5)]
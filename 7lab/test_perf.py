@@ -0,0 +1,68 @@
+import random
+from array import array
+
+import pytest
+
+import triangle_batch
+from triangle_batch import classify_batch
+from triangle_class import Triangle, IncorrectTriangleSides as ClassIncorrectSides
+from triangle_collection import TriangleCollection
+from triangle_func import get_triangle_type, IncorrectTriangleSides
+
+# Run with: python -m pytest test_perf.py --perf (or --perf-save to update perf_baseline.json)
+pytestmark = pytest.mark.perf
+
+rnd = random.Random(1)
+ROWS = [(rnd.randint(1, 10), rnd.randint(1, 10), rnd.randint(1, 10)) for _ in range(10000)]
+FLAT = array("d", [side for row in ROWS for side in row])
+
+
+@pytest.fixture(params=["python", "numpy"])
+def backend(request, monkeypatch):
+    if request.param == "numpy" and triangle_batch.np is None:
+        pytest.skip("numpy is not installed")
+    if request.param == "python":
+        monkeypatch.setattr(triangle_batch, "np", None)
+    return request.param
+
+
+def classify_scalar(rows):
+    types = []
+    for row in rows:
+        try:
+            types.append(get_triangle_type(*row))
+        except IncorrectTriangleSides:
+            types.append(None)
+    return types
+
+
+def classify_objects(rows):
+    types = []
+    for row in rows:
+        try:
+            types.append(Triangle(*row).triangle_type())
+        except ClassIncorrectSides:
+            types.append(None)
+    return types
+
+
+def test_scalar_function(benchmark):
+    benchmark(classify_scalar, ROWS)
+
+
+def test_class(benchmark):
+    benchmark(classify_objects, ROWS)
+
+
+def test_class_derived_values(benchmark):
+    triangles = [Triangle(3, 4, 5 + index / len(ROWS)) for index in range(len(ROWS))]
+    benchmark(lambda: [(triangle.area(), triangle.angles()) for triangle in triangles])
+
+
+def test_batch(benchmark, backend):
+    benchmark(classify_batch, FLAT)
+
+
+def test_collection_types(benchmark, backend):
+    collection = TriangleCollection([(3, 4, 5)] * len(ROWS))
+    benchmark(collection.types)
@@ -0,0 +1,113 @@
+import random
+from array import array
+from itertools import permutations
+
+import pytest
+
+import triangle_batch
+from triangle_batch import classify_batch, INVALID, TYPE_NAMES
+from triangle_class import Triangle, IncorrectTriangleSides as ClassIncorrectSides
+from triangle_collection import TriangleCollection
+from triangle_func import get_triangle_type, IncorrectTriangleSides
+
+# Property tests over seeded random cases: a failure is reproducible and the seed is in the test id
+SEEDS = range(5)
+CASES = 500
+
+
+def side(rnd):
+    kind = rnd.randrange(5)
+    if kind == 0:
+        return rnd.randint(-2, 6)
+    if kind == 1:
+        return rnd.uniform(-1, 6)
+    if kind == 2:
+        return rnd.randint(1, 10 ** 30)
+    if kind == 3:
+        return rnd.choice([0.1, 0.2, 0.3, 1e-300, 5e-324, 1e308, 2.0 ** 53, 2.0 ** 53 + 2])
+    return rnd.randint(2 ** 52, 2 ** 54)
+
+
+def edge_case(rnd):
+    # Sides on the triangle inequality: c == a + b exactly, or off by one unit in the last place
+    a, b = side(rnd), side(rnd)
+    c = a + b
+    if isinstance(c, float):
+        c = rnd.choice([c, c * (1 + 2 ** -52), c * (1 - 2 ** -53)])
+    else:
+        c += rnd.choice([-1, 0, 1])
+    return tuple(rnd.sample([a, b, c], 3))
+
+
+def cases(seed):
+    rnd = random.Random(seed)
+    return [tuple(side(rnd) for _ in range(3)) if rnd.random() < 0.7 else edge_case(rnd) for _ in range(CASES)]
+
+
+def scalar_type(sides):
+    try:
+        return get_triangle_type(*sides)
+    except IncorrectTriangleSides:
+        return None
+
+
+def class_type(sides):
+    try:
+        return Triangle(*sides).triangle_type()
+    except ClassIncorrectSides:
+        return None
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_function_and_class_agree(seed):
+    for sides in cases(seed):
+        assert scalar_type(sides) == class_type(sides), sides
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_type_does_not_depend_on_side_order(seed):
+    for sides in cases(seed):
+        assert len({scalar_type(order) for order in permutations(sides)}) == 1, sides
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_degenerate_triangles_are_invalid(seed):
+    rnd = random.Random(seed)
+    for _ in range(CASES):
+        a, b = rnd.randint(1, 10 ** 30), rnd.randint(1, 10 ** 30)
+        assert scalar_type((a, b, a + b)) is None, (a, b)
+        assert scalar_type((a, b, a + b - 1)) is not None, (a, b)
+        # For floats the rounded sum is compared, so a + b == c is invalid whatever the rounding
+        x, y = rnd.uniform(1e-9, 1e9), rnd.uniform(1e-9, 1e9)
+        assert scalar_type((x, y, x + y)) is None, (x, y)
+
+
+def test_huge_int_edges():
+    big = 10 ** 30
+    assert get_triangle_type(big, big + 1, 2 * big) == "nonequilateral"
+    assert scalar_type((big, big, 2 * big)) is None
+    # As floats these sides are equal, as ints they are not
+    assert get_triangle_type(2 ** 53, 2 ** 53 + 1, 2 ** 53) == "isosceles"
+    assert get_triangle_type(2 ** 53, 2 ** 53 + 1, 2 ** 53 + 2) == "nonequilateral"
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+@pytest.mark.parametrize("seed", SEEDS)
+def test_batch_agrees_with_scalar(seed, backend, monkeypatch):
+    if backend == "numpy" and triangle_batch.np is None:
+        pytest.skip("numpy is not installed")
+    if backend == "python":
+        monkeypatch.setattr(triangle_batch, "np", None)
+    rows = cases(seed)
+    expected = [TYPE_NAMES.index(name) if name else INVALID for name in map(scalar_type, rows)]
+    assert list(classify_batch(rows)[0]) == expected
+    floats = [row for row in rows if all(isinstance(value, float) for value in row)]
+    assert list(classify_batch(array("d", [value for row in floats for value in row]))[0]) == \
+        [TYPE_NAMES.index(name) if name else INVALID for name in map(scalar_type, floats)]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_collection_agrees_with_class(seed):
+    rows = [row for row in cases(seed) if class_type(row) and all(isinstance(value, float) for value in row)]
+    collection = TriangleCollection(rows)
+    assert [triangle.triangle_type() for triangle in collection] == list(map(class_type, rows))
@@ -0,0 +1,58 @@
+import csv
+import io
+import random
+
+import pytest
+
+from triangle_func import get_triangle_type, IncorrectTriangleSides
+from triangle_stream import process_file, main
+
+
+@pytest.fixture
+def triangle_file(tmp_path):
+    rnd = random.Random(3)
+    rows = [(rnd.randint(-1, 5), rnd.randint(0, 5), rnd.randint(1, 5)) for _ in range(3000)]
+    lines = [f"{a}, {b}, {c}" for a, b, c in rows]
+    lines[10] = "Positive tests:"
+    lines[2000] = ""
+    path = tmp_path / "triangles.txt"
+    path.write_text("\n".join(lines) + "\n")
+    return path, rows
+
+
+def expected_totals(rows):
+    totals = {"equilateral": 0, "isosceles": 0, "nonequilateral": 0, "invalid": 0}
+    for index, row in enumerate(rows):
+        if index in (10, 2000):
+            continue
+        try:
+            totals[get_triangle_type(*row)] += 1
+        except IncorrectTriangleSides:
+            totals["invalid"] += 1
+    return totals
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_stream_counts(triangle_file, workers):
+    path, rows = triangle_file
+    report = io.StringIO()
+    totals = process_file(path, workers=workers, chunk_bytes=1000, report=csv.writer(report))
+    assert {name: totals[name] for name in expected_totals(rows)} == expected_totals(rows)
+    assert totals["malformed"] == 1
+    assert totals["rows"] == len(rows) - 1
+
+    reported = list(csv.reader(io.StringIO(report.getvalue())))
+    assert ["11", "Positive tests:", "malformed"] in reported
+    invalid_lines = [int(line) for line, text, reason in reported if reason == "invalid sides"]
+    assert len(invalid_lines) == totals["invalid"]
+    assert invalid_lines == sorted(invalid_lines)
+    line = invalid_lines[0]
+    with pytest.raises(IncorrectTriangleSides):
+        get_triangle_type(*rows[line - 1])
+
+
+def test_stream_cli(triangle_file, tmp_path, capsys):
+    path, rows = triangle_file
+    main([str(path), "--workers", "1", "--quiet", "--invalid-report", str(tmp_path / "invalid.csv")])
+    assert '"malformed": 1' in capsys.readouterr().out
+    assert (tmp_path / "invalid.csv").read_text().startswith("line,text,reason")
@@ -0,0 +1,101 @@
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INVALID = -1
+EQUILATERAL = 0
+ISOSCELES = 1
+NONEQUILATERAL = 2
+
+TYPE_NAMES = ("equilateral", "isosceles", "nonequilateral")
+
+
+CHUNK_ROWS = 32768
+
+
+def _classify_chunk(sides, codes, valid):
+    # Columns are copied to contiguous arrays: strided reads of an (N, 3) block are several times slower
+    a, b, c = np.ascontiguousarray(sides.T)
+    # Same comparisons as get_triangle_type, so NaN rows are classified the same way
+    total = a + b
+    invalid = total <= c
+    np.add(b, c, out=total)
+    invalid |= total <= a
+    np.add(a, c, out=total)
+    invalid |= total <= b
+    np.fmin(a, b, out=total)  # fmin skips NaN, like the separate side <= 0 checks
+    np.fmin(total, c, out=total)
+    invalid |= total <= 0
+
+    ab = a == b
+    bc = b == c
+    isosceles = ab | bc
+    isosceles |= a == c
+    ab &= bc
+    np.subtract(NONEQUILATERAL, isosceles, out=codes, casting="unsafe")
+    codes -= ab
+    np.copyto(codes, INVALID, where=invalid)
+    np.logical_not(invalid, out=valid)
+
+
+def _classify_numpy(sides):
+    sides = np.asarray(sides)
+    if sides.dtype.kind == "O" or sides.dtype.kind in "iu" and sides.size and (sides.max() >= 2 ** 62 or sides.min() <= -2 ** 62):
+        # Ints that do not fit in int64 (or whose sums would overflow) are compared exactly, as Python ints
+        codes, valid = _classify_python(sides.reshape(-1, 3).tolist())
+        return np.frombuffer(codes, dtype=np.int8), np.frombuffer(valid, dtype=np.int8).astype(bool)
+    if sides.dtype.kind not in "iuf":
+        sides = sides.astype(np.float64)
+    elif sides.dtype.itemsize < 8:
+        # Sums of narrow types overflow in their own dtype (uint8 200 + 100 == 44), scalar sums do not
+        sides = sides.astype(np.int64 if sides.dtype.kind in "iu" else np.float64)
+    sides = sides.reshape(-1, 3)
+    codes = np.empty(len(sides), dtype=np.int8)
+    valid = np.empty(len(sides), dtype=bool)
+    # Chunks keep temporaries in cache
+    with np.errstate(over="ignore"):  # Sums of huge floats become inf, as they do for Python floats
+        for start in range(0, len(sides), CHUNK_ROWS):
+            stop = start + CHUNK_ROWS
+            _classify_chunk(sides[start:stop], codes[start:stop], valid[start:stop])
+    return codes, valid
+
+
+def _rows(sides):
+    try:
+        view = memoryview(sides)
+    except TypeError:
+        return sides
+    if view.ndim == 1:
+        flat = view.tolist()
+        return zip(flat[0::3], flat[1::3], flat[2::3])
+    return view.tolist()
+
+
+def _classify_python(sides):
+    codes = array("b")
+    valid = array("b")
+    for side1, side2, side3 in _rows(sides):
+        if side1 <= 0 or side2 <= 0 or side3 <= 0 or side1 + side2 <= side3 or side2 + side3 <= side1 or side1 + side3 <= side2:
+            codes.append(INVALID)
+            valid.append(0)
+            continue
+        if side1 == side2 == side3:
+            codes.append(EQUILATERAL)
+        elif side1 == side2 or side1 == side3 or side2 == side3:
+            codes.append(ISOSCELES)
+        else:
+            codes.append(NONEQUILATERAL)
+        valid.append(1)
+    return codes, valid
+
+
+def classify_batch(sides):
+    # sides: (N, 3) array, buffer (flat buffers are read as consecutive triples) or iterable of triples.
+    # Returns (codes, valid): TYPE_NAMES index per row (INVALID for invalid rows) and validity mask.
+    # With numpy these are int8 and bool arrays, without it array("b") of codes and 0/1 flags.
+    if np is not None:
+        return _classify_numpy(sides)
+    return _classify_python(sides)
@@ -1,23 +1,87 @@
+import math
+
+
 class IncorrectTriangleSides(Exception):
     pass
 
 
 class Triangle:
+    # Sides are fixed after creation, so derived values are computed once and cached
+    __slots__ = ("side1", "side2", "side3", "_type", "_perimeter", "_area")
+
     def __init__(self, side1, side2, side3):
         if side1 <= 0 or side2 <= 0 or side3 <= 0 or side1 + side2 <= side3 or side2 + side3 <= side1 or side1 + side3 <= side2:
             raise IncorrectTriangleSides("Invalid side lengths for a triangle")
 
-        self.side1 = side1
-        self.side2 = side2
-        self.side3 = side3
+        set_attribute = object.__setattr__
+        set_attribute(self, "side1", side1)
+        set_attribute(self, "side2", side2)
+        set_attribute(self, "side3", side3)
+        set_attribute(self, "_type", None)
+        set_attribute(self, "_perimeter", None)
+        set_attribute(self, "_area", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Triangle is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Triangle is immutable")
+
+    def __repr__(self):
+        return f"Triangle({self.side1!r}, {self.side2!r}, {self.side3!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Triangle):
+            return NotImplemented
+        return self.sides() == other.sides()
+
+    def __hash__(self):
+        return hash(self.sides())
+
+    def sides(self):
+        return self.side1, self.side2, self.side3
 
     def triangle_type(self):
-        if self.side1 == self.side2 == self.side3:
-            return "equilateral"
-        elif self.side1 == self.side2 or self.side1 == self.side3 or self.side2 == self.side3:
-            return "isosceles"
-        else:
-            return "nonequilateral"
+        if self._type is None:
+            if self.side1 == self.side2 == self.side3:
+                triangle_type = "equilateral"
+            elif self.side1 == self.side2 or self.side1 == self.side3 or self.side2 == self.side3:
+                triangle_type = "isosceles"
+            else:
+                triangle_type = "nonequilateral"
+            object.__setattr__(self, "_type", triangle_type)
+        return self._type
 
     def perimeter(self):
-        return self.side1 + self.side2 + self.side3
\ No newline at end of file
+        if self._perimeter is None:
+            object.__setattr__(self, "_perimeter", self.side1 + self.side2 + self.side3)
+        return self._perimeter
+
+    def area(self):
+        if self._area is None:
+            # Heron's formula in the form that stays accurate for needle-like triangles (sides sorted a >= b >= c)
+            a, b, c = sorted(self.sides(), reverse=True)
+            product = (a + (b + c)) * (c - (a - b)) * (c + (a - b)) * (a + (b - c))
+            object.__setattr__(self, "_area", math.sqrt(max(product, 0)) / 4)
+        return self._area
+
+    def angles(self):
+        # Angles in degrees opposite side1, side2 and side3
+        a, b, c = self.sides()
+        return (
+            _angle(a, b, c),
+            _angle(b, a, c),
+            _angle(c, a, b),
+        )
+
+    def is_congruent(self, other, rel_tol=1e-9):
+        return all(math.isclose(x, y, rel_tol=rel_tol) for x, y in zip(sorted(self.sides()), sorted(other.sides())))
+
+    def is_similar(self, other, rel_tol=1e-9):
+        ratio = max(other.sides()) / max(self.sides())
+        return all(math.isclose(x * ratio, y, rel_tol=rel_tol) for x, y in zip(sorted(self.sides()), sorted(other.sides())))
+
+
+def _angle(opposite, side1, side2):
+    cosine = (side1 * side1 + side2 * side2 - opposite * opposite) / (2 * side1 * side2)
+    return math.degrees(math.acos(min(1.0, max(-1.0, cosine))))
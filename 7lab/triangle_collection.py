@@ -0,0 +1,164 @@
+import mmap
+import struct
+import sys
+from array import array
+from itertools import islice
+
+from triangle_batch import classify_batch, np
+from triangle_class import Triangle, IncorrectTriangleSides
+
+# File format: 16-byte header (magic, byte order, row count) followed by float64 sides, three per triangle
+MAGIC = b"TRI1"
+HEADER = struct.Struct("<4s4sQ")
+BYTE_ORDER = sys.byteorder.encode().ljust(4)[:4]
+WRITE_CHUNK_ROWS = 65536
+
+
+def _as_doubles(data):
+    # Flat float64 memoryview; float64 buffers are used without copying
+    try:
+        view = memoryview(data)
+    except TypeError:
+        return memoryview(array("d", (side for row in data for side in row)))
+    if view.format in ("d", "<d", "=d") and view.c_contiguous:
+        return view.cast("B").cast("d")
+    values = view.tolist()
+    if view.ndim > 1:
+        values = [side for row in values for side in row]
+    return memoryview(array("d", values))
+
+
+def _check_valid(sides, first_row=0):
+    valid = classify_batch(sides)[1]
+    if isinstance(valid, array):
+        if all(valid):
+            return
+        row = valid.index(0)
+    elif valid.all():
+        return
+    else:
+        row = int(np.argmin(valid))
+    raise IncorrectTriangleSides(f"Invalid side lengths for a triangle in row {first_row + row}")
+
+
+class TriangleCollection:
+    # Triangles stored as one contiguous float64 buffer: three sides per row, no object per triangle.
+    # Slices and views share the buffer; Triangle objects are created only on indexing
+    def __init__(self, sides=(), validate=True):
+        view = _as_doubles(sides)
+        if len(view) % 3:
+            raise ValueError("Number of sides is not a multiple of 3")
+        if validate and len(view):
+            _check_valid(view)
+        self._sides = view
+        self._mmap = None
+
+    @classmethod
+    def from_triangles(cls, triangles):
+        return cls(array("d", (side for triangle in triangles for side in triangle.sides())), validate=False)
+
+    def __len__(self):
+        return len(self._sides) // 3
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("TriangleCollection slices must be contiguous")
+            return self.view(start, stop)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("TriangleCollection index out of range")
+        return Triangle(*self._sides[3 * index:3 * index + 3])
+
+    def __iter__(self):
+        sides = self._sides
+        for index in range(0, len(sides), 3):
+            yield Triangle(sides[index], sides[index + 1], sides[index + 2])
+
+    def view(self, start, stop):
+        collection = TriangleCollection.__new__(TriangleCollection)
+        collection._sides = self._sides[3 * start:3 * stop]
+        collection._mmap = None
+        return collection
+
+    def sides(self):
+        # Flat memoryview of the sides without copying
+        return self._sides
+
+    def as_numpy(self):
+        # (N, 3) float64 array over the same memory
+        if np is None:
+            raise ImportError("numpy is required for as_numpy()")
+        return np.frombuffer(self._sides, dtype=np.float64).reshape(-1, 3)
+
+    def types(self):
+        return classify_batch(self._sides)[0]
+
+    def perimeters(self):
+        if np is not None:
+            return self.as_numpy().sum(axis=1)
+        sides = self._sides
+        return array("d", (sides[index] + sides[index + 1] + sides[index + 2] for index in range(0, len(sides), 3)))
+
+    def save(self, path):
+        write(path, [self._sides])
+
+    @classmethod
+    def open(cls, path):
+        # Maps the file read-only; only the pages that are read are loaded into memory
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, byte_order, rows = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            mapped.close()
+            raise ValueError(f"{path} is not a triangle collection file")
+        if byte_order != BYTE_ORDER:
+            mapped.close()
+            raise ValueError(f"{path} was written on a machine with different byte order")
+        collection = cls.__new__(cls)
+        collection._sides = memoryview(mapped)[HEADER.size:HEADER.size + rows * 3 * 8].cast("d")
+        collection._mmap = mapped
+        return collection
+
+    def close(self):
+        # Views taken from a mapped collection must be released before closing it
+        self._sides.release()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write(path, chunks):
+    # Writes chunks of sides (buffers or iterables of triples) without holding the whole collection in memory
+    rows = 0
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, BYTE_ORDER, 0))
+        for chunk in chunks:
+            sides = _as_doubles(chunk)
+            if len(sides) % 3:
+                raise ValueError("Number of sides is not a multiple of 3")
+            if len(sides):
+                _check_valid(sides, rows)
+            file.write(sides)
+            rows += len(sides) // 3
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, BYTE_ORDER, rows))
+    return rows
+
+
+def chunked(triples, rows=WRITE_CHUNK_ROWS):
+    # Splits an iterable of triples into chunks for write()
+    triples = iter(triples)
+    while True:
+        chunk = list(islice(triples, rows))
+        if not chunk:
+            return
+        yield chunk
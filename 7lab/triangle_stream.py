@@ -0,0 +1,168 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from array import array
+from collections import deque
+from multiprocessing import Pool
+
+from triangle_batch import classify_batch, np, INVALID, TYPE_NAMES
+
+# Usage: python triangle_stream.py triangles.txt --workers 8 --invalid-report invalid.csv
+# Each line holds three sides separated by spaces, commas, semicolons or tabs.
+# Blank lines are skipped; any other line without three numbers is reported as malformed.
+
+CHUNK_BYTES = 4 * 2 ** 20  # Parsed lines and fields take about 10 times the chunk size in a worker
+DELIMITERS = bytes.maketrans(b",;\t", b"   ")
+
+
+def chunk_ranges(path, chunk_bytes=CHUNK_BYTES):
+    # Byte ranges of about chunk_bytes that end on a line boundary; the file itself is read by the workers
+    size = os.path.getsize(path)
+    with open(path, "rb") as file:
+        start = 0
+        while start < size:
+            file.seek(min(start + chunk_bytes, size))
+            file.readline()
+            end = min(file.tell(), size)
+            yield start, end
+            start = end
+
+
+def _parse_lines(lines):
+    # Returns line indexes of the parsed rows, their sides and line indexes of malformed lines
+    rows = []
+    sides = array("d")
+    malformed = []
+    for index, line in enumerate(lines):
+        fields = line.split()
+        if not fields:
+            continue
+        if len(fields) == 3:
+            try:
+                values = [float(field) for field in fields]
+            except ValueError:
+                pass
+            else:
+                rows.append(index)
+                sides.extend(values)
+                continue
+        malformed.append(index)
+    return rows, sides, malformed
+
+
+def classify_chunk(path, start, end):
+    # Classifies one byte range of the file; line numbers in the result are relative to the chunk
+    with open(path, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    text = data.translate(DELIMITERS)
+    lines = text.split(b"\n")
+    if lines and not lines[-1]:
+        lines.pop()
+
+    if set(map(len, map(bytes.split, lines))) == {3}:
+        # Every line is a triple: parse the whole chunk at once
+        try:
+            sides = array("d", map(float, text.split()))
+        except ValueError:
+            rows, sides, malformed = _parse_lines(lines)
+        else:
+            rows, malformed = None, []
+    else:
+        rows, sides, malformed = _parse_lines(lines)
+
+    codes, valid = classify_batch(sides)
+    if isinstance(codes, array):
+        counts = [codes.count(code) for code in range(len(TYPE_NAMES))]
+        invalid_rows = [row for row, flag in enumerate(valid) if not flag] if codes.count(INVALID) else []
+    else:
+        counts = np.bincount(codes[valid], minlength=len(TYPE_NAMES)).tolist()
+        invalid_rows = np.flatnonzero(~valid).tolist()
+
+    invalid = [(row if rows is None else rows[row], "invalid sides") for row in invalid_rows]
+    invalid += [(index, "malformed") for index in malformed]
+    if invalid:
+        raw_lines = data.split(b"\n")
+        invalid = [(index, raw_lines[index].decode(errors="replace").strip(), reason) for index, reason in sorted(invalid)]
+    return counts, invalid, len(lines)
+
+
+def process_file(path, workers=None, chunk_bytes=CHUNK_BYTES, report=None, progress=None):
+    # Classifies the file chunk by chunk. At most two chunks per worker are in flight, and results
+    # are written in file order as they arrive, so memory use does not depend on the file size.
+    # report: csv.writer for invalid rows; progress: called with the running totals after each chunk
+    totals = dict.fromkeys(TYPE_NAMES, 0)
+    totals.update(invalid=0, malformed=0, rows=0, bytes=0)
+    line_offset = 0
+
+    def collect(result, start, end):
+        nonlocal line_offset
+        counts, invalid, lines = result
+        for name, count in zip(TYPE_NAMES, counts):
+            totals[name] += count
+        for index, text, reason in invalid:
+            totals["invalid" if reason == "invalid sides" else "malformed"] += 1
+            if report is not None:
+                report.writerow((line_offset + index + 1, text, reason))
+        totals["rows"] += sum(counts) + len(invalid)
+        totals["bytes"] += end - start
+        line_offset += lines
+        if progress is not None:
+            progress(totals)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for start, end in chunk_ranges(path, chunk_bytes):
+            collect(classify_chunk(path, start, end), start, end)
+        return totals
+
+    with Pool(workers) as pool:
+        pending = deque()
+        for start, end in chunk_ranges(path, chunk_bytes):
+            pending.append((pool.apply_async(classify_chunk, (path, start, end)), start, end))
+            if len(pending) >= 2 * workers:
+                result, first, last = pending.popleft()
+                collect(result.get(), first, last)
+        while pending:
+            result, first, last = pending.popleft()
+            collect(result.get(), first, last)
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify triangles from a large delimited text file")
+    parser.add_argument("path")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / 2 ** 20)
+    parser.add_argument("--invalid-report", help="CSV file for invalid and malformed lines")
+    parser.add_argument("--quiet", action="store_true", help="do not print progress to stderr")
+    args = parser.parse_args(argv)
+
+    size = os.path.getsize(args.path)
+    started = time.perf_counter()
+
+    def progress(totals):
+        elapsed = time.perf_counter() - started
+        print(f"{totals['bytes'] / max(size, 1):6.1%} {totals['rows']} rows "
+              f"{totals['bytes'] / 2 ** 20 / max(elapsed, 1e-9):.1f} MB/s", file=sys.stderr)
+
+    report_file = open(args.invalid_report, "w", newline="") if args.invalid_report else None
+    try:
+        report = None
+        if report_file is not None:
+            report = csv.writer(report_file)
+            report.writerow(("line", "text", "reason"))
+        totals = process_file(args.path, args.workers, int(args.chunk_mb * 2 ** 20), report,
+                              None if args.quiet else progress)
+    finally:
+        if report_file is not None:
+            report_file.close()
+    totals["seconds"] = round(time.perf_counter() - started, 3)
+    print(json.dumps(totals))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+# Общий код ботов 5laba и ivap, не зависящий от версии aiogram: конвертация сумм,
+# поиск валют по названию, таблица маршрутов, очередь исходящих сообщений, вебхук и метрики.
+# Устанавливается из корня репозитория: pip install -e .
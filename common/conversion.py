@@ -0,0 +1,74 @@
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+# Все курсы хранятся относительно рубля, поэтому конвертация между любыми двумя
+# валютами идет через рубль: сумма * курс исходной валюты / курс целевой валюты.
+# Вычисления ведутся в целых числах (сумма в копейках, курс как несократимая дробь),
+# поэтому результат точный и округляется один раз - до копеек, половина вверх
+
+BASE_CURRENCY = 'RUB'
+MINOR_UNITS = 100  # Копеек в рубле (центов в долларе и т.д.)
+# Пределы для чисел из сообщений: точный расчет строит целые числа длиной в порядок числа,
+# и "1e1000000" занял бы цикл событий бота на десятки секунд
+MAX_EXPONENT = 18  # Порядок числа от 1e-18 до 1e18
+MAX_DIGITS = 36  # Значащих цифр
+
+
+def parse_decimal(text: str) -> Decimal:
+    # Разбирает положительное число из сообщения пользователя: "1 000,50" -> Decimal('1000.50')
+    try:
+        value = Decimal(text.strip().replace(' ', '').replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f"Некорректное число: {text!r}")
+    if not value.is_finite() or value <= 0:
+        raise ValueError(f"Число должно быть положительным: {text!r}")
+    if abs(value.adjusted()) > MAX_EXPONENT or len(value.as_tuple().digits) > MAX_DIGITS:
+        raise ValueError(f"Слишком большое или слишком маленькое число: {text!r}")
+    return value
+
+
+@lru_cache(maxsize=4096)
+def _ratio(rate_from, rate_to) -> tuple:
+    # Кросс-курс rate_from / rate_to в виде пары целых чисел (числитель, знаменатель).
+    # Курсы меняются редко, поэтому дробь для пары курсов считается один раз и берется из кэша,
+    # пока курс не изменится: новое значение курса - новый ключ
+    num_from, den_from = Decimal(rate_from).as_integer_ratio()
+    num_to, den_to = Decimal(rate_to).as_integer_ratio()
+    return num_from * den_to, den_from * num_to
+
+
+def _div_round_half_up(numerator: int, denominator: int) -> int:
+    # Деление целых чисел с округлением половины от нуля (как в бухгалтерии)
+    quotient = (2 * abs(numerator) + denominator) // (2 * denominator)
+    return -quotient if numerator < 0 else quotient
+
+
+def cross_rate(rate_from, rate_to=1) -> Decimal:
+    # Сколько единиц целевой валюты стоит одна единица исходной
+    return Decimal(rate_from) / Decimal(rate_to)
+
+
+def convert(amount, rate_from, rate_to=1) -> Decimal:
+    # Переводит сумму из валюты с курсом rate_from в валюту с курсом rate_to (по умолчанию в рубли)
+    num, den = _ratio(rate_from, rate_to)
+    amount_num, amount_den = Decimal(amount).as_integer_ratio()
+    minor = _div_round_half_up(amount_num * num * MINOR_UNITS, amount_den * den)
+    return Decimal(minor).scaleb(-2)
+
+
+def convert_minor_many(amounts_minor, rate_from, rate_to=1):
+    # Пакетная конвертация сумм в копейках для отчетов: возвращает суммы в копейках целевой валюты.
+    # Если установлен NumPy и значения помещаются в int64, весь пакет считается одной векторной операцией
+    # и переводится в список, иначе считается по одной сумме; результат всегда список целых чисел
+    num, den = _ratio(rate_from, rate_to)
+    try:
+        import numpy as np  # Импорт только при первом пакетном вызове, чтобы не замедлять запуск бота
+    except ImportError:
+        np = None
+    if np is not None:
+        amounts = np.asarray(amounts_minor, dtype=np.int64)
+        largest = int(np.abs(amounts).max()) if amounts.size else 0
+        if num < 2 ** 62 and 2 * (largest * num + den) < 2 ** 63:  # Промежуточные значения не переполнят int64
+            products = amounts * num
+            return (np.sign(products) * ((2 * np.abs(products) + den) // (2 * den))).tolist()
+    return [_div_round_half_up(int(amount) * num, den) for amount in amounts_minor]
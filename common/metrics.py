@@ -0,0 +1,230 @@
+# Метрики бота: время работы хэндлеров, запросы к базе данных на одно обновление,
+# переходы машины состояний и показатели кэшей. Модуль не зависит от версии aiogram:
+# middleware каждого бота передает сюда измерения, а отдаются они в формате Prometheus
+# (GET /metrics) и текстом для команды /stats.
+# Профилировщик по выборке (PROFILE_SAMPLE_RATE > 0) запоминает PROFILE_KEEP самых медленных
+# обновлений со статистикой cProfile, посмотреть их можно по адресу GET /slow_updates
+from collections import Counter
+
+import io
+import os
+import time
+import heapq
+import bisect
+import random
+import cProfile
+import pstats
+import contextvars
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # Границы в секундах
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50)  # Границы числа запросов к базе на одно обновление
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Последний элемент - значения больше всех границ
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # Оценка сверху: граница корзины, в которую попадает q-я доля наблюдений
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def render(self, name: str, labels: str = '') -> list:
+        prefix = labels + ',' if labels else ''
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        suffix = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {self.sum}')
+        lines.append(f'{name}_count{suffix} {self.count}')
+        return lines
+
+
+class _UpdateStats:
+    __slots__ = ('queries', 'seconds', 'handler')
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.handler = None  # Имя хэндлера, обработавшего обновление
+
+
+_current_update = contextvars.ContextVar('current_update', default=None)
+
+
+class SlowUpdateProfiler:
+    # Профилирует долю sample_rate обновлений и хранит keep самых медленных.
+    # cProfile видит весь поток, поэтому в профиль попадают и другие задачи цикла событий,
+    # работавшие в это время; одновременно профилируется только одно обновление
+    def __init__(self, sample_rate: float, keep: int):
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self._slowest = []  # Куча (время, номер, хэндлер, текст статистики)
+        self._counter = 0
+        self._active = False
+
+    def start(self):
+        if self._active or self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # Уже работает другой профилировщик
+            return None
+        self._active = True
+        return profile
+
+    def finish(self, profile, handler: str, seconds: float):
+        profile.disable()
+        self._active = False
+        if len(self._slowest) >= self.keep and seconds <= self._slowest[0][0]:
+            return
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(25)
+        self._counter += 1
+        item = (seconds, self._counter, handler, stream.getvalue())
+        if len(self._slowest) < self.keep:
+            heapq.heappush(self._slowest, item)
+        else:
+            heapq.heapreplace(self._slowest, item)
+
+    def render(self) -> str:
+        parts = [f"=== {handler}: {seconds * 1000:.1f} мс ===\n{stats}"
+                 for seconds, _, handler, stats in sorted(self._slowest, reverse=True)]
+        return '\n'.join(parts) or "Нет профилированных обновлений\n"
+
+
+class Metrics:
+    def __init__(self):
+        self.handlers = {}  # Имя хэндлера -> Histogram времени работы
+        self.update_seconds = Histogram(LATENCY_BUCKETS)
+        self.update_db_queries = Histogram(QUERY_BUCKETS)
+        self.update_db_seconds = Histogram(LATENCY_BUCKETS)
+        self.db_queries = 0  # Все запросы процесса, в том числе вне обновлений (миграции, фоновые задачи)
+        self.db_seconds = 0.0
+        self.transitions = Counter()  # (старое состояние, новое состояние) -> количество
+        self.gauges = {}  # Имя -> (описание, функция без аргументов)
+        self.profiler = SlowUpdateProfiler(float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+                                           int(os.getenv('PROFILE_KEEP', '10')))
+
+    def register_gauge(self, name: str, description: str, value):
+        self.gauges[name] = (description, value)
+
+    def observe_handler(self, handler: str, seconds: float):
+        histogram = self.handlers.get(handler)
+        if histogram is None:
+            histogram = self.handlers[handler] = Histogram(LATENCY_BUCKETS)
+        histogram.observe(seconds)
+        stats = _current_update.get()
+        if stats is not None:
+            stats.handler = handler
+
+    def record_transition(self, old_state, new_state):
+        if old_state != new_state:
+            self.transitions[(old_state, new_state)] += 1
+
+    def record_db(self, queries: int, seconds: float):
+        self.db_queries += queries
+        self.db_seconds += seconds
+        stats = _current_update.get()
+        if stats is not None:
+            stats.queries += queries
+            stats.seconds += seconds
+
+    def start_update(self):
+        # Вызывается в начале обработки обновления, результат передается в finish_update
+        stats = _UpdateStats()
+        return _current_update.set(stats), self.profiler.start(), time.perf_counter()
+
+    def finish_update(self, started):
+        token, profile, started_at = started
+        seconds = time.perf_counter() - started_at
+        stats = _current_update.get()
+        _current_update.reset(token)
+        self.update_seconds.observe(seconds)
+        self.update_db_queries.observe(stats.queries)
+        self.update_db_seconds.observe(stats.seconds)
+        if profile is not None:
+            self.profiler.finish(profile, stats.handler or 'без хэндлера', seconds)
+
+    def render_prometheus(self) -> str:
+        lines = ['# HELP bot_handler_seconds Время работы хэндлера', '# TYPE bot_handler_seconds histogram']
+        for handler, histogram in sorted(self.handlers.items()):
+            lines += histogram.render('bot_handler_seconds', f'handler="{handler}"')
+        for name, description, histogram in (
+                ('bot_update_seconds', 'Время обработки обновления', self.update_seconds),
+                ('bot_update_db_queries', 'Запросы к базе данных на одно обновление', self.update_db_queries),
+                ('bot_update_db_seconds', 'Время запросов к базе данных на одно обновление', self.update_db_seconds)):
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram'] + histogram.render(name)
+        lines += ['# HELP bot_db_queries_total Запросы к базе данных', '# TYPE bot_db_queries_total counter',
+                  f'bot_db_queries_total {self.db_queries}',
+                  '# HELP bot_db_seconds_total Время запросов к базе данных', '# TYPE bot_db_seconds_total counter',
+                  f'bot_db_seconds_total {self.db_seconds}',
+                  '# HELP bot_fsm_transitions_total Переходы машины состояний',
+                  '# TYPE bot_fsm_transitions_total counter']
+        for (old_state, new_state), count in sorted(self.transitions.items(), key=str):
+            lines.append(f'bot_fsm_transitions_total{{from="{old_state}",to="{new_state}"}} {count}')
+        for name, (description, value) in sorted(self.gauges.items()):
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} gauge', f'{name} {value()}']
+        return '\n'.join(lines) + '\n'
+
+    def render_stats(self) -> str:
+        # Краткая сводка для команды /stats
+        lines = [f"Обновлений: {self.update_seconds.count}, "
+                 f"p50 {self.update_seconds.quantile(0.5) * 1000:.0f} мс, "
+                 f"p99 {self.update_seconds.quantile(0.99) * 1000:.0f} мс",
+                 f"Запросов к базе: {self.db_queries} за {self.db_seconds:.2f} с, "
+                 f"в среднем {self.update_db_queries.sum / max(self.update_db_queries.count, 1):.1f} на обновление",
+                 "", "Хэндлеры (вызовов, p50, p99):"]
+        for handler, histogram in sorted(self.handlers.items(), key=lambda item: -item[1].count):
+            lines.append(f"{handler}: {histogram.count}, {histogram.quantile(0.5) * 1000:.0f} мс, "
+                         f"{histogram.quantile(0.99) * 1000:.0f} мс")
+        if self.transitions:
+            lines += ["", "Переходы состояний:"]
+            lines += [f"{old_state} -> {new_state}: {count}"
+                      for (old_state, new_state), count in self.transitions.most_common(10)]
+        if self.gauges:
+            lines.append("")
+            lines += [f"{name}: {value():.3f}" for name, (_, value) in sorted(self.gauges.items())]
+        return '\n'.join(lines)
+
+
+metrics = Metrics()  # Метрики процесса; в режиме супервизора у каждого воркера свои
+
+
+def ratio(hits: int, misses: int) -> float:
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+async def start_metrics_server(host: str, port: int):
+    # HTTP-сервер с метриками; возвращает AppRunner, который нужно остановить методом cleanup()
+    from aiohttp import web  # aiohttp нужен только если сервер метрик включен
+
+    async def handle_metrics(request):
+        return web.Response(text=metrics.render_prometheus(), content_type='text/plain', charset='utf-8')
+
+    async def handle_slow_updates(request):
+        return web.Response(text=metrics.profiler.render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    app.router.add_get('/slow_updates', handle_slow_updates)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,183 @@
+# Поиск валюты по названию, введенному пользователем: без учета регистра и лишних пробелов,
+# по распространенным названиям ISO-кодов ("доллар" -> USD), по началу названия
+# для клавиатуры с подсказками и с исправлением опечаток (расстояние Левенштейна).
+# Названия хранятся в префиксном дереве и в индексе биграмм, которые обновляются
+# по одному названию при добавлении и удалении валют. Модуль не зависит от aiogram и базы данных
+
+# Распространенные названия валют по их ISO-кодам; псевдоним действует, только если код есть в индексе
+ALIASES = {
+    'RUB': ('рубль', 'рубли', 'рублей', 'руб', 'российский рубль', 'rouble', 'ruble', '₽'),
+    'USD': ('доллар', 'доллары', 'долларов', 'доллар сша', 'dollar', 'us dollar', '$'),
+    'EUR': ('евро', 'euro', '€'),
+    'CNY': ('юань', 'юани', 'юаней', 'yuan', 'renminbi'),
+    'GBP': ('фунт', 'фунты', 'фунт стерлингов', 'pound', 'pound sterling', '£'),
+    'JPY': ('иена', 'иены', 'иен', 'йена', 'yen', '¥'),
+    'CHF': ('франк', 'швейцарский франк', 'swiss franc'),
+    'KZT': ('тенге', 'tenge'),
+    'BYN': ('белорусский рубль',),
+    'TRY': ('лира', 'турецкая лира', 'lira'),
+}
+
+
+def normalize(text: str) -> str:
+    # Ключ поиска: без пробелов по краям и повторных пробелов, без учета регистра, "ё" как "е"
+    return ' '.join(text.split()).casefold().replace('ё', 'е')
+
+
+def _alias_keys(aliases: dict) -> dict:
+    return {normalize(code): [normalize(word) for word in words] for code, words in aliases.items()}
+
+
+def _alias_codes(alias_keys: dict) -> dict:
+    return {alias: code for code, aliases in alias_keys.items() for alias in aliases}
+
+
+_DEFAULT_ALIAS_KEYS = _alias_keys(ALIASES)  # Общие для всех индексов, чтобы маленький индекс не копировал их
+_DEFAULT_ALIAS_CODES = _alias_codes(_DEFAULT_ALIAS_KEYS)
+
+
+def _bigrams(key: str) -> set:
+    padded = f'^{key}$'  # Границы строки тоже дают биграммы, поэтому у коротких названий они есть
+    return {padded[index:index + 2] for index in range(len(padded) - 1)}
+
+
+def _distance(a: str, b: str, limit: int) -> int:
+    # Расстояние Левенштейна или limit + 1, если оно больше limit
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = range(len(b) + 1)
+    for index_a, char_a in enumerate(a, start=1):
+        row = [index_a]
+        for index_b, char_b in enumerate(b, start=1):
+            row.append(min(row[-1] + 1, previous[index_b] + 1, previous[index_b - 1] + (char_a != char_b)))
+        if min(row) > limit:
+            return limit + 1
+        previous = row
+    return previous[-1]
+
+
+class _Node:
+    __slots__ = ('children', 'name')
+
+    def __init__(self):
+        self.children = {}  # Символ -> _Node
+        self.name = None  # Название валюты, если здесь заканчивается ключ
+
+
+class NameIndex:
+    def __init__(self, names=(), aliases: dict = None):
+        self._aliases = _DEFAULT_ALIAS_KEYS if aliases is None else _alias_keys(aliases)  # Ключ кода -> ключи псевдонимов
+        self._codes = _DEFAULT_ALIAS_CODES if aliases is None else _alias_codes(self._aliases)  # Ключ псевдонима -> ключ кода
+        self._root = _Node()
+        self._keys = {}  # Ключ -> название валюты (само название или код для псевдонима)
+        self._grams = {}  # Биграмма -> ключи, в которых она встречается
+        self._names = set()
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _insert(self, key: str, name: str):
+        node = self._root
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+        node.name = name
+        self._keys[key] = name
+        for gram in _bigrams(key):
+            self._grams.setdefault(gram, set()).add(key)
+
+    def _delete(self, key: str):
+        # Удаляет ключ и ставшие пустыми узлы на его пути
+        path = [self._root]
+        for char in key:
+            node = path[-1].children.get(char)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].name = None
+        for depth in range(len(key), 0, -1):
+            node = path[depth]
+            if node.name is not None or node.children:
+                break
+            del path[depth - 1].children[key[depth - 1]]
+        del self._keys[key]
+        for gram in _bigrams(key):
+            keys = self._grams[gram]
+            keys.discard(key)
+            if not keys:
+                del self._grams[gram]
+
+    def add(self, name: str):
+        if name in self._names:
+            return
+        self._names.add(name)
+        key = normalize(name)
+        self._insert(key, name)  # Настоящее название важнее совпадающего с ним псевдонима
+        for alias in self._aliases.get(key, ()):
+            if alias not in self._keys:
+                self._insert(alias, name)
+
+    def remove(self, name: str):
+        if name not in self._names:
+            return
+        self._names.discard(name)
+        key = normalize(name)
+        for alias in (key, *self._aliases.get(key, ())):
+            if self._keys.get(alias) == name:
+                self._delete(alias)
+        owner = self._keys.get(self._codes.get(key))
+        if owner is not None and key not in self._keys:  # Название закрывало псевдоним другой валюты ("Доллар" и USD)
+            self._insert(key, owner)
+
+    def sync(self, names):
+        # Приводит индекс к набору названий, меняя только добавленные и удаленные
+        names = set(names)
+        for name in self._names - names:
+            self.remove(name)
+        for name in names - self._names:
+            self.add(name)
+
+    def resolve(self, text: str):
+        # Название валюты по точному совпадению ключа или псевдонима; None, если не найдено
+        return self._keys.get(normalize(text))
+
+    def complete(self, prefix: str, limit: int = 8) -> list:
+        # Не больше limit названий, ключ или псевдоним которых начинается с prefix, в алфавитном порядке ключей
+        node = self._root
+        for char in normalize(prefix):
+            node = node.children.get(char)
+            if node is None:
+                return []
+        found = []
+        stack = [node]
+        while stack and len(found) < limit:
+            node = stack.pop()
+            if node.name is not None and node.name not in found:
+                found.append(node.name)
+            stack.extend(node.children[char] for char in sorted(node.children, reverse=True))
+        return found
+
+    def suggest(self, text: str, max_distance: int = 2, limit: int = 3) -> list:
+        # Названия на расстоянии Левенштейна не больше max_distance (и не больше трети длины ввода).
+        # Каждая правка меняет не больше двух биграмм, поэтому расстояние считается только для ключей,
+        # у которых с вводом совпадает не меньше (число биграмм ввода - 2 * max_distance) биграмм
+        key = normalize(text)
+        max_distance = min(max_distance, len(key) // 3)
+        if max_distance == 0:
+            return []
+        grams = _bigrams(key)
+        shared = {}
+        for gram in grams:
+            for candidate in self._grams.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        threshold = len(grams) - 2 * max_distance
+        best = {}  # Название -> наименьшее расстояние
+        for candidate, count in shared.items():
+            if count < threshold:
+                continue
+            distance = _distance(key, candidate, max_distance)
+            name = self._keys[candidate]
+            if distance <= max_distance and distance < best.get(name, max_distance + 1):
+                best[name] = distance
+        return sorted(best, key=lambda name: (best[name], name))[:limit]
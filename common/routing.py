@@ -0,0 +1,128 @@
+# Таблица маршрутизации сообщений: состояние, команда или текст кнопки -> хэндлер.
+# Обычно aiogram по очереди проверяет фильтры всех хэндлеров, и время выбора растет с их числом;
+# здесь хэндлер находится поиском в словарях, сколько бы хэндлеров ни было зарегистрировано.
+# Сначала проверяется хэндлер текущего состояния, затем команда, затем точный текст кнопки.
+# Модуль не зависит от версии aiogram: адаптеры для aiogram 3 (бот 5laba) и aiogram 2 (ivap/4LAB.py)
+# импортируют aiogram только при вызове
+import inspect
+
+
+def state_key(state):
+    # Строка состояния, как ее хранит FSM ("ManageCurrency:waiting_for_currency_name"); принимает State или строку
+    return getattr(state, 'state', state)
+
+
+def parse_command(text):
+    # (команда, упоминание бота, аргументы) для "/convert@bot 100 USD"; None, если это не команда
+    if not text or text[0] != '/':
+        return None
+    head, *args = text.split(maxsplit=1)
+    name, _, mention = head[1:].partition('@')
+    return name, mention or None, args[0] if args else None
+
+
+class Route:
+    __slots__ = ('callback', 'params', 'when', 'commands_first')
+
+    def __init__(self, callback, when=None, commands_first=False):
+        self.callback = callback
+        # Имена параметров хэндлера: ему передаются только те данные, которые он принимает
+        self.params = frozenset(inspect.signature(callback).parameters)
+        self.when = when  # Дополнительное условие на сообщение, например наличие документа
+        self.commands_first = commands_first  # Команды и кнопки важнее хэндлера этого состояния
+
+    def kwargs(self, data: dict) -> dict:
+        return {name: value for name, value in data.items() if name in self.params}
+
+
+class RouteTable:
+    def __init__(self):
+        self.states = {}  # Строка состояния -> Route
+        self.commands = {}  # Команда без "/" -> Route
+        self.texts = {}  # Точный текст сообщения -> Route
+
+    def _add(self, table: dict, keys, route: Route):
+        for key in keys:
+            if key in table:
+                raise ValueError(f"Маршрут {key!r} уже занят хэндлером {table[key].callback.__name__}")
+            table[key] = route
+
+    def state(self, *states, when=None, commands_first=False):
+        def register(callback):
+            self._add(self.states, map(state_key, states), Route(callback, when, commands_first))
+            return callback
+        return register
+
+    def command(self, *names):
+        def register(callback):
+            self._add(self.commands, names, Route(callback))
+            return callback
+        return register
+
+    def text(self, *texts):
+        def register(callback):
+            self._add(self.texts, texts, Route(callback))
+            return callback
+        return register
+
+    def resolve(self, message, state=None):
+        # (Route, разобранная команда или None) для сообщения в состоянии state; (None, None), если хэндлера нет
+        text = message.text
+        state_route = self.states.get(state) if state is not None else None
+        if state_route is not None and state_route.when is not None and not state_route.when(message):
+            state_route = None
+        if state_route is not None and not state_route.commands_first:
+            return state_route, None
+        command = parse_command(text)
+        if command is not None:
+            route = self.commands.get(command[0])
+            if route is not None:
+                return route, command
+        route = self.texts.get(text)
+        if route is not None:
+            return route, None
+        return state_route, None
+
+
+def aiogram3_router(table: RouteTable):
+    # Роутер aiogram 3 с одним хэндлером сообщений, который выбирает хэндлер по таблице
+    from aiogram import Router
+    from aiogram.filters import CommandObject
+
+    router = Router(name='routes')
+
+    async def route_filter(message, bot, raw_state=None):
+        route, command = table.resolve(message, raw_state)
+        if route is None:
+            return False
+        found = {'route': route}
+        if command is not None:
+            name, mention, args = command
+            # Команда для другого бота в группе ("/start@other_bot") пропускается, как в фильтре Command
+            if mention is not None and mention.lower() != ((await bot.me()).username or '').lower():
+                return False
+            found['command'] = CommandObject(prefix='/', command=name, mention=mention, args=args)
+        return found
+
+    async def dispatch_route(message, route: Route, **data):
+        return await route.callback(message, **route.kwargs(data))
+
+    router.message.register(dispatch_route, route_filter)
+    return router
+
+
+def register_aiogram2(dp, table: RouteTable):
+    # Один хэндлер текстовых сообщений aiogram 2 в любом состоянии, который выбирает хэндлер по таблице
+    async def route_filter(message):
+        state = await dp.current_state().get_state()
+        route, command = table.resolve(message, state)
+        if route is None:
+            return False
+        if command is not None and command[1] is not None and command[1].lower() != (await dp.bot.me).username.lower():
+            return False
+        return {'route': route}
+
+    async def dispatch_route(message, state, route: Route):
+        return await route.callback(message, **route.kwargs({'state': state}))
+
+    dp.register_message_handler(dispatch_route, route_filter, state='*')
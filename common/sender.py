@@ -0,0 +1,222 @@
+# Очередь исходящих сообщений с учетом ограничений Telegram: не больше 30 сообщений
+# в секунду на бота, одного сообщения в секунду в личный чат и 20 сообщений в минуту в группу.
+# Все отправки проходят через один планировщик: ответы на действия пользователя уходят
+# раньше длинных списков, подряд идущие тексты в один чат склеиваются в одно сообщение,
+# а после ответа 429 (retry after) чат ждет указанное время и сообщение отправляется снова.
+# Обработчики только ставят сообщение в очередь и не ждут отправки: иначе второй ответ
+# в тот же чат задерживал бы обработчик на секунду из-за ограничения чата.
+# Модуль не зависит от версии aiogram: функцию отправки и разбор ошибки передает бот
+from collections import deque
+from functools import partial
+
+import time
+import heapq
+import asyncio
+import logging
+
+INTERACTIVE = 0  # Ответы на команды и ввод пользователя
+BULK = 1  # Списки, выгрузки и другие длинные ответы
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TokenBucket:
+    # rate токенов в секунду, не больше capacity сразу; отрицательный запас - пауза после 429
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _fill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        # Через сколько секунд появится токен
+        self._fill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._fill(now)
+        self.tokens -= 1
+
+    def pause(self, now: float, seconds: float):
+        self._fill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)  # Следующий токен появится через seconds
+
+    def is_full(self, now: float) -> bool:
+        self._fill(now)
+        return self.tokens >= self.capacity
+
+
+class _Outgoing:
+    __slots__ = ('priority', 'text', 'call', 'kwargs', 'future')
+
+    def __init__(self, priority: int, text, call, kwargs: dict):
+        self.priority = priority
+        self.text = text  # Текст сообщения, если его можно склеить с соседними
+        self.call = call  # Корутина-фабрика для остальных запросов (файлы, редактирование)
+        self.kwargs = kwargs
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class OutboundScheduler:
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, group_rate: float = 20 / 60,
+                 max_chats: int = 10000):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate  # Для групп (отрицательный id чата)
+        self.max_chats = max_chats  # Сколько корзин чатов хранить, прежде чем удалять неиспользуемые
+        self.send_message = None
+        self.retry_after = None
+        self._buckets = {}  # id чата -> TokenBucket
+        self._pending = {}  # id чата -> очередь сообщений, порядок внутри чата сохраняется
+        self._ready = []  # Куча (приоритет, номер, id чата) для чатов, которые можно обслужить
+        self._delayed = []  # Куча (время, приоритет, номер, id чата) для чатов, ждущих токен
+        self._in_flight = set()  # Чаты, сообщение в которые отправляется прямо сейчас
+        self._counter = 0
+        self._global = None
+        self._wakeup = None
+        self._task = None
+
+    def start(self, send_message, retry_after):
+        # send_message(chat_id, text, **kwargs) - корутина отправки текста;
+        # retry_after(error) - сколько секунд ждать после ошибки или None, если это не 429
+        self.send_message = send_message
+        self.retry_after = retry_after
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5):
+        # Сначала дожидается отправки уже поставленных в очередь сообщений, но не дольше timeout
+        deadline = time.monotonic() + timeout
+        while self._task is not None and (self._pending or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for queue in self._pending.values():
+            for item in queue:
+                item.future.cancel()
+        self._pending.clear()
+
+    async def send(self, chat_id: int, text: str, priority: int = INTERACTIVE, **kwargs):
+        # Текстовое сообщение; возвращает future отправленного сообщения (при склейке - общего),
+        # дождаться отправки можно через await этого future
+        return self._enqueue(chat_id, _Outgoing(priority, text, None, kwargs))
+
+    async def answer(self, message, text: str, priority: int = INTERACTIVE, **kwargs):
+        return await self.send(message.chat.id, text, priority, **kwargs)
+
+    async def submit(self, chat_id: int, call, priority: int = INTERACTIVE):
+        # Любой другой запрос к чату: call() - корутина, выполняющая его
+        return self._enqueue(chat_id, _Outgoing(priority, None, call, None))
+
+    def _enqueue(self, chat_id: int, item: _Outgoing):
+        queue = self._pending.get(chat_id)
+        if queue is None:
+            queue = self._pending[chat_id] = deque()
+        item.future.add_done_callback(partial(_log_failure, chat_id))
+        queue.append(item)
+        if len(queue) == 1 and chat_id not in self._in_flight:
+            self._schedule(chat_id)
+        self._wakeup.set()
+        return item.future
+
+    def _schedule(self, chat_id: int):
+        self._counter += 1
+        heapq.heappush(self._ready, (self._pending[chat_id][0].priority, self._counter, chat_id))
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_chats:
+                now = time.monotonic()
+                self._buckets = {key: value for key, value in self._buckets.items()
+                                 if key in self._pending or not value.is_full(now)}
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            bucket = self._buckets[chat_id] = TokenBucket(rate, 1)
+        return bucket
+
+    def _take_batch(self, chat_id: int) -> list:
+        # Первое сообщение очереди чата и идущие за ним тексты с теми же параметрами,
+        # пока склеенный текст помещается в одно сообщение
+        queue = self._pending[chat_id]
+        batch = [queue.popleft()]
+        if batch[0].text is not None:
+            length = len(batch[0].text)
+            while queue and queue[0].text is not None and queue[0].kwargs == batch[0].kwargs \
+                    and length + 2 + len(queue[0].text) <= MAX_MESSAGE_LENGTH:
+                length += 2 + len(queue[0].text)
+                batch.append(queue.popleft())
+        if not queue:
+            del self._pending[chat_id]
+        return batch
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, priority, counter, chat_id = heapq.heappop(self._delayed)
+                heapq.heappush(self._ready, (priority, counter, chat_id))
+            if not self._ready:
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            delay = self._global.delay(now)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            priority, counter, chat_id = heapq.heappop(self._ready)
+            bucket = self._bucket(chat_id)
+            delay = bucket.delay(now)
+            if delay > 0:
+                heapq.heappush(self._delayed, (now + delay, priority, counter, chat_id))
+                continue
+            bucket.take(now)
+            self._global.take(now)
+            self._in_flight.add(chat_id)
+            asyncio.create_task(self._deliver(chat_id, self._take_batch(chat_id)))
+
+    async def _deliver(self, chat_id: int, batch: list):
+        try:
+            first = batch[0]
+            if first.call is not None:
+                result = await first.call()
+            else:
+                result = await self.send_message(chat_id, '\n\n'.join(item.text for item in batch), **first.kwargs)
+        except Exception as error:
+            seconds = self.retry_after(error)
+            if seconds is None:
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(error)
+            else:
+                logging.warning("Telegram просит подождать %s с перед отправкой в чат %s", seconds, chat_id)
+                self._bucket(chat_id).pause(time.monotonic(), seconds)
+                # Сообщения возвращаются в начало очереди чата и будут отправлены после паузы
+                self._pending.setdefault(chat_id, deque()).extendleft(reversed(batch))
+        else:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_result(result)
+        finally:
+            self._in_flight.discard(chat_id)
+            if chat_id in self._pending:
+                self._schedule(chat_id)
+            self._wakeup.set()
+
+
+def _log_failure(chat_id: int, future: asyncio.Future):
+    # Результат отправки обычно никто не ждет, поэтому ошибки записываются в лог здесь
+    if not future.cancelled() and future.exception() is not None:
+        logging.error("Не удалось отправить сообщение в чат %s", chat_id, exc_info=future.exception())
+
+
+outbox = OutboundScheduler()  # Общий планировщик процесса, запускается в on_startup бота
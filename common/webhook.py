@@ -0,0 +1,81 @@
+from aiohttp import web
+
+import asyncio
+import logging
+
+
+# Очередь обновлений, разбитая на части по id чата. Каждую часть обрабатывает
+# свой воркер, поэтому обновления одного чата обрабатываются строго по порядку,
+# а разные чаты - параллельно
+class ShardedUpdateQueue:
+    def __init__(self, process_update, shard_key, workers: int = 16, queue_size: int = 1000):
+        self.process_update = process_update  # Корутина, передающая Update диспетчеру
+        self.shard_key = shard_key  # Update -> число, по которому выбирается воркер (id чата)
+        # Размер очереди делится между воркерами, чтобы общий объем буфера не зависел от их количества
+        self._queues = [asyncio.Queue(maxsize=max(1, queue_size // workers)) for _ in range(workers)]
+        self._workers = []
+
+    def _queue_for(self, update) -> asyncio.Queue:
+        return self._queues[self.shard_key(update) % len(self._queues)]
+
+    def put_nowait(self, update):
+        # Бросает asyncio.QueueFull, если очередь воркера заполнена
+        self._queue_for(update).put_nowait(update)
+
+    async def put(self, update):
+        await self._queue_for(update).put(update)  # Ждет, пока в очереди воркера освободится место
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            update = await queue.get()
+            try:
+                await self.process_update(update)
+            except Exception:  # Ошибка в одном обновлении не должна останавливать воркер
+                logging.exception("Ошибка при обработке обновления")
+            finally:
+                queue.task_done()
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+
+    async def stop(self):
+        for queue in self._queues:
+            await queue.join()  # Дожидаемся обработки уже принятых обновлений
+        for task in self._workers:
+            task.cancel()
+
+
+# Сервер для приема обновлений Telegram через вебхук.
+# Обработчик HTTP-запроса только кладет обновление в очередь и сразу отвечает 200,
+# а обработку выполняют воркеры ShardedUpdateQueue. Если очередь воркера заполнена,
+# сервер отвечает 503, и Telegram повторит доставку позже
+class WebhookServer:
+    def __init__(self, parse_update, process_update, shard_key, workers: int = 16, queue_size: int = 1000,
+                 secret_token: str = None):
+        self.parse_update = parse_update  # JSON обновления -> объект Update
+        self.secret_token = secret_token
+        self._queue = ShardedUpdateQueue(process_update, shard_key, workers, queue_size)
+        self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret_token and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != self.secret_token:
+            return web.Response(status=403)
+        try:
+            self._queue.put_nowait(self.parse_update(await request.json()))
+        except asyncio.QueueFull:
+            return web.Response(status=503)
+        return web.Response()
+
+    async def start(self, host: str, port: int, path: str):
+        self._queue.start()
+        app = web.Application()
+        app.router.add_post(path, self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logging.info("Вебхук слушает %s:%s%s", host, port, path)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()  # Сначала перестаем принимать новые обновления
+        await self._queue.stop()
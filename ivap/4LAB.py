@@ -3,10 +3,22 @@ from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
 from aiogram.utils import executor
+from aiogram.utils.exceptions import RetryAfter
 
 import os
+import asyncio
 import logging
 
+# Модули, не зависящие от версии aiogram, общие с ботом 5laba: пакет common в корне репозитория
+from common.conversion import convert, parse_decimal
+from common.metrics import start_metrics_server
+from common.routing import RouteTable, register_aiogram2
+from common.sender import BULK, outbox
+from common.webhook import WebhookServer
+from currency_books import CurrencyBooks
+from metrics_middleware import MetricsMiddleware
+from sqlite_storage import SQLiteStorage
+
 # Настраиваем уровень логирования
 # INFO - Уровень информации, используется для записи общей информации о системе или выполнении программы.
 logging.basicConfig(level=logging.INFO)
@@ -15,10 +27,20 @@ bot_token = os.getenv('API_BOT_TOKEN')
 # Создаем экземпляр и присваеваем токен (сам бот)
 bot = Bot(token=bot_token)
 # Dispatcher обработка и маршрутизация входящих сообщений
-# MemoryStorage класс, предоставляющий хранилище для состояний бота
-dp = Dispatcher(bot, storage=MemoryStorage())
-# Создание пустого списка, для дальнейшего заполнения валютой и курсом
-currency_dict = {}
+# SQLiteStorage сохраняет состояния бота в файл, чтобы они переживали перезапуск
+# FSM_STORAGE=memory оставляет MemoryStorage - хранилище состояний в памяти
+if os.getenv('FSM_STORAGE', 'sqlite') == 'memory':
+    storage = MemoryStorage()
+else:
+    storage = SQLiteStorage(os.getenv('FSM_DB_PATH', 'fsm_storage.sqlite3'))
+dp = Dispatcher(bot, storage=storage)
+dp.middleware.setup(MetricsMiddleware())  # Время обработки и переходы состояний, см. metrics.py
+# У каждого чата своя книга валют; в памяти хранятся только недавно активные чаты
+currency_books = CurrencyBooks(os.getenv('CURRENCY_DB_PATH', 'currency_books.sqlite3'),
+                               int(os.getenv('CURRENCY_BOOKS_CACHE', '10000')))
+# Хэндлеры сообщений выбираются по таблице маршрутов поиском в словарях (см. routing.py);
+# в таблице собираются декораторами ниже и подключаются к диспетчеру одним хэндлером
+routes = RouteTable()
 # SaveCurrencyState подкласс StatesGroup
 class SaveCurrencyState(StatesGroup):
     # Состояния в нашем боте
@@ -29,25 +51,27 @@ class SaveCurrencyState(StatesGroup):
     currency_rate2 = State()
 # Обработчик команды /start (декоратор)
 # types.Message - Входящее сообщение от пользователя
-@dp.message_handler(commands=['start'])
+@routes.command('start')
 async def process_start_name(message: types.Message):
     # await позволяет ассихронно отправлять сообщения, не блокируя выполнение других задач
     # (выполнение программы будет приостановлено до тех пор, пока не будет получен ответ на это сообщение)
-    # reply - для ответа на конкретное сообщение пользователя и продолжения диалога
-    await message.reply("Привет, я самый крутой бот в телеграме!\n"
-                        "У меня есть три команды:\n"
-                        "/save_currency - Сохранение вашей валюты и курса\n"
-                        "/list_currencies - Просмотр списока записаных вами валют и курсов\n"
-                        "/convert - Расчёт вашей валюты на рубли")
-
-@dp.message_handler(commands=['save_currency'])
+    # reply_to_message_id - для ответа на конкретное сообщение пользователя и продолжения диалога
+    # Все сообщения отправляются через очередь sender.outbox, которая соблюдает ограничения Telegram
+    await outbox.answer(message, "Привет, я самый крутой бот в телеграме!\n"
+                                 "У меня есть три команды:\n"
+                                 "/save_currency - Сохранение вашей валюты и курса\n"
+                                 "/list_currencies - Просмотр списока записаных вами валют и курсов\n"
+                                 "/convert - Расчёт вашей валюты на рубли",
+                        reply_to_message_id=message.message_id)
+
+@routes.command('save_currency')
 async def save_currency_command(message: types.Message):
-    # .answer() -  для отправки самостоятельных ответов или уведомлений
-    await message.answer("Введите название валюты:")
+    # outbox.answer() -  для отправки самостоятельных ответов или уведомлений
+    await outbox.answer(message, "Введите название валюты:")
     # Переход к состоянию
     await SaveCurrencyState.currency_name.set()
 # state - Указываем какое это состояние (Для перехода в него)
-@dp.message_handler(state=SaveCurrencyState.currency_name)
+@routes.state(SaveCurrencyState.currency_name)
 # FSM - конечный автомат (Управление состояниями бота и обрабатывать входящие сообщения в зависимости от
 # текущего состояния)
 async def save_currency_name(message: types.Message, state: FSMContext):
@@ -55,62 +79,136 @@ async def save_currency_name(message: types.Message, state: FSMContext):
     async with state.proxy() as data:
         #
         data['currency_name'] = message.text
-    await message.answer(f"Введите курс валюты {message.text} к рублю:")
+    await outbox.answer(message, f"Введите курс валюты {message.text} к рублю:")
     await SaveCurrencyState.currency_rate.set()
 
-@dp.message_handler(state=SaveCurrencyState.currency_rate)
+@routes.state(SaveCurrencyState.currency_rate)
 async def save_currency_rate(message: types.Message, state: FSMContext):
     # Обработка исключений
     try:
-        currency_rate = float(message.text)
+        currency_rate = parse_decimal(message.text)
         async with state.proxy() as data:
             data['currency_rate'] = currency_rate
-            currency_dict[data['currency_name']] = currency_rate
-        await message.answer(f"Курс валюты {data['currency_name']} успешно сохранен.")
+            currency_books.set_rate(message.chat.id, data['currency_name'], currency_rate)
+        await outbox.answer(message, f"Курс валюты {data['currency_name']} успешно сохранен.")
     except ValueError:
-        await message.answer("Некорректный формат курса. Пожалуйста, введите число.")
+        await outbox.answer(message, "Некорректный формат курса. Пожалуйста, введите число.")
     finally:
         await state.finish()
 
-@dp.message_handler(commands=['list_currencies'])
+@routes.command('list_currencies')
 async def list_currencies_command(message: types.Message):
-    if currency_dict:
-        currencies_list = "\n".join([f"{currency}: {rate}" for currency, rate in currency_dict.items()])
-        await message.answer("Список сохраненных валют и их курсов к рублю:\n" + currencies_list)
+    rates = currency_books.book(message.chat.id).rates  # Только валюты этого чата
+    if rates:
+        currencies_list = "\n".join([f"{currency}: {rate}" for currency, rate in rates.items()])
+        await outbox.answer(message, "Список сохраненных валют и их курсов к рублю:\n" + currencies_list, BULK)
     else:
-        await message.answer("Список сохраненных валют пуст.")
+        await outbox.answer(message, "Список сохраненных валют пуст.")
 
 
-@dp.message_handler(commands=['convert'])
+@routes.command('convert')
 async def convert_currency_command(message: types.Message):
-    await message.answer("Введите название валюты для конвертации:")
+    await outbox.answer(message, "Введите название валюты для конвертации:")
     await SaveCurrencyState.currency_name2.set()
 
-@dp.message_handler(state=SaveCurrencyState.currency_name2)
+@routes.state(SaveCurrencyState.currency_name2)
 async def convert_currency_name(message: types.Message, state: FSMContext):
-    currency_name = message.text
-    # Проверка на наличие в списке указанной валюты
-    if currency_name in currency_dict:
+    # Поиск валюты в книге чата без учета регистра и лишних пробелов, а также по псевдонимам ("доллар" -> USD)
+    currency_name = currency_books.resolve(message.chat.id, message.text)
+    if currency_name is not None:
         async with state.proxy() as data:
             data['currency_name'] = currency_name
-        await message.answer(f"Введите сумму в {currency_name}:")
+        await outbox.answer(message, f"Введите сумму в {currency_name}:")
         await SaveCurrencyState.currency_rate2.set()
+        return
+    options = currency_books.options(message.chat.id, message.text)
+    if options:
+        # Подходящие валюты кнопками: состояние не меняется, следующее сообщение снова будет названием валюты
+        markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True).add(*options)
+        await outbox.answer(message, f"Валюта {message.text} не найдена. Возможно, вы имели в виду:",
+                            reply_markup=markup)
     else:
-        await message.answer(f"Валюта {currency_name} не найдена в списке сохраненных.")
+        await outbox.answer(message, f"Валюта {message.text} не найдена в списке сохраненных.")
 
-@dp.message_handler(state=SaveCurrencyState.currency_rate2)
+@routes.state(SaveCurrencyState.currency_rate2)
 async def convert_currency_rate(message: types.Message, state: FSMContext):
     try:
-        amount = float(message.text)
+        amount = parse_decimal(message.text)
         async with state.proxy() as data:
-            rate = currency_dict[data['currency_name']]
-            converted_amount = amount * rate
-        await message.answer(f"{amount} {data['currency_name']} равно {converted_amount} рублей.")
+            rate = currency_books.get_rate(message.chat.id, data['currency_name'])
+            # Точный расчет в десятичных числах с округлением до копеек вместо умножения float
+            converted_amount = convert(amount, rate)
+        await outbox.answer(message, f"{amount} {data['currency_name']} равно {converted_amount} рублей.")
     except ValueError:
-        await message.answer("Некорректный формат суммы. Пожалуйста, введите число.")
+        await outbox.answer(message, "Некорректный формат суммы. Пожалуйста, введите число.")
     finally:
         await state.finish()
 
 
+register_aiogram2(dp, routes)  # Все хэндлеры из таблицы подключаются одним хэндлером сообщений
+
+
+def update_chat_id(update: types.Update) -> int:
+    # Чат (или пользователь), к которому относится обновление
+    event = update.message or update.callback_query or update.inline_query
+    chat = getattr(event, 'chat', None)
+    user = getattr(event, 'from_user', None)
+    return chat.id if chat else user.id if user else 0
+
+
+def retry_after(error: Exception):
+    # Пауза из ответа 429 Too Many Requests; для остальных ошибок None
+    return error.timeout if isinstance(error, RetryAfter) else None
+
+
+metrics_runner = None
+
+
+async def on_startup(dp: Dispatcher):
+    global metrics_runner
+    outbox.start(bot.send_message, retry_after)  # Очередь исходящих сообщений с учетом ограничений Telegram
+    if os.getenv('METRICS_PORT'):  # Метрики в формате Prometheus по адресу /metrics
+        metrics_runner = await start_metrics_server(os.getenv('METRICS_HOST', '0.0.0.0'), int(os.getenv('METRICS_PORT')))
+
+
+async def on_shutdown(dp: Dispatcher):
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+    await outbox.stop()
+    await currency_books.close()
+
+
+async def run_webhook():
+    # Прием обновлений через вебхук вместо опроса серверов Telegram
+    Bot.set_current(bot)  # Воркеры вебхука работают вне executor, поэтому текущие бот и диспетчер задаются вручную
+    Dispatcher.set_current(dp)
+    await on_startup(dp)
+    server = WebhookServer(
+        parse_update=lambda data: types.Update(**data),
+        process_update=dp.process_update,
+        shard_key=update_chat_id,
+        workers=int(os.getenv('WEBHOOK_WORKERS', '16')),
+        queue_size=int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000')),
+        secret_token=os.getenv('WEBHOOK_SECRET'),
+    )
+    webhook_path = os.getenv('WEBHOOK_PATH', '/webhook')
+    await server.start(os.getenv('WEBAPP_HOST', '0.0.0.0'), int(os.getenv('WEBAPP_PORT', '8080')), webhook_path)
+    # WEBHOOK_URL - публичный адрес сервера, например https://example.com
+    await bot.set_webhook(os.getenv('WEBHOOK_URL') + webhook_path, secret_token=os.getenv('WEBHOOK_SECRET'))
+    try:
+        await asyncio.Event().wait()  # Работаем до остановки программы
+    finally:
+        await bot.delete_webhook()
+        await server.stop()
+        await on_shutdown(dp)
+        await dp.storage.close()
+        await dp.storage.wait_closed()
+        await (await bot.get_session()).close()
+
+
 if __name__ == '__main__':
-    executor.start_polling(dp, skip_updates=True)
\ No newline at end of file
+    # BOT_MODE=webhook - прием обновлений через вебхук, иначе опрос серверов Telegram
+    if os.getenv('BOT_MODE', 'polling') == 'webhook':
+        asyncio.run(run_webhook())
+    else:
+        executor.start_polling(dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
\ No newline at end of file
@@ -0,0 +1,56 @@
+# Бенчмарк памяти книг валют: USERS разных пользователей сохраняют по валюте,
+# каждые 10% пользователей печатается объем памяти, занятой Python (tracemalloc).
+# Для сравнения тот же объем данных в обычных словарях в памяти, как было раньше.
+# Запуск: python bench_books.py [количество пользователей]
+
+from decimal import Decimal
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import tracemalloc
+
+from currency_books import CurrencyBooks
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+STEP = max(USERS // 10, 1)
+RATE = Decimal('90.5')
+
+
+async def bench_books(path: str):
+    books = CurrencyBooks(path, max_users=10000)
+    tracemalloc.start()
+    started = time.perf_counter()
+    for user_id in range(1, USERS + 1):
+        books.set_rate(user_id, 'USD', RATE)
+        if user_id % 10000 == 0:
+            await books.flush()  # В боте сброс происходит по таймеру раз в flush_interval
+        if user_id % STEP == 0:
+            current, peak = tracemalloc.get_traced_memory()
+            print(f"  {user_id:9} пользователей: {current / 2 ** 20:8.1f} МБ (пик {peak / 2 ** 20:.1f} МБ)")
+    elapsed = time.perf_counter() - started
+    tracemalloc.stop()
+    # Книга вытесненного пользователя читается из файла
+    assert books.get_rate(1, 'USD') == RATE
+    await books.close()
+    print(f"  {USERS / elapsed:.0f} сохранений/с")
+
+
+def bench_dicts():
+    tracemalloc.start()
+    books = {}
+    for user_id in range(1, USERS + 1):
+        books[user_id] = {'USD': RATE}
+        if user_id % STEP == 0:
+            print(f"  {user_id:9} пользователей: {tracemalloc.get_traced_memory()[0] / 2 ** 20:8.1f} МБ")
+    tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        print("CurrencyBooks (LRU на 10000 пользователей + SQLite):")
+        asyncio.run(bench_books(os.path.join(directory, 'books.sqlite3')))
+    print("Словари в памяти:")
+    bench_dicts()
@@ -0,0 +1,135 @@
+from collections import OrderedDict
+from decimal import Decimal
+
+import asyncio
+import logging
+import sqlite3
+
+from common.name_index import NameIndex
+
+
+class CurrencyBook:
+    # Валюты одного пользователя: название -> курс к рублю
+    __slots__ = ('rates', '_names')
+
+    def __init__(self, rates: dict):
+        self.rates = rates
+        self._names = None
+
+    @property
+    def names(self) -> NameIndex:
+        # Индекс названий строится при первом поиске, чтобы не занимать память у книг, где не ищут
+        if self._names is None:
+            self._names = NameIndex(self.rates)
+        return self._names
+
+
+# Книги валют пользователей по id чата в локальном файле SQLite.
+# В памяти хранятся только книги max_users последних активных пользователей (LRU),
+# остальные читаются из файла при следующем обращении, поэтому расход памяти
+# не зависит от числа пользователей. Изменения копятся и записываются одной
+# транзакцией раз в flush_interval секунд
+class CurrencyBooks:
+    def __init__(self, path: str, max_users: int = 10000, flush_interval: float = 0.05):
+        self.max_users = max_users
+        self.flush_interval = flush_interval
+        # check_same_thread=False: запись выполняется в отдельном потоке, чтобы не блокировать бота
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WITHOUT ROWID: строки лежат в порядке первичного ключа, книга пользователя читается одним диапазоном
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS currency_books ("
+            "chat_id INTEGER NOT NULL,"
+            "currency_name TEXT NOT NULL,"
+            "rate TEXT NOT NULL,"  # Текст, чтобы Decimal сохранялся без потери точности
+            "PRIMARY KEY (chat_id, currency_name)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+        self._books = OrderedDict()  # id чата -> CurrencyBook, в начале давно не использованные
+        self._pending = {}  # id чата -> {название: курс}, еще не записанные в файл
+        self._writing = {}  # То же для изменений, которые записываются прямо сейчас
+        self._flush_task = None
+
+    def book(self, chat_id: int) -> CurrencyBook:
+        book = self._books.get(chat_id)
+        if book is None:
+            rows = self._conn.execute("SELECT currency_name, rate FROM currency_books WHERE chat_id = ?",
+                                      (chat_id,)).fetchall()
+            rates = {name: Decimal(rate) for name, rate in rows}
+            rates.update(self._writing.get(chat_id, {}))  # Изменения, которые еще не успели записаться
+            rates.update(self._pending.get(chat_id, {}))
+            book = self._books[chat_id] = CurrencyBook(rates)
+            if len(self._books) > self.max_users:
+                self._books.popitem(last=False)  # Несохраненные изменения остаются в _pending
+        else:
+            self._books.move_to_end(chat_id)
+        return book
+
+    def get_rate(self, chat_id: int, currency_name: str):
+        return self.book(chat_id).rates.get(currency_name)  # None, если у пользователя нет такой валюты
+
+    def resolve(self, chat_id: int, text: str):
+        # Название валюты из книги по вводу пользователя ("usd ", "Доллар"); None, если не найдено
+        return self.book(chat_id).names.resolve(text)
+
+    def options(self, chat_id: int, text: str) -> list:
+        # Валюты книги, начинающиеся с введенного текста, или похожие на него
+        names = self.book(chat_id).names
+        return names.complete(text) or names.suggest(text)
+
+    def set_rate(self, chat_id: int, currency_name: str, rate: Decimal):
+        book = self.book(chat_id)
+        book.rates[currency_name] = rate
+        if book._names is not None:
+            book._names.add(currency_name)
+        self._pending.setdefault(chat_id, {})[currency_name] = rate
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_event_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Задача остается в _flush_task до конца записи, чтобы close мог ее дождаться
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush()
+        except Exception:
+            logging.exception("Не удалось записать курсы валют пользователей")
+            self._flush_task = None
+            return
+        self._flush_task = None
+        if self._pending:  # Изменения, сделанные во время записи
+            self._flush_task = asyncio.get_event_loop().create_task(self._flush_later())
+
+    def _write(self, rows):
+        with self._conn:  # Одна транзакция на все накопленные изменения
+            self._conn.executemany(
+                "INSERT INTO currency_books (chat_id, currency_name, rate) VALUES (?, ?, ?) "
+                "ON CONFLICT (chat_id, currency_name) DO UPDATE SET rate = excluded.rate", rows)
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        for chat_id, rates in pending.items():  # Добавляются к изменениям других сбросов, которые еще пишутся
+            self._writing.setdefault(chat_id, {}).update(rates)
+        rows = [(chat_id, name, str(rate)) for chat_id, rates in pending.items() for name, rate in rates.items()]
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, self._write, rows)
+        except Exception:
+            for chat_id, rates in pending.items():  # Попробуем записать при следующем сбросе, не затирая новые изменения
+                self._pending[chat_id] = {**rates, **self._pending.get(chat_id, {})}
+            raise
+        finally:
+            for chat_id, rates in pending.items():
+                writing = self._writing.get(chat_id, {})
+                for name, rate in rates.items():
+                    if writing.get(name) is rate:  # Курс, записываемый более поздним сбросом, остается
+                        del writing[name]
+                if not writing:
+                    self._writing.pop(chat_id, None)
+
+    async def close(self):
+        # Запись, начатая по таймеру, еще может идти в потоке: соединение закрывается после нее
+        while self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
+        self._conn.close()
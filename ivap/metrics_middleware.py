@@ -0,0 +1,33 @@
+from aiogram import Dispatcher
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+import time
+
+from common.metrics import metrics
+
+
+# Middleware aiogram 2, передающий измерения в модуль metrics:
+# время обработки обновлений, время работы хэндлеров сообщений и переходы состояний
+class MetricsMiddleware(BaseMiddleware):
+    async def on_pre_process_update(self, update, data: dict):
+        data['metrics_update'] = metrics.start_update()
+
+    async def on_post_process_update(self, update, result, data: dict):
+        metrics.finish_update(data.pop('metrics_update'))
+
+    async def on_process_message(self, message, data: dict):
+        # Вызывается, когда хэндлер уже выбран: current_handler содержит его функцию
+        # (в on_post_process_message он уже сброшен, поэтому имя запоминается здесь)
+        # Для сообщений из таблицы маршрутов (routing.py) - хэндлер, выбранный по ней
+        data['metrics_handler'] = data['route'].callback.__name__ if 'route' in data else current_handler.get().__name__
+        data['metrics_state'] = await Dispatcher.get_current().current_state().get_state()
+        data['metrics_started'] = time.perf_counter()
+
+    async def on_post_process_message(self, message, results, data: dict):
+        started = data.pop('metrics_started', None)
+        if started is None:  # Подходящий хэндлер не найден
+            return
+        metrics.observe_handler(data.pop('metrics_handler'), time.perf_counter() - started)
+        new_state = await Dispatcher.get_current().current_state().get_state()
+        metrics.record_transition(data.pop('metrics_state'), new_state)
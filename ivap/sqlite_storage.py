@@ -0,0 +1,123 @@
+from aiogram.dispatcher.storage import BaseStorage
+from collections import OrderedDict
+
+import asyncio
+import json
+import logging
+import sqlite3
+
+
+# Хранилище состояний машины состояний для aiogram 2 в локальном файле SQLite.
+# Прочитанные состояния держатся в памяти, а изменения копятся и записываются
+# одной транзакцией раз в flush_interval секунд. В памяти остаются не больше max_keys
+# последних использованных ключей, остальные перечитываются из файла
+class SQLiteStorage(BaseStorage):
+    def __init__(self, path: str, flush_interval: float = 0.05, max_keys: int = 10000):
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        # check_same_thread=False: запись выполняется в отдельном потоке, чтобы не блокировать бота
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")  # Несколько процессов могут читать файл во время записи
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm_storage ("
+            "key TEXT PRIMARY KEY,"
+            "state TEXT,"
+            "data TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._states = OrderedDict()  # Ключ -> название состояния, в начале давно не использованные
+        self._data = {}  # Ключ -> данные состояния
+        self._dirty = set()  # Ключи, изменения которых еще не записаны в файл
+        self._writing = set()  # Ключи, которые записываются прямо сейчас
+        self._flush_task = None
+
+    def _key(self, chat, user) -> str:
+        chat, user = self.check_address(chat=chat, user=user)
+        key = f"{chat}:{user}"
+        if key not in self._states:  # Чтение из файла только при первом обращении к ключу
+            row = self._conn.execute("SELECT state, data FROM fsm_storage WHERE key = ?", (key,)).fetchone()
+            self._states[key] = row[0] if row else None
+            self._data[key] = json.loads(row[1]) if row else {}
+            self._evict()
+        else:
+            self._states.move_to_end(key)
+        return key
+
+    def _evict(self):
+        while len(self._states) > self.max_keys:
+            key = next(iter(self._states))
+            if key in self._dirty or key in self._writing:  # Незаписанный ключ вытесним после ближайшего сброса
+                break
+            del self._states[key]
+            del self._data[key]
+
+    def _mark_dirty(self, key: str):
+        self._dirty.add(key)
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_event_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Задача остается в _flush_task до конца записи, чтобы close мог ее дождаться
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush()
+        except Exception:
+            logging.exception("Не удалось записать состояния машины состояний")
+            self._flush_task = None
+            return
+        self._flush_task = None
+        if self._dirty:  # Изменения, сделанные во время записи
+            self._flush_task = asyncio.get_event_loop().create_task(self._flush_later())
+
+    def _write(self, rows):
+        with self._conn:  # Одна транзакция на все накопленные изменения
+            self._conn.executemany(
+                "INSERT INTO fsm_storage (key, state, data) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET state = excluded.state, data = excluded.data", rows)
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        self._writing |= keys
+        rows = [(key, self._states[key], json.dumps(self._data[key], default=str)) for key in keys]
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, self._write, rows)
+        except Exception:
+            self._dirty.update(keys)  # Не записанные изменения попробуем записать при следующем сбросе
+            raise
+        finally:
+            self._writing -= keys
+        self._evict()
+
+    async def get_state(self, *, chat=None, user=None, default=None):
+        state = self._states[self._key(chat, user)]
+        return default if state is None else state
+
+    async def get_data(self, *, chat=None, user=None, default=None) -> dict:
+        data = self._data[self._key(chat, user)]
+        return data.copy() if data else (default or {})
+
+    async def set_state(self, *, chat=None, user=None, state=None):
+        key = self._key(chat, user)
+        self._states[key] = getattr(state, 'state', state)  # Принимает как строку, так и объект State
+        self._mark_dirty(key)
+
+    async def set_data(self, *, chat=None, user=None, data: dict = None):
+        key = self._key(chat, user)
+        self._data[key] = dict(data or {})
+        self._mark_dirty(key)
+
+    async def update_data(self, *, chat=None, user=None, data: dict = None, **kwargs):
+        key = self._key(chat, user)
+        self._data[key].update(data or {}, **kwargs)
+        self._mark_dirty(key)
+
+    async def close(self):
+        # Запись, начатая по таймеру, еще может идти в потоке: соединение закрывается в wait_closed после нее
+        while self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
+
+    async def wait_closed(self):
+        self._conn.close()
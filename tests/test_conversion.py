@@ -0,0 +1,81 @@
+import sys
+import time
+from decimal import Decimal
+
+import pytest
+
+from common.conversion import MAX_EXPONENT, convert, convert_minor_many, parse_decimal
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("100", Decimal("100")),
+    ("1 000,50", Decimal("1000.50")),
+    (" 0.01 ", Decimal("0.01")),
+    (f"1e{MAX_EXPONENT}", Decimal(f"1e{MAX_EXPONENT}")),
+])
+def test_parse_decimal(text, expected):
+    assert parse_decimal(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "abc", "0", "-5", "NaN", "Infinity", "1e1000000", "1e-1000000",
+                                  f"1e{MAX_EXPONENT + 1}", f"1e-{MAX_EXPONENT + 1}", "1" * 40, "0." + "1" * 40])
+def test_parse_decimal_rejects(text):
+    with pytest.raises(ValueError):
+        parse_decimal(text)
+
+
+def test_huge_exponent_is_rejected_quickly():
+    # Раньше "1e10000000" проходил разбор, и convert() строил целое число из десяти миллионов цифр
+    started = time.perf_counter()
+    for text in ("1e10000000", "1e-10000000", "9" * 4000):
+        with pytest.raises(ValueError):
+            convert(parse_decimal(text), Decimal("90.5"))
+    assert time.perf_counter() - started < 0.1
+
+
+@pytest.mark.parametrize("amount, rate_from, rate_to, expected", [
+    ("1", "90.5", 1, "90.50"),
+    ("100", "1", "90.5", "1.10"),  # 1.104972...
+    ("0.005", "1", 1, "0.01"),  # Половина копейки округляется вверх
+    ("0.004999", "1", 1, "0.00"),
+    ("1", "1", "3", "0.33"),
+    ("2", "1", "3", "0.67"),
+    ("0.1", "0.1", "0.3", "0.03"),  # 0.0333..., двоичные дроби дали бы погрешность
+    ("1", "0.1", "0.2", "0.50"),
+    ("123456789.99", "90.5", "98.25", "113718468.13"),
+])
+def test_convert_rounding(amount, rate_from, rate_to, expected):
+    result = convert(Decimal(amount), Decimal(rate_from), Decimal(rate_to))
+    assert result == Decimal(expected)
+    assert str(result) == expected  # Всегда две цифры после точки
+
+
+def python_minor(amounts, rate_from, rate_to):
+    # Копейки по одной сумме через convert: образец для пакетной конвертации
+    return [int(convert(Decimal(amount).scaleb(-2), rate_from, rate_to).scaleb(2)) for amount in amounts]
+
+
+AMOUNTS = [0, 1, -1, 5, -5, 50, -50, 99, 12345, -12345, 10 ** 12, -(10 ** 12)]
+RATES = [(Decimal("90.5"), Decimal(1)), (Decimal(1), Decimal("90.5")), (Decimal("0.1"), Decimal("0.3")),
+         (Decimal("1"), Decimal("3")), (Decimal("2"), Decimal("4"))]
+
+
+@pytest.mark.parametrize("rate_from, rate_to", RATES)
+def test_convert_minor_many_without_numpy(monkeypatch, rate_from, rate_to):
+    monkeypatch.setitem(sys.modules, "numpy", None)  # import numpy бросит ImportError
+    assert convert_minor_many(AMOUNTS, rate_from, rate_to) == python_minor(AMOUNTS, rate_from, rate_to)
+
+
+@pytest.mark.parametrize("rate_from, rate_to", RATES)
+def test_convert_minor_many_numpy_matches_python(rate_from, rate_to):
+    np = pytest.importorskip("numpy")
+    result = convert_minor_many(np.array(AMOUNTS, dtype=np.int64), rate_from, rate_to)
+    assert type(result) is list
+    assert result == python_minor(AMOUNTS, rate_from, rate_to)
+
+
+def test_convert_minor_many_falls_back_on_overflow():
+    # Произведение не помещается в int64: и с NumPy, и без него считается точно
+    amounts = [2 ** 62, -(2 ** 62), 7]
+    assert convert_minor_many(amounts, Decimal("90.5")) == python_minor(amounts, Decimal("90.5"), 1)
+    assert convert_minor_many([], Decimal("90.5")) == []
@@ -0,0 +1,107 @@
+import pytest
+
+from common.name_index import NameIndex, normalize
+
+
+@pytest.fixture
+def index():
+    return NameIndex(["RUB", "USD", "EUR", "USDT", "Биткоин"])
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("USD", "USD"),
+    ("  usd ", "USD"),
+    ("Доллар США", "USD"),
+    ("доллар   сша", "USD"),
+    ("€", "EUR"),
+    ("рубль", "RUB"),
+    ("биткоин", "Биткоин"),
+    ("юань", None),  # Псевдоним действует, только если код есть в индексе
+    ("US", None),
+    ("", None),
+])
+def test_resolve(index, text, expected):
+    assert index.resolve(text) == expected
+
+
+def test_normalize():
+    assert normalize("  Ёлка   ПАЛКА ") == "елка палка"
+
+
+def test_complete(index):
+    assert index.complete("us") == ["USD", "USDT"]
+    assert index.complete("USD") == ["USD", "USDT"]
+    assert index.complete("дол") == ["USD"]
+    assert index.complete("x") == []
+    assert len(index.complete("", limit=2)) == 2
+
+
+def test_complete_lists_name_once(index):
+    # "доллар", "доллары", "долларов" и "доллар сша" ведут к одной валюте
+    assert index.complete("доллар") == ["USD"]
+
+
+def test_suggest(index):
+    assert index.suggest("EUE") == ["EUR"]
+    assert index.suggest("биткион") == ["Биткоин"]
+    assert index.suggest("доллр") == ["USD"]
+    assert index.suggest("us") == []  # Короткий ввод не исправляется
+    assert index.suggest("совсем другое") == []
+
+
+def test_add_and_remove(index):
+    index.add("CNY")
+    assert index.resolve("юань") == "CNY"
+    assert len(index) == 6
+    index.remove("CNY")
+    assert index.resolve("CNY") is None
+    assert index.resolve("юань") is None
+    assert index.complete("c") == []
+    assert index.suggest("CNYY") == []
+    assert len(index) == 5
+
+
+def test_remove_keeps_shared_prefix(index):
+    index.remove("USD")
+    assert index.resolve("USDT") == "USDT"
+    assert index.complete("us") == ["USDT"]
+    assert index.resolve("доллар") is None
+
+
+def test_add_and_remove_unknown_are_ignored(index):
+    index.add("USD")
+    index.remove("GBP")
+    assert len(index) == 5
+    assert index.resolve("USD") == "USD"
+
+
+@pytest.mark.parametrize("names", [["USD", "Доллар"], ["Доллар", "USD"]])
+def test_real_name_shadows_alias(names):
+    # Валюта с названием "Доллар" находится по нему, а не псевдоним USD, независимо от порядка добавления
+    index = NameIndex(names)
+    assert index.resolve("доллар") == "Доллар"
+    assert index.resolve("dollar") == "USD"
+    index.remove("USD")
+    assert index.resolve("доллар") == "Доллар"
+
+
+@pytest.mark.parametrize("names", [["USD", "Доллар"], ["Доллар", "USD"]])
+def test_alias_returns_after_shadowing_name_is_removed(names):
+    index = NameIndex(names)
+    index.remove("Доллар")
+    assert index.resolve("доллар") == "USD"
+    assert index.complete("дол") == ["USD"]
+
+
+def test_sync(index):
+    index.sync(["RUB", "USD", "GBP"])
+    assert len(index) == 3
+    assert index.resolve("фунт") == "GBP"
+    assert index.resolve("EUR") is None
+    assert index.resolve("евро") is None
+
+
+def test_custom_aliases():
+    index = NameIndex(["XAU"], aliases={"XAU": ("золото", "gold")})
+    assert index.resolve("Золото") == "XAU"
+    assert index.resolve("доллар") is None
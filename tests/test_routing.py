@@ -0,0 +1,127 @@
+from types import SimpleNamespace
+
+import pytest
+
+from common.routing import RouteTable, parse_command, state_key
+
+TYPING = "Dialog:typing"
+UPLOAD = "Dialog:upload"
+LOCKED = "Dialog:locked"
+
+
+def message(text=None, document=None):
+    return SimpleNamespace(text=text, document=document)
+
+
+async def on_start(message):
+    pass
+
+
+async def on_help(message, command):
+    pass
+
+
+async def on_button(message, state):
+    pass
+
+
+async def on_typing(message, state):
+    pass
+
+
+async def on_upload(message, state):
+    pass
+
+
+async def on_locked(message):
+    pass
+
+
+@pytest.fixture
+def table():
+    routes = RouteTable()
+    routes.command('start')(on_start)
+    routes.command('help', 'h')(on_help)
+    routes.text("Кнопка")(on_button)
+    routes.state(TYPING, commands_first=True)(on_typing)
+    routes.state(UPLOAD, when=lambda message: message.document is not None, commands_first=True)(on_upload)
+    routes.state(SimpleNamespace(state=LOCKED))(on_locked)  # Как объект State aiogram
+    return routes
+
+
+def callback(result):
+    route = result[0]
+    return route.callback if route is not None else None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("/start", ("start", None, None)),
+    ("/convert 100 USD EUR", ("convert", None, "100 USD EUR")),
+    ("/convert@bot  100 USD", ("convert", "bot", "100 USD")),
+    ("start", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_command(text, expected):
+    assert parse_command(text) == expected
+
+
+def test_state_key():
+    assert state_key(SimpleNamespace(state=LOCKED)) == LOCKED
+    assert state_key(LOCKED) == LOCKED
+    assert state_key(None) is None
+
+
+def test_without_state(table):
+    assert callback(table.resolve(message("/start"))) is on_start
+    assert callback(table.resolve(message("/h"))) is on_help
+    assert callback(table.resolve(message("Кнопка"))) is on_button
+    assert table.resolve(message("кнопка")) == (None, None)  # Текст кнопки сравнивается точно
+    assert table.resolve(message("/unknown")) == (None, None)
+    assert table.resolve(message("/start"), "Other:state")[0].callback is on_start
+
+
+def test_command_is_parsed(table):
+    route, command = table.resolve(message("/help@bot me"))
+    assert route.callback is on_help
+    assert command == ("help", "bot", "me")
+
+
+def test_state_route_wins_by_default(table):
+    # Состояние без commands_first получает и команды, и тексты кнопок
+    for text in ("/start", "Кнопка", "что угодно"):
+        assert table.resolve(message(text), LOCKED) == (table.states[LOCKED], None)
+
+
+def test_commands_first(table):
+    assert callback(table.resolve(message("/start"), TYPING)) is on_start
+    assert callback(table.resolve(message("Кнопка"), TYPING)) is on_button
+    assert table.resolve(message("USD"), TYPING) == (table.states[TYPING], None)
+    # Неизвестная команда - обычный ввод для состояния
+    assert table.resolve(message("/usd"), TYPING) == (table.states[TYPING], None)
+
+
+def test_when(table):
+    document = object()
+    assert callback(table.resolve(message(None, document), UPLOAD)) is on_upload
+    assert callback(table.resolve(message("/start", document), UPLOAD)) is on_start
+    # Условие не выполнено: сообщение обрабатывается так, будто состояния нет
+    assert callback(table.resolve(message("/start"), UPLOAD)) is on_start
+    assert callback(table.resolve(message("Кнопка"), UPLOAD)) is on_button
+    assert table.resolve(message("текст вместо файла"), UPLOAD) == (None, None)
+
+
+def test_duplicate_route_is_rejected(table):
+    with pytest.raises(ValueError):
+        table.command('start')(on_help)
+    with pytest.raises(ValueError):
+        table.state(TYPING)(on_upload)
+    with pytest.raises(ValueError):
+        table.text("Кнопка")(on_start)
+
+
+def test_kwargs_filters_by_signature(table):
+    data = {'state': 'context', 'command': 'parsed', 'bot': 'bot'}
+    assert table.commands['start'].kwargs(data) == {}
+    assert table.commands['help'].kwargs(data) == {'command': 'parsed'}
+    assert table.states[TYPING].kwargs(data) == {'state': 'context'}
@@ -0,0 +1,187 @@
+import time
+import asyncio
+
+import pytest
+
+from common.sender import BULK, INTERACTIVE, MAX_MESSAGE_LENGTH, OutboundScheduler, TokenBucket
+
+
+class RetryAfter(Exception):
+    def __init__(self, seconds: float):
+        super().__init__(f"retry after {seconds}")
+        self.seconds = seconds
+
+
+def retry_after(error):
+    return error.seconds if isinstance(error, RetryAfter) else None
+
+
+class FakeTelegram:
+    # Записывает отправленные сообщения; failures - исключения, которые вернут первые отправки
+    def __init__(self, failures=()):
+        self.sent = []  # (время, id чата, текст, параметры)
+        self.failures = list(failures)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((time.monotonic(), chat_id, text, kwargs))
+        if self.failures:
+            raise self.failures.pop(0)
+        return f"message {len(self.sent)}"
+
+
+def scheduler(telegram, **rates):
+    outbox = OutboundScheduler(**{'global_rate': 1000, 'chat_rate': 1000, 'group_rate': 1000, **rates})
+    outbox.start(telegram.send_message, retry_after)
+    return outbox
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, capacity=2)
+    now = bucket.updated
+    assert bucket.delay(now) == 0
+    bucket.take(now)
+    bucket.take(now)
+    assert bucket.delay(now) == pytest.approx(0.5)
+    assert bucket.delay(now + 0.25) == pytest.approx(0.25)
+    assert bucket.delay(now + 0.5) == 0
+    assert not bucket.is_full(now + 0.5)
+    assert bucket.is_full(now + 10)
+    assert bucket.tokens == 2  # Запас не растет больше capacity
+
+
+def test_token_bucket_pause():
+    bucket = TokenBucket(rate=1, capacity=1)
+    now = bucket.updated
+    bucket.pause(now, 3)
+    assert bucket.delay(now) == pytest.approx(3)
+    assert bucket.delay(now + 3) == 0
+    bucket = TokenBucket(rate=1, capacity=1)
+    now = bucket.updated
+    bucket.take(now)
+    bucket.pause(now, 0.5)  # Пауза короче, чем до следующего токена, его не приближает
+    assert bucket.delay(now) == pytest.approx(1)
+
+
+def test_texts_to_one_chat_are_coalesced():
+    async def main():
+        telegram = FakeTelegram()
+        outbox = scheduler(telegram)
+        futures = [await outbox.send(1, text) for text in ("первое", "второе", "третье")]
+        results = await asyncio.gather(*futures)
+        await outbox.stop()
+        return telegram.sent, results
+
+    sent, results = asyncio.run(main())
+    assert [(chat_id, text) for _, chat_id, text, _ in sent] == [(1, "первое\n\nвторое\n\nтретье")]
+    assert results == ["message 1"] * 3  # Все части получают одно отправленное сообщение
+
+
+def test_coalescing_keeps_kwargs_and_length_apart():
+    async def main():
+        telegram = FakeTelegram()
+        outbox = scheduler(telegram)
+        long_text = "x" * (MAX_MESSAGE_LENGTH - 10)
+        futures = [await outbox.send(1, "a"), await outbox.send(1, "b", parse_mode="HTML"),
+                   await outbox.send(1, long_text), await outbox.send(1, "уже не помещается")]
+        await asyncio.gather(*futures)
+        await outbox.stop()
+        return telegram.sent, long_text
+
+    sent, long_text = asyncio.run(main())
+    assert [(text, kwargs) for _, _, text, kwargs in sent] == [
+        ("a", {}), ("b", {'parse_mode': "HTML"}), (long_text, {}), ("уже не помещается", {})]
+
+
+def test_chat_rate_limit():
+    async def main():
+        telegram = FakeTelegram()
+        outbox = scheduler(telegram, chat_rate=10)
+        first = await outbox.send(1, "a", parse_mode="HTML")  # Разные параметры не склеиваются
+        second = await outbox.send(1, "b")
+        other = await outbox.send(2, "c")
+        await asyncio.gather(first, second, other)
+        await outbox.stop()
+        return {text: (moment, chat_id) for moment, chat_id, text, _ in telegram.sent}
+
+    sent = asyncio.run(main())
+    assert sent["b"][0] - sent["a"][0] >= 0.09  # Второе сообщение в чат - через 1 / chat_rate
+    assert sent["c"][0] - sent["a"][0] < 0.05  # Другой чат не ждет
+
+
+def test_interactive_before_bulk():
+    async def main():
+        telegram = FakeTelegram()
+        outbox = scheduler(telegram)
+        futures = [await outbox.send(1, "список", BULK), await outbox.send(2, "ответ", INTERACTIVE)]
+        await asyncio.gather(*futures)
+        await outbox.stop()
+        return [text for _, _, text, _ in telegram.sent]
+
+    assert asyncio.run(main()) == ["ответ", "список"]
+
+
+def test_retry_after_pauses_chat_and_resends():
+    async def main():
+        telegram = FakeTelegram([RetryAfter(0.1)])
+        outbox = scheduler(telegram)
+        future = await outbox.send(1, "a")
+        while not telegram.sent:  # Первая попытка уходит до того, как в очереди появится второе сообщение
+            await asyncio.sleep(0)
+        second = await outbox.send(1, "b")
+        result = await future
+        await second
+        await outbox.stop()
+        return telegram.sent, result
+
+    sent, result = asyncio.run(main())
+    assert [text for _, _, text, _ in sent] == ["a", "a\n\nb"]  # Повтор после паузы склеен с новым сообщением
+    assert sent[1][0] - sent[0][0] >= 0.09
+    assert result == "message 2"
+
+
+def test_other_errors_fail_the_future():
+    async def main():
+        telegram = FakeTelegram([RuntimeError("chat not found")])
+        outbox = scheduler(telegram)
+        future = await outbox.send(1, "a")
+        with pytest.raises(RuntimeError):
+            await future
+        await outbox.stop()
+        return telegram.sent
+
+    assert len(asyncio.run(main())) == 1  # Без 429 сообщение не повторяется
+
+
+def test_submit_runs_call_in_chat_order():
+    async def main():
+        telegram = FakeTelegram()
+        outbox = scheduler(telegram)
+        order = []
+
+        async def upload():
+            order.append(len(telegram.sent))  # Сколько текстов уже отправлено к моменту загрузки
+            return "uploaded"
+
+        text = await outbox.send(1, "подпись")
+        call = await outbox.submit(1, upload)
+        results = await asyncio.gather(text, call)
+        await outbox.stop()
+        return results, [sent[2] for sent in telegram.sent], order
+
+    results, texts, order = asyncio.run(main())
+    assert results == ["message 1", "uploaded"]
+    assert texts == ["подпись"]
+    assert order == [1]
+
+
+def test_stop_cancels_unsent_messages():
+    async def main():
+        telegram = FakeTelegram()
+        outbox = scheduler(telegram, chat_rate=0.01)
+        first = await outbox.send(1, "a", parse_mode="HTML")
+        second = await outbox.send(1, "b")
+        await first
+        await outbox.stop(timeout=0.05)
+        return second
+
+    assert asyncio.run(main()).cancelled()